@@ -0,0 +1,166 @@
+"""
+Command line entry point for the common jobs of `project1`, run from the `notebooks` directory:
+
+    python -m project1 summarise --district 204
+    python -m project1 associations --focus Accident_Severity
+    python -m project1 maps
+    python -m project1 export --bundle pdf
+    python -m project1 pipeline --district 204 --workers 4
+    python -m project1 serve --port 8050
+
+Modules are imported inside the commands, so that `--help` and jobs that do not plot start without loading the plotting libraries.
+"""
+import os
+import sys
+import time
+import argparse
+
+# default locations relative to the `notebooks` directory (as PATH and FILENAME in the notebooks); the jobs clean the data themselves,
+# so they read the unprocessed tables (`data/interim/` holds the Leeds subset of `data/raw/`, which is not shipped)
+PATH = {
+    'data': '../data/interim/',
+    'references': '../data/references/',
+    'reports': '../reports/cli/'}
+
+FILENAME = {
+    'accidents': 'Road Safety Data - Accidents 2019.csv',
+    'casualties': 'Road Safety Data - Casualties 2019.csv',
+    'vehicles': 'Road Safety Data- Vehicles 2019.csv', # the original dataset has a small typing mistake
+    'variable_lookup': 'variable lookup.xls'}
+
+TABLENAMES = ['accidents', 'casualties', 'vehicles']
+
+def load(args):
+    """
+    Helper-Function loading the datasets (restricted to `--district` and cleaned as in `report_pipeline`, see `processing.RULES`), the lookup registry and the initialised SUMMARY of every dataset.
+
+    Return:
+        tables              : dict (pd.DataFrame at the internal name of each dataset)
+        summaries           : dict (SUMMARY of each dataset, not computed)
+        registry            : LookupRegistry
+    """
+    from .loading import load_datasets
+    from .lookup import LookupRegistry
+    from .linking import AccidentIndex
+    from .processing import RULES, clean
+    from .visualisations import initial_summaries
+
+    attributes_path = os.path.join(args.references, 'column attributes', '')
+    registry = LookupRegistry.load(os.path.join(args.references, FILENAME['variable_lookup']), cache_dir=args.cache)
+    tables = load_datasets(args.data, FILENAME, attributes_path=attributes_path, cache_dir=args.cache, tablenames=args.datasets)
+    if args.district is not None:
+        tables = AccidentIndex(tables['accidents']).subset_by_district(tables, args.district)
+    tables = {dataset: clean(data, RULES.get(dataset, []))[0] for dataset, data in tables.items()}
+    return tables, initial_summaries(tables, attributes_path, registry), registry
+
+def summarise(args):
+    """
+    Command writing the numerical summary and the missing value report of every dataset.
+    """
+    from .numerical_summary import compute_numerical_summary
+    from .processing import missing_value_report, valid_codes
+    from .save import save_csv, save_numerical_report
+
+    tables, summaries, _ = load(args)
+    for dataset, data in tables.items():
+        path = os.path.join(args.output, dataset, '')
+        compute_numerical_summary(summaries[dataset], data)
+        save_numerical_report(summaries[dataset], path, dataset)
+        save_csv(missing_value_report(data, valid_codes(summaries[dataset])), path, 'missing_values')
+
+def associations(args):
+    """
+    Command writing the association (Chi Squared test and Cramér's V) of every categorical column with `--focus`.
+    """
+    from .linking import AccidentIndex
+    from .associations import association_with, categorical_columns
+    from .save import save_csv
+
+    tables, summaries, _ = load(args)
+    index = AccidentIndex(tables['accidents'])
+    for dataset, data in tables.items():
+        target = data[args.focus] if dataset == 'accidents' else index.link(data, args.focus)
+        columns = [column for column in categorical_columns(summaries[dataset]) if column in data and column != args.focus]
+        save_csv(association_with(data, target, columns=columns), os.path.join(args.output, dataset, ''), f'associations_{args.focus}')
+        print(f"Saved: associations_{args.focus}.csv to {os.path.join(args.output, dataset)}")
+
+def maps(args):
+    """
+    Command writing the map of all accidents, color coded by `--focus`.
+    """
+    from .spatial_visualisation import map_accidents
+    from .save import save_map
+
+    tables, summaries, _ = load(args)
+    data = tables['accidents']
+    centroid = [float(data['Latitude'].mean()), float(data['Longitude'].mean())]
+    save_map(map_accidents(data, summaries['accidents'], centroid=centroid, colors=['black', 'red', 'green'], focus=args.focus, fast=True), os.path.join(args.output, 'maps', ''), f'{args.focus}_Map')
+    print(f"Saved: {args.focus}_Map.html to {os.path.join(args.output, 'maps')}")
+
+def export(args):
+    """
+    Command writing the figures of the single variable analysis of every dataset through an `ExportPipeline` (optionally bundled into one pdf or zip per figure directory).
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from .numerical_summary import compute_numerical_summary
+    from .save import ExportPipeline, save_all_single_variable_analysis
+
+    tables, summaries, _ = load(args)
+    with ExportPipeline(writers=args.writers, bundle=args.bundle) as pipeline:
+        for dataset, data in tables.items():
+            compute_numerical_summary(summaries[dataset], data)
+            save_all_single_variable_analysis(summaries[dataset], os.path.join(args.output, dataset, 'figures', ''), missing_values=args.missing_values, export=pipeline)
+
+def pipeline(args):
+    """
+    Command running the whole report workflow as a `Pipeline` (see `report_pipeline`) on the tables in `--data` (raw or interim by default), reusing the results of unchanged stages from `--cache`, and printing its timing report.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from .pipeline import report_pipeline
+
+    paths = {'data': args.data, 'references': args.references, 'reports': args.output}
+    workflow = report_pipeline(paths, FILENAME, district=args.district, focus=args.focus, tablenames=args.datasets, load_cache=args.cache)
+    _, report = workflow.run(workers=args.writers, cache_dir=os.path.join(args.cache, 'pipeline', '') if args.cache else None)
+    print(report.to_string(index=False))
+
+def serve(args):
+    """
+    Command running the local query service (see `service.serve`) on the datasets, loaded once at startup.
+    """
+    from .service import QueryService, serve as run
+
+    tables, summaries, registry = load(args)
+    run(QueryService(tables, summaries, registry, focus=args.focus), port=args.port)
+
+COMMANDS = {'summarise': summarise, 'associations': associations, 'maps': maps, 'export': export, 'pipeline': pipeline, 'serve': serve}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m project1', description='Run the common report jobs of project1 on the STATS19 datasets.')
+    parser.add_argument('command', choices=list(COMMANDS))
+    parser.add_argument('--data', default=PATH['data'], help='directory of the raw (or interim) dataset csv files')
+    parser.add_argument('--references', default=PATH['references'], help='directory holding `variable lookup.xls` and the column attributes')
+    parser.add_argument('--output', default=PATH['reports'], help='root directory of the reports')
+    parser.add_argument('--cache', default=None, help='directory of the loader cache (None to read the csv files)')
+    parser.add_argument('--datasets', nargs='+', default=TABLENAMES, choices=TABLENAMES)
+    parser.add_argument('--district', type=int, default=None, help='restrict to one `Local_Authority_(District)`, ie. 204 for Leeds')
+    parser.add_argument('--focus', default='Accident_Severity')
+    parser.add_argument('--bundle', default=None, choices=['pdf', 'zip'], help='export: bundle the figures of every figure directory')
+    parser.add_argument('--writers', type=int, default=2, help='export: number of writer threads, pipeline: number of stages run concurrently')
+    parser.add_argument('--missing-values', action='store_true', help='export: plot with missing values')
+    parser.add_argument('--port', type=int, default=8050, help='serve: port of the query service')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # districts and linked focus columns are taken from the accidents
+    if 'accidents' not in args.datasets and (args.district is not None or args.command in ['associations', 'maps', 'pipeline', 'serve']):
+        args.datasets = ['accidents'] + args.datasets
+
+    start = time.perf_counter()
+    COMMANDS[args.command](args)
+    print(f"Finished '{args.command}' in {time.perf_counter() - start:.2f}s")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+from .lazy import lazy_import
+
+stats = lazy_import('scipy.stats')
+
+def categorical_columns(summary):
+    """
+    Helper-Function returning the names of all categorical columns of a dataset, ie. all columns in SUMMARY that have a lookup `Map`.
+
+    Parameters:
+        summary             : dict (SUMMARY of one dataset)
+    Return:
+        columns             : list (column names)
+    """
+    return [summary[column]['Name'] for column in range(len(summary)) if summary[column].get('Map')]
+
+def encode_columns(data, columns):
+    """
+    Function to encode categorical columns into dense integer codes `0, ..., n_categories-1`, so that contingency tables can be counted with `np.bincount`. Missing values (codes smaller than 0) are encoded as `-1`.
+
+    Parameters:
+        data                : pd.DataFrame
+        columns             : list (names of the columns to encode)
+    Return:
+        codes               : np.array (two-dimensional, one column of codes per encoded column)
+        categories          : list (np.array of the original values per column, position = code)
+    """
+    codes = np.full((data.shape[0], len(columns)), -1, dtype=np.int64)
+    categories = []
+    for i, column in enumerate(columns):
+        values = np.asarray(data[column])
+        valid = values >= 0 if values.dtype.kind in 'iuf' else np.ones(len(values), dtype=bool)
+        uniques, inverse = np.unique(values[valid], return_inverse=True)
+        codes[valid, i] = inverse.ravel()
+        categories.append(uniques)
+    return codes, categories
+
+def contingency_table(codes_a, codes_b, size_a, size_b):
+    """
+    Function to count the contingency table of two encoded columns with a single `np.bincount` over the combined code `a * size_b + b`. Rows where either code is missing are left out.
+
+    Parameters:
+        codes_a, codes_b    : np.array (one-dimensional, dense codes, -1 for missing)
+        size_a, size_b      : int (number of categories of each column)
+    Return:
+        observed            : np.array (two-dimensional, shape (size_a, size_b))
+    """
+    valid = (codes_a >= 0) & (codes_b >= 0)
+    return np.bincount(codes_a[valid] * size_b + codes_b[valid], minlength=size_a * size_b).reshape(size_a, size_b)
+
+def chi2_test(observed, correction=True):
+    """
+    Function to run Pearson's Chi Squared test of independence on a contingency table and compute Cramér's V from it. Categories that are never observed are dropped first (as `pd.crosstab` does). With `correction`, Yates' correction is applied for one degree of freedom, as in `scipy.stats.chi2_contingency`, so the results equal the ones of `categorical_association_test`.
+
+    Parameters:
+        observed            : np.array (two-dimensional)
+        correction          : boolean (Yates' correction for one degree of freedom)
+    Return:
+        chiVal              : float
+        pVal                : float
+        dof                 : int
+        V                   : float (Cramér's V, np.nan if a variable has less than two observed categories)
+    """
+    observed = np.asarray(observed, dtype=float)
+    observed = observed[observed.sum(axis=1) > 0][:, observed.sum(axis=0) > 0]
+    if min(observed.shape) < 2:
+        return np.nan, np.nan, 0, np.nan
+
+    total = observed.sum()
+    expected = np.outer(observed.sum(axis=1), observed.sum(axis=0)) / total
+    dof = (observed.shape[0] - 1) * (observed.shape[1] - 1)
+
+    if correction and dof == 1:
+        observed = observed + np.sign(expected - observed) * np.minimum(0.5, np.abs(expected - observed))
+
+    chiVal = float(np.sum((observed - expected) ** 2 / expected))
+    V = np.sqrt((chiVal / total) / (min(observed.shape) - 1))
+    return chiVal, float(stats.chi2.sf(chiVal, dof)), dof, float(V)
+
+def association_matrix(data, columns, linked=None, correction=True):
+    """
+    Function to compute Pearson's Chi Squared test and Cramér's V for every pair of categorical columns of a dataset, without plotting. All columns are encoded once, then every contingency table is a single `np.bincount` over the combined codes. Columns of linked datasets (ie. accident columns attached to vehicles through `AccidentIndex.link`) can be included through `linked`.
+
+    Parameters:
+        data                : pd.DataFrame
+        columns             : list (names of the categorical columns of `data` and `linked`, ie. `categorical_columns(SUMMARY[dataset])`; identifiers and coordinates would blow up the contingency tables)
+        linked              : pd.DataFrame (columns aligned to the rows of `data`, ie. from `AccidentIndex.link`)
+        correction          : boolean (see `chi2_test`)
+    Return:
+        matrices            : dict (pd.DataFrame (columns x columns) at keys 'V', 'p', 'chi2', 'dof')
+    """
+    if linked is not None:
+        data = pd.concat([data.reset_index(drop=True), pd.DataFrame(linked).reset_index(drop=True)], axis=1)
+
+    codes, categories = encode_columns(data, columns)
+    sizes = [len(c) for c in categories]
+
+    matrices = {key: np.full((len(columns), len(columns)), np.nan) for key in ['V', 'p', 'chi2', 'dof']}
+    for i in range(len(columns)):
+        for j in range(i, len(columns)):
+            observed = contingency_table(codes[:, i], codes[:, j], sizes[i], sizes[j])
+            chiVal, pVal, dof, V = chi2_test(observed, correction=correction)
+            for key, value in zip(['chi2', 'p', 'dof', 'V'], [chiVal, pVal, dof, V]):
+                matrices[key][i, j] = matrices[key][j, i] = value
+
+    return {key: pd.DataFrame(matrix, index=columns, columns=columns) for key, matrix in matrices.items()}
+
+def association_with(data, target, columns, correction=True):
+    """
+    Function to compute the association of every categorical column of a dataset with one target variable (ie. the linked `Accident_Severity`), as `save_all_categorical_associations` does figure by figure.
+
+    Parameters:
+        data                : pd.DataFrame
+        target              : np.array (one-dimensional, aligned to the rows of `data`)
+        columns             : list (names of the categorical columns, ie. `categorical_columns(SUMMARY[dataset])`, see `association_matrix`)
+        correction          : boolean (see `chi2_test`)
+    Return:
+        associations        : pd.DataFrame (chi2, p, dof and V per column, sorted by V)
+    """
+    codes, categories = encode_columns(data, columns)
+    target_codes, target_categories = encode_columns(pd.DataFrame({'target': np.asarray(target)}), ['target'])
+
+    rows = []
+    for i, column in enumerate(columns):
+        observed = contingency_table(target_codes[:, 0], codes[:, i], len(target_categories[0]), len(categories[i]))
+        chiVal, pVal, dof, V = chi2_test(observed, correction=correction)
+        rows.append({'Name': column, 'chi2': chiVal, 'p': pVal, 'dof': dof, 'V': V})
+
+    return pd.DataFrame(rows).sort_values('V', ascending=False).reset_index(drop=True)
+
+def plot_association_matrix(V, dimensions=(16,16)):
+    """
+    Function to plot a matrix of Cramér's V (see `association_matrix`) as a heatmap. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline plotting
+
+    Parameter:
+        V                   : pd.DataFrame (Cramér's V of every pair of columns)
+        dimensions          : tuple (specify size of plotted figure)
+    Return:
+        fig                 : matplotlib.Figure
+    """
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=dimensions)
+    ax = fig.add_axes([.25,.25,.7,.7])
+
+    image = ax.imshow(np.asarray(V, dtype=float), vmin=0, vmax=1, cmap='Reds')
+    ax.set_xticks(range(V.shape[1])); ax.set_xticklabels([name.replace('_', ' ') for name in V.columns], rotation=90)
+    ax.set_yticks(range(V.shape[0])); ax.set_yticklabels([name.replace('_', ' ') for name in V.index])
+    ax.set_title("Association of Categorical Variables (Cramér's V)", fontweight='bold')
+    fig.colorbar(image, ax=ax, fraction=.04)
+
+    return fig
@@ -0,0 +1,203 @@
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait, as_completed
+import numpy as np
+import pandas as pd
+from .linking import AccidentIndex
+from .numerical_summary import compute_numerical_summary
+from .associations import association_with, categorical_columns
+from .spatial_visualisation import map_accidents
+from .buildcache import BuildCache
+from .visualisations import copy_summary
+from .save import save_csv, save_numerical_report, save_map, save_all_single_variable_analysis, init_worker
+from .instrument import instrumented
+
+class DistrictGroups:
+    """
+    Rows of the three datasets grouped by `Local_Authority_(District)` in one pass: the accidents are sorted by district once, and every casualty and vehicle is assigned the district of its accident through one `AccidentIndex` lookup. The rows of every district are then taken without filtering the national tables again. The accident columns in `link` (ie. `Accident_Severity`) are linked to the casualties and vehicles once, for all districts.
+
+    Parameters:
+        tables              : dict (holding the national datasets at keys 'accidents', 'casualties', 'vehicles')
+        link                : list (accident columns linked to the rows of the other datasets)
+    """
+    @instrumented
+    def __init__(self, tables, link=('Accident_Severity',)):
+        self.tables, self.link = tables, list(link)
+        index = AccidentIndex(tables['accidents'])
+
+        self.districts, self.rows, self.offsets, self.linked = None, {}, {}, {}
+        for dataset, data in tables.items():
+            if dataset == 'accidents':
+                district = np.asarray(data['Local_Authority_(District)'])
+                self.linked[dataset] = data[self.link].reset_index(drop=True)
+            else:
+                positions = index.positions(data['Accident_Index'])
+                linked = index.link(data, ['Local_Authority_(District)'] + self.link)
+                district = np.where(positions >= 0, np.asarray(linked['Local_Authority_(District)']), np.iinfo(np.int64).min)
+                self.linked[dataset] = linked[self.link]
+
+            # rows sorted by district (CSR layout: rows of district i are rows[offsets[i]:offsets[i+1]])
+            uniques, counts = np.unique(district, return_counts=True)
+            self.rows[dataset] = np.argsort(district, kind='stable')
+            self.offsets[dataset] = dict(zip(uniques.tolist(), zip((np.cumsum(counts) - counts).tolist(), np.cumsum(counts).tolist())))
+            if dataset == 'accidents': self.districts = uniques
+
+    def positions(self, dataset, district):
+        """
+        Returns the row positions of a dataset in a district (sorted, for `iloc`).
+        """
+        start, end = self.offsets[dataset].get(district, (0, 0))
+        return self.rows[dataset][start:end]
+
+    def subset(self, district):
+        """
+        Function returning the rows of all datasets in a district, and the linked accident columns aligned to them.
+
+        Return:
+            tables          : dict (pd.DataFrame at the internal name of each dataset)
+            linked          : dict (pd.DataFrame of linked accident columns at the internal name of each dataset)
+        """
+        tables, linked = {}, {}
+        for dataset, data in self.tables.items():
+            positions = self.positions(dataset, district)
+            tables[dataset] = data.iloc[positions]
+            linked[dataset] = self.linked[dataset].iloc[positions].reset_index(drop=True)
+        return tables, linked
+
+    def sizes(self):
+        """
+        Returns the number of rows per district and dataset.
+        """
+        return pd.DataFrame({dataset: {district: end - start for district, (start, end) in offsets.items()} for dataset, offsets in self.offsets.items()}).loc[self.districts].fillna(0).astype(int)
+
+def region_directory(district, names=None):
+    """
+    Helper-Function returning the directory name of a district's report, ie. '204_Leeds'.
+    """
+    name = (names or {}).get(district)
+    if name is None: return str(district)
+    return f"{district}_{re.sub(r'[^A-Za-z0-9]+', '_', str(name)).strip('_')}"
+
+def region_report(district, tables, linked, summaries, path, baseline=None, focus='Accident_Severity', colors=('black', 'red', 'green'), maps=True, figures=False, use_cache=False):
+    """
+    Function to build the report of one region into `path`: the numerical summary of every dataset, the association of every categorical column with `focus`, the distribution of `focus` against the national baseline and a map of all accidents (centred on the region). Figures of the single variable analysis are only rendered with `figures`, since they dominate the run time.
+
+    Parameters:
+        district            : int (code of `Local_Authority_(District)`)
+        tables              : dict (rows of the datasets in the region, see `DistrictGroups.subset`)
+        linked              : dict (linked accident columns, see `DistrictGroups.subset`)
+        summaries           : dict (SUMMARY of each dataset as created by `initialise_summary`, not filled)
+        path                : str (directory of the region's report)
+        baseline            : pd.Series (national share of every value of `focus`)
+        focus               : str (accident column that associations are computed with)
+        colors              : list (colors of the values of `focus` on the map)
+        maps                : boolean (save the map of the region)
+        figures             : boolean (save the figures of the single variable analysis)
+        use_cache           : boolean (skip unchanged artifacts through a `BuildCache` in `path`)
+    Return:
+        report              : dict (district, rows per dataset, seconds and error)
+    """
+    start = time.perf_counter()
+    report = {'District': district, 'Path': path, **{dataset.capitalize(): data.shape[0] for dataset, data in tables.items()}}
+    cache = BuildCache(os.path.join(path, 'manifest.json')) if use_cache else None
+
+    try:
+        for dataset, data in tables.items():
+            dataset_path = os.path.join(path, dataset, '')
+            summary = copy_summary(summaries[dataset])
+            compute_numerical_summary(summary, data)
+            save_numerical_report(summary, dataset_path, dataset, cache=cache)
+
+            columns = [column for column in categorical_columns(summary) if column in data and column != focus]
+            if columns and data.shape[0] > 0:
+                associations = association_with(data, linked[dataset][focus], columns=columns)
+                save_csv(associations, dataset_path, f'associations_{focus}', cache=cache)
+
+            if figures:
+                save_all_single_variable_analysis(summary, dataset_path + 'figures/', cache=cache)
+
+            if dataset == 'accidents':
+                share = data[focus].value_counts(normalize=True).sort_index().rename('Region')
+                comparison = pd.concat([share, baseline.rename('National')], axis=1).fillna(0) if baseline is not None else share.to_frame()
+                save_csv(comparison.rename_axis(focus).reset_index(), dataset_path, f'{focus}_vs_national', cache=cache)
+
+                if maps and data.shape[0] > 0:
+                    centroid = [float(data['Latitude'].mean()), float(data['Longitude'].mean())]
+                    save_map(lambda: map_accidents(data, summary, centroid=centroid, colors=list(colors), focus=focus, fast=True), os.path.join(path, 'maps', ''), f'{focus}_Map', cache=cache, inputs=(data, summary, focus, list(colors)))
+        report['Error'] = None
+    except Exception as e:
+        report['Error'] = f'{type(e).__name__}: {e}'
+    if cache is not None: cache.write() # once per region, after all artifacts are recorded
+
+    report['Seconds'] = time.perf_counter() - start
+    return report
+
+def _region_job(job):
+    # runs `region_report` in a worker process, discarding its progress output
+    import io, contextlib
+    with contextlib.redirect_stdout(io.StringIO()):
+        return region_report(*job[0], **job[1])
+
+@instrumented
+def run_batch(tables, summaries, path, districts=None, workers=None, names=None, focus='Accident_Severity', min_accidents=1, **options):
+    """
+    Function to run the report for every local authority in one pass. Work shared by all regions is done once: grouping the national tables by district (see `DistrictGroups`), linking `focus` to casualties and vehicles, and the national baseline (numerical summary and distribution of `focus`, written to `path/national/`). The regions are then reported in parallel by a process pool (each worker only receives the rows of its region) into one report tree per region, ie. `path/204_Leeds/`.
+
+    Parameters:
+        tables              : dict (holding the national datasets at keys 'accidents', 'casualties', 'vehicles')
+        summaries           : dict (SUMMARY of each dataset as created by `initialise_summary`, ie. with a `LookupRegistry`)
+        path                : str (root directory of all reports, ie. '../reports/regions/')
+        districts           : list (codes of the districts to report, None for all)
+        workers             : int (number of worker processes, None to report in this process)
+        names               : dict (name of every district, ie. `registry.sheets['Local Authority (District)']`, used for directory names)
+        focus               : str (see `region_report`)
+        min_accidents       : int (districts with fewer accidents are skipped)
+        **options           : see `region_report` (ie. figures=True, use_cache=True)
+    Return:
+        report              : pd.DataFrame (one row per region: rows per dataset, seconds and error)
+    """
+    start = time.perf_counter()
+    groups = DistrictGroups(tables, link=[focus])
+
+    # national baseline, computed once
+    national_path = os.path.join(path, 'national', '')
+    baseline = tables['accidents'][focus].value_counts(normalize=True).sort_index()
+    for dataset, data in tables.items():
+        summary = copy_summary(summaries[dataset])
+        compute_numerical_summary(summary, data)
+        save_numerical_report(summary, national_path, dataset)
+    save_csv(baseline.rename('National').rename_axis(focus).reset_index(), national_path, f'{focus}_national')
+
+    sizes = groups.sizes()
+    if districts is None: districts = [d for d in groups.districts.tolist() if sizes.loc[d, 'accidents'] >= min_accidents]
+
+    def jobs():
+        for district in districts:
+            region_tables, linked = groups.subset(district)
+            region_path = os.path.join(path, region_directory(district, names), '')
+            yield ((district, region_tables, linked, summaries, region_path), dict(baseline=baseline, focus=focus, **options))
+
+    reports = []
+    def progress(report):
+        reports.append(report)
+        status = 'failed' if report['Error'] else f"{report['Seconds']:.2f}s"
+        print(f"[{len(reports)}/{len(districts)}] {report['Path']} ({status})")
+
+    if workers is None or workers <= 1:
+        for job in jobs(): progress(_region_job(job))
+    else:
+        # at most `2 * workers` regions are subset and in flight at a time (`pool.map` would subset and pickle all of them up front)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            pending = set()
+            for job in jobs():
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done: progress(future.result())
+                pending.add(pool.submit(_region_job, job))
+            for future in as_completed(pending): progress(future.result())
+        position = {district: i for i, district in enumerate(districts)}
+        reports.sort(key=lambda report: position[report['District']]) # in the order of `districts`, as without workers
+
+    print(f"Reported {len(districts)} regions in {time.perf_counter() - start:.2f}s (workers={workers or 1})")
+    return pd.DataFrame(reports)
@@ -0,0 +1,422 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import subprocess
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+from .linking import AccidentIndex
+from .loading import load_table, read_column_attributes
+from .lookup import COLUMN_SHEETS
+from .visualisations import initial_summaries, copy_summary
+
+# column names of the processed STATS19 tables (`Date` holds the month and `Time` the hour)
+COLUMNS = {
+    'accidents': ['Accident_Index', 'Location_Easting_OSGR', 'Location_Northing_OSGR', 'Longitude', 'Latitude', 'Police_Force', 'Accident_Severity', 'Number_of_Vehicles', 'Number_of_Casualties', 'Date', 'Day_of_Week', 'Time', 'Local_Authority_(District)', 'Local_Authority_(Highway)', '1st_Road_Class', '1st_Road_Number', 'Road_Type', 'Speed_limit', 'Junction_Detail', 'Junction_Control', '2nd_Road_Class', '2nd_Road_Number', 'Pedestrian_Crossing-Human_Control', 'Pedestrian_Crossing-Physical_Facilities', 'Light_Conditions', 'Weather_Conditions', 'Road_Surface_Conditions', 'Special_Conditions_at_Site', 'Carriageway_Hazards', 'Urban_or_Rural_Area', 'Did_Police_Officer_Attend_Scene_of_Accident', 'LSOA_of_Accident_Location'],
+    'casualties': ['Accident_Index', 'Vehicle_Reference', 'Casualty_Reference', 'Casualty_Class', 'Sex_of_Casualty', 'Age_of_Casualty', 'Age_Band_of_Casualty', 'Casualty_Severity', 'Pedestrian_Location', 'Pedestrian_Movement', 'Car_Passenger', 'Bus_or_Coach_Passenger', 'Pedestrian_Road_Maintenance_Worker', 'Casualty_Type', 'Casualty_Home_Area_Type', 'Casualty_IMD_Decile'],
+    'vehicles': ['Accident_Index', 'Vehicle_Reference', 'Vehicle_Type', 'Towing_and_Articulation', 'Vehicle_Manoeuvre', 'Vehicle_Location-Restricted_Lane', 'Junction_Location', 'Skidding_and_Overturning', 'Hit_Object_in_Carriageway', 'Vehicle_Leaving_Carriageway', 'Hit_Object_off_Carriageway', '1st_Point_of_Impact', 'Was_Vehicle_Left_Hand_Drive?', 'Journey_Purpose_of_Driver', 'Sex_of_Driver', 'Age_of_Driver', 'Age_Band_of_Driver', 'Engine_Capacity_(CC)', 'Propulsion_Code', 'Age_of_Vehicle', 'Driver_IMD_Decile', 'Driver_Home_Area_Type', 'Vehicle_IMD_Decile']}
+
+# range of codes (low, high) of the coded columns that have no sheet in `variable lookup.xls`, and of the severity columns
+# (the focus of the associations), which must keep their three codes when no lookup registry is given
+RANGES = {
+    'Accident_Severity': (1, 3), 'Casualty_Severity': (1, 3), 'Casualty_Class': (1, 3),
+    'Number_of_Vehicles': (1, 8), 'Number_of_Casualties': (1, 10), 'Date': (1, 12), 'Time': (-1, 23),
+    '1st_Road_Number': (0, 9999), '2nd_Road_Number': (0, 9999), 'Vehicle_Reference': (1, 3), 'Casualty_Reference': (1, 3),
+    'Age_of_Casualty': (-1, 100), 'Age_of_Driver': (-1, 100), 'Engine_Capacity_(CC)': (-1, 5000), 'Age_of_Vehicle': (-1, 30),
+    'Driver_IMD_Decile': (-1, 10), 'Driver_Home_Area_Type': (-1, 3), 'Vehicle_IMD_Decile': (-1, 10)}
+
+# number of rows of the linked datasets per accident (as in the 2019 data)
+ROWS_PER_ACCIDENT = {'accidents': 1, 'casualties': 1.3, 'vehicles': 1.85}
+
+# modules whose import time is benchmarked, and the heavy dependencies that they should only import at first use
+IMPORTS = ['project1', 'project1.numerical_summary', 'project1.processing', 'project1.linking', 'project1.save', 'project1.batch', 'project1.__main__']
+HEAVY = ['scipy', 'matplotlib', 'seaborn', 'folium']
+
+def timed(function, *args, repeat=1, **kwargs):
+    """
+    Helper-Function to time a function call. The call is repeated `repeat` times and the best wall time is reported.
+
+    Parameters:
+        function        : callable
+        repeat          : int (number of repetitions)
+    Return:
+        result          : return value of the last call
+        seconds         : float (best wall time of all repetitions)
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best: best = elapsed
+    return result, best
+
+def naive_link_to_accidents(data, accidents, focus):
+    """
+    Masking loop of the notebook (one boolean mask over all accidents per row), kept as the reference path for benchmarks.
+    """
+    ans = []
+    for i in range(data.shape[0]):
+        index = data['Accident_Index'].iloc[i]
+        mask = accidents['Accident_Index'] == index
+        focus_column = accidents[mask][focus]
+        ans.append(int(focus_column.iloc[0]))
+    return np.array(ans)
+
+def naive_subset_by_district(tables, district):
+    """
+    Subsetting of the notebook (district mask on the accidents, then `isin` over the list of accident indexes), kept as the reference path for benchmarks.
+    """
+    subsets = {'accidents': tables['accidents'][tables['accidents']['Local_Authority_(District)'] == district]}
+    indexes = list(subsets['accidents']['Accident_Index'])
+    for dataset in tables:
+        if dataset != 'accidents':
+            subsets[dataset] = tables[dataset][tables[dataset]['Accident_Index'].isin(indexes)]
+    return subsets
+
+def compare_linking(tables, district=204, focus='Accident_Severity', limit=None, repeat=3):
+    """
+    Function to benchmark the notebook's linking and subsetting against `AccidentIndex`. Both paths are checked to produce the same result. Since the masking loop grows with (#rows x #accidents), it can be restricted to the first `limit` rows of each linked dataset.
+
+    Parameters:
+        tables          : dict (holding the datasets at keys 'accidents', 'casualties', 'vehicles')
+        district        : int (code of `Local_Authority_(District)` used for subsetting)
+        focus           : str (name of the accident column to link)
+        limit           : int (number of rows to link per linked dataset, None for all)
+        repeat          : int (repetitions of the vectorized paths, best time is reported)
+    Return:
+        results         : pd.DataFrame (seconds per operation and path, and the speedup)
+    """
+    results = []
+
+    index, seconds = timed(AccidentIndex, tables['accidents'])
+    results.append({'Operation': 'build index', 'Naive': np.nan, 'Indexed': seconds})
+
+    naive, naive_seconds = timed(naive_subset_by_district, tables, district)
+    indexed, indexed_seconds = timed(index.subset_by_district, tables, district, repeat=repeat)
+    for dataset in tables:
+        assert naive[dataset].index.equals(indexed[dataset].index), f'Subsets of {dataset} differ.'
+    results.append({'Operation': f'subset district {district}', 'Naive': naive_seconds, 'Indexed': indexed_seconds})
+
+    for dataset in tables:
+        if dataset == 'accidents': continue
+        data = tables[dataset] if limit is None else tables[dataset].iloc[:limit]
+
+        naive, naive_seconds = timed(naive_link_to_accidents, data, tables['accidents'], focus)
+        indexed, indexed_seconds = timed(index.link, data, focus, repeat=repeat)
+        assert np.array_equal(naive, indexed), f'Linked {focus} of {dataset} differs.'
+        results.append({'Operation': f'link {dataset} ({data.shape[0]} rows)', 'Naive': naive_seconds, 'Indexed': indexed_seconds})
+
+    results = pd.DataFrame(results)
+    results['Speedup'] = results['Naive'] / results['Indexed']
+    return results
+
+def compare_loading(path, attributes_path, cache_dir, cache_format=None, repeat=3):
+    """
+    Function to benchmark loading one dataset with default `pd.read_csv` dtypes (the current path) against `load_table`, both on a cold cache (typed parse plus writing the cache) and on a warm cache. The cache directory is cleared before the cold load.
+
+    Parameters:
+        path            : str (path to the `csv` file)
+        attributes_path : str (path to the `*_column_attributes.csv` file of the dataset)
+        cache_dir       : str (directory of the cache, will be emptied)
+        cache_format    : str (see `load_table`)
+        repeat          : int (repetitions of the current path and the warm load, best time is reported)
+    Return:
+        results         : pd.DataFrame (seconds and resident memory of the loaded table per path)
+    """
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    current, current_seconds = timed(pd.read_csv, path, low_memory=False, repeat=repeat)
+    cold, cold_seconds = timed(load_table, path, attributes_path, cache_dir=cache_dir, cache_format=cache_format)
+    warm, warm_seconds = timed(load_table, path, attributes_path, cache_dir=cache_dir, cache_format=cache_format, repeat=repeat)
+
+    results = pd.DataFrame([
+        {'Path': 'current (pd.read_csv)', 'Seconds': current_seconds, 'Memory (MB)': current.memory_usage(deep=True).sum() / 2**20},
+        {'Path': 'typed, cold cache', 'Seconds': cold_seconds, 'Memory (MB)': cold.memory_usage(deep=True).sum() / 2**20},
+        {'Path': 'typed, warm cache', 'Seconds': warm_seconds, 'Memory (MB)': warm.memory_usage(deep=True).sum() / 2**20}])
+    results['Speedup'] = current_seconds / results['Seconds']
+    return results
+
+def synthetic_codes(column, dataset_name, n, rng, registry=None):
+    """
+    Helper-Function drawing `n` codes of a coded column: from the codes of its sheet in the lookup registry if given, else from `RANGES` (or the codes 1-9 and -1 for missing values).
+    """
+    sheet = COLUMN_SHEETS.get(dataset_name, {}).get(column.rstrip('?'))
+    if registry is not None and sheet is not None:
+        codes = np.array([code for code in registry.sheets[sheet] if isinstance(code, (int, np.integer))], dtype=np.int64)
+        return rng.choice(codes, n)
+    low, high = RANGES.get(column, (-1, 9))
+    return rng.integers(low, high + 1, n)
+
+def synthetic_tables(n_accidents, attributes_path, registry=None, district=204, district_share=.05, seed=0):
+    """
+    Function to generate synthetic Accidents, Casualties and Vehicles tables shaped as the processed STATS19 tables, at any scale. Columns follow `COLUMNS` and the column attribute specs: coded columns hold codes of their lookup sheet (see `synthetic_codes`), coordinates are spread over Great Britain and a share of the accidents lies in `district`, so that subsetting behaves as for Leeds. Casualties and vehicles are linked to random accidents.
+
+    Parameters:
+        n_accidents         : int (number of accidents, the linked datasets are scaled by `ROWS_PER_ACCIDENT`)
+        attributes_path     : str (directory of the column attributes, ie. PATH['references'] + 'column attributes/')
+        registry            : LookupRegistry (draws codes from the lookup sheets, None for `RANGES`)
+        district            : int (code of `Local_Authority_(District)` of the subset, ie. 204 for Leeds)
+        district_share      : float (share of accidents in `district`)
+        seed                : int
+    Return:
+        tables              : dict (pd.DataFrame at the internal name of each dataset)
+    """
+    rng = np.random.default_rng(seed)
+    indexes = pd.Series(np.arange(n_accidents)).astype(str).str.zfill(9).radd('2019').to_numpy(dtype=object)
+
+    tables = {}
+    for dataset_name, names in COLUMNS.items():
+        attributes = read_column_attributes(os.path.join(attributes_path, f'{dataset_name}_column_attributes.csv'))
+        n = int(round(n_accidents * ROWS_PER_ACCIDENT[dataset_name]))
+        accidents = np.arange(n) if dataset_name == 'accidents' else np.sort(rng.integers(0, n_accidents, n))
+
+        columns = {}
+        for i, name in enumerate(names):
+            if name == 'Accident_Index': columns[name] = indexes[accidents]
+            elif name == 'Location_Easting_OSGR': columns[name] = rng.uniform(100000, 650000, n).round()
+            elif name == 'Location_Northing_OSGR': columns[name] = rng.uniform(10000, 1200000, n).round()
+            elif name == 'Longitude': columns[name] = -7 + (columns['Location_Easting_OSGR'] - 100000) / 550000 * 8.7
+            elif name == 'Latitude': columns[name] = 49.9 + columns['Location_Northing_OSGR'] / 1200000 * 10.9
+            elif name == 'Local_Authority_(District)':
+                columns[name] = np.where(rng.random(n) < district_share, district, synthetic_codes(name, dataset_name, n, rng, registry))
+            elif name == 'Local_Authority_(Highway)': columns[name] = pd.Series(rng.integers(0, 200, n)).astype(str).str.zfill(6).radd('E08').to_numpy(dtype=object)
+            elif name == 'LSOA_of_Accident_Location': columns[name] = pd.Series(rng.integers(0, 35000, n)).astype(str).str.zfill(6).radd('E01').to_numpy(dtype=object)
+            else: columns[name] = synthetic_codes(name, dataset_name, n, rng, registry)
+        tables[dataset_name] = pd.DataFrame(columns)
+        assert len(attributes) == tables[dataset_name].shape[1], f'Column attributes of {dataset_name} do not match `COLUMNS`.'
+
+    return tables
+
+# mean hourly count per direction of every vehicle class of `synthetic_road_flow` (hgvs are split by axles)
+FLOW_RATES = {'pedal_cycles': 8, 'two_wheeled_motor_vehicles': 6, 'cars_and_taxis': 450, 'buses_and_coaches': 8, 'lgvs': 80, 'hgvs_2_rigid_axle': 10, 'hgvs_3_rigid_axle': 2, 'hgvs_4_or_more_rigid_axle': 2, 'hgvs_3_or_4_articulated_axle': 2, 'hgvs_5_articulated_axle': 4, 'hgvs_6_articulated_axle': 6}
+
+def synthetic_road_flow(n_points, years=range(2015, 2020), n_areas=5, hours=range(7, 19), seed=0):
+    """
+    Function to generate a synthetic stand-in of a DfT raw count table (ie. `dft_rawcount_local_authority_id_63.csv`), at any scale: every count point is counted on one day of every year, in both directions for every hour of `hours`. Counts are Poisson around a traffic level per count point; minor roads have no link length, as in the published tables.
+
+    Parameters:
+        n_points            : int (number of count points)
+        years               : list
+        n_areas             : int (number of local authorities, numbered from 1)
+        hours               : list (counted hours of the day)
+        seed                : int
+    Return:
+        flows               : pd.DataFrame (one row per count point, year, direction and hour)
+    """
+    rng = np.random.default_rng(seed)
+    years, hours = np.asarray(list(years)), np.asarray(list(hours))
+    points = pd.DataFrame({
+        'count_point_id': np.arange(n_points) + 1000,
+        'region_id': 1,
+        'region_name': 'Synthetic',
+        'local_authority_id': rng.integers(1, n_areas + 1, n_points),
+        'road_type': np.where(rng.random(n_points) < .6, 'Major', 'Minor'),
+        'easting': rng.uniform(400000, 450000, n_points).round(),
+        'northing': rng.uniform(400000, 450000, n_points).round(),
+        'level': rng.lognormal(0, .5, n_points)})
+    points['local_authority_name'] = 'Authority ' + points['local_authority_id'].astype(str)
+    points['link_length_km'] = np.where(points['road_type'] == 'Major', rng.uniform(.2, 5, n_points).round(2), np.nan)
+    points['link_length_miles'] = (points['link_length_km'] / 1.609344).round(2)
+
+    # one row per count point, year, direction and hour
+    point, year, direction, hour = [grid.ravel() for grid in np.meshgrid(np.arange(n_points), years, [0, 1], hours, indexing='ij')]
+    flows = points.iloc[point].reset_index(drop=True)
+    flows.insert(1, 'direction_of_travel', np.array(['N', 'S'])[direction])
+    flows.insert(2, 'year', year)
+    first = pd.to_datetime(pd.DataFrame({'year': years, 'month': 3, 'day': 1})).to_numpy(dtype='datetime64[D]')
+    day = np.tile(first, n_points) + rng.integers(0, 200, n_points * len(years)) # one count date per count point and year
+    flows.insert(3, 'count_date', np.datetime_as_string(day)[np.repeat(np.arange(n_points * len(years)), 2 * len(hours))])
+    flows.insert(4, 'hour', hour)
+
+    for name, rate in FLOW_RATES.items(): flows[name] = rng.poisson(rate * flows['level'])
+    flows['all_hgvs'] = flows[[name for name in FLOW_RATES if name.startswith('hgvs')]].sum(axis=1)
+    flows['all_motor_vehicles'] = flows[['two_wheeled_motor_vehicles', 'cars_and_taxis', 'buses_and_coaches', 'lgvs', 'all_hgvs']].sum(axis=1)
+    return flows.drop(columns='level')
+
+def benchmark_cases(tables, summaries, output_dir, district=204, map_rows=5000):
+    """
+    Function to list the benchmarked public functions of `project1` on the given tables: processing, linking, summaries, associations, plots, maps and exports. Maps are limited to the first `map_rows` accidents, since one marker is drawn per accident.
+
+    Return:
+        cases               : list (tuples (benchmark name, number of input rows, function without arguments))
+    """
+    import matplotlib.pyplot as plt
+    from .processing import check_indexes_in_subset, check_columns_for_missing_values
+    from .numerical_summary import compute_numerical_summary
+    from .associations import association_matrix, categorical_columns
+    from .visualisations import barplot, categorical_association_test
+    from .spatial_visualisation import map_accidents
+    from .save import save_numerical_report, save_all_single_variable_analysis, save_map
+
+    accidents = tables['accidents']
+    index = AccidentIndex(accidents)
+    severity = index.link(tables['vehicles'], 'Accident_Severity')
+    computed = {}
+    for dataset_name in tables:
+        computed[dataset_name] = copy_summary(summaries[dataset_name])
+        compute_numerical_summary(computed[dataset_name], tables[dataset_name])
+    map_data = accidents.iloc[:map_rows]
+    light = [i for i, c in computed['accidents'].items() if c['Name'] == 'Light_Conditions'][0]
+
+    def figure(function, *args, **kwargs):
+        result = function(*args, **kwargs)
+        plt.close('all')
+        return result
+
+    cases = [
+        ('processing.check_indexes_in_subset', len(tables['casualties']), lambda: check_indexes_in_subset(tables['casualties']['Accident_Index'], accidents['Accident_Index'])),
+        ('processing.check_columns_for_missing_values', len(accidents), lambda: check_columns_for_missing_values(accidents)),
+        ('linking.AccidentIndex', len(accidents), lambda: AccidentIndex(accidents)),
+        ('linking.subset_by_district', sum(len(t) for t in tables.values()), lambda: index.subset_by_district(tables, district)),
+        ('linking.link', len(tables['vehicles']), lambda: index.link(tables['vehicles'], 'Accident_Severity'))]
+    for dataset_name in tables:
+        cases.append((f'numerical_summary.compute_numerical_summary[{dataset_name}]', len(tables[dataset_name]), lambda d=dataset_name: compute_numerical_summary(copy_summary(summaries[d]), tables[d])))
+    cases += [
+        ('associations.association_matrix[accidents]', len(accidents), lambda: association_matrix(accidents, categorical_columns(computed['accidents']))),
+        ('visualisations.categorical_association_test', len(tables['vehicles']), lambda: figure(categorical_association_test, None, computed['accidents'][6], severity, computed['vehicles'][2], np.asarray(tables['vehicles'].iloc[:, 2]))),
+        ('visualisations.barplot', len(accidents), lambda: figure(barplot, computed['accidents'][light])),
+        ('spatial_visualisation.map_accidents', len(map_data), lambda: map_accidents(map_data, computed['accidents'], centroid=[53.8, -1.55], colors=['black', 'red', 'green'])),
+        ('spatial_visualisation.map_accidents[fast]', len(map_data), lambda: map_accidents(map_data, computed['accidents'], centroid=[53.8, -1.55], colors=['black', 'red', 'green'], fast=True)),
+        ('save.save_map', len(map_data), lambda: save_map(map_accidents(map_data, computed['accidents'], centroid=[53.8, -1.55], colors=['black', 'red', 'green'], fast=True), output_dir + '/maps/', 'map')),
+        ('save.save_numerical_report', len(accidents), lambda: save_numerical_report(computed['accidents'], output_dir + '/', 'report')),
+        ('save.save_all_single_variable_analysis[accidents]', len(accidents), lambda: save_all_single_variable_analysis(computed['accidents'], output_dir + '/figures/'))]
+    return cases
+
+def measure(function, repeat=3):
+    """
+    Helper-Function to measure a function: the best wall time of `repeat` calls, and the peak memory allocated during one additional call traced by `tracemalloc` (run separately, since tracing slows down allocations). Output of the function (ie. progress of the exporters) is discarded.
+
+    Return:
+        seconds             : float
+        peak                : float (peak traced memory in MB)
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, seconds = timed(function, repeat=repeat)
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return seconds, peak / 2**20
+
+def measure_import(module, repeat=3):
+    """
+    Helper-Function to measure the import of a module in fresh interpreters (as a short-lived job or worker process would pay it): the best wall time of `repeat` imports, the peak memory allocated by the import and the heavy dependencies (see `HEAVY`) that it loaded.
+
+    Return:
+        seconds             : float
+        peak                : float (peak traced memory in MB)
+        heavy               : list (names of the loaded heavy dependencies)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + [path for path in [os.environ.get('PYTHONPATH')] if path]))
+    def run(trace):
+        # memory is traced in one additional run, since tracing slows down the import
+        code = f"import sys, time, tracemalloc; tracemalloc.start() if {trace} else None; start = time.perf_counter(); import {module}; seconds = time.perf_counter() - start; print(seconds, tracemalloc.get_traced_memory()[1] / 2**20, ','.join(name for name in {HEAVY!r} if name in sys.modules))"
+        return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env).stdout.split()
+
+    seconds = min(float(run(False)[0]) for _ in range(repeat))
+    output = run(True)
+    return seconds, float(output[1]), output[2].split(',') if len(output) > 2 else []
+
+def run_benchmarks(scales, attributes_path, registry=None, only=None, repeat=3, map_rows=5000, output=None, seed=0):
+    """
+    Function to run the benchmark suite (see `benchmark_cases`) on synthetic tables of every scale and collect the results in a machine-readable form, ie. to compare against a stored baseline with `compare_to_baseline`. The import time of every module in `IMPORTS` is measured first (as benchmarks 'import.<module>' at scale 0).
+
+    Parameters:
+        scales              : list (numbers of accidents, ie. [1000, 100000, 1000000])
+        attributes_path     : str (see `synthetic_tables`)
+        registry            : LookupRegistry (see `synthetic_tables`)
+        only                : list (substrings of the benchmark names to run, None for all)
+        repeat              : int (repetitions per benchmark, best time is reported)
+        map_rows            : int (see `benchmark_cases`)
+        output              : str (path of the `json` file to write the results to, None to not write them)
+        seed                : int
+    Return:
+        results             : dict ('meta': environment of the run, 'results': list of dicts per benchmark and scale)
+    """
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+
+    results = []
+    for module in IMPORTS:
+        name = f'import.{module}'
+        if only is not None and not any(pattern in name for pattern in only): continue
+        seconds, peak, heavy = measure_import(module, repeat=repeat)
+        results.append({'Benchmark': name, 'Scale': 0, 'Rows': 0, 'Seconds': seconds, 'Peak Memory (MB)': peak, 'Heavy Imports': heavy})
+        print(f"{name}: {seconds:.4f}s, {peak:.1f} MB (heavy imports: {', '.join(heavy) or 'none'})")
+
+    for scale in scales:
+        tables = synthetic_tables(scale, attributes_path, registry=registry, seed=seed)
+        summaries = initial_summaries(tables, attributes_path, registry=registry)
+        with tempfile.TemporaryDirectory() as output_dir:
+            for name, rows, function in benchmark_cases(tables, summaries, output_dir, map_rows=map_rows):
+                if only is not None and not any(pattern in name for pattern in only): continue
+                seconds, peak = measure(function, repeat=repeat)
+                results.append({'Benchmark': name, 'Scale': scale, 'Rows': rows, 'Seconds': seconds, 'Peak Memory (MB)': peak})
+                print(f"{name} [{scale}]: {seconds:.4f}s, {peak:.1f} MB")
+
+    meta = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__, 'platform': platform.platform(), 'repeat': repeat}
+    run = {'meta': meta, 'results': results}
+    if output is not None:
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as f: json.dump(run, f, indent=1)
+    return run
+
+def compare_to_baseline(run, baseline, threshold=.2, min_seconds=1e-3):
+    """
+    Function to compare benchmark results against a baseline. A benchmark regressed if it got slower or used more peak memory by more than `threshold` (relative); timings below `min_seconds` are too noisy to be flagged.
+
+    Parameters:
+        run                 : dict or str (results of `run_benchmarks`, or the path of their `json` file)
+        baseline            : dict or str (results of `run_benchmarks`, or the path of their `json` file)
+        threshold           : float (tolerated relative slowdown, ie. .2 for 20%)
+        min_seconds         : float
+    Return:
+        comparison          : pd.DataFrame (baseline and current time and memory per benchmark and scale, their ratio and whether it regressed)
+    """
+    runs = []
+    for results in [run, baseline]:
+        if isinstance(results, str):
+            with open(results) as f: results = json.load(f)
+        runs.append(pd.DataFrame(results['results']).set_index(['Benchmark', 'Scale'])[['Seconds', 'Peak Memory (MB)']])
+
+    comparison = runs[1].join(runs[0], how='inner', lsuffix=' (Baseline)', rsuffix=' (Current)')
+    comparison['Time Ratio'] = comparison['Seconds (Current)'] / comparison['Seconds (Baseline)']
+    comparison['Memory Ratio'] = comparison['Peak Memory (MB) (Current)'] / comparison['Peak Memory (MB) (Baseline)']
+    slower = (comparison['Time Ratio'] > 1 + threshold) & (comparison[['Seconds (Current)', 'Seconds (Baseline)']].max(axis=1) >= min_seconds)
+    comparison['Regression'] = slower | (comparison['Memory Ratio'] > 1 + threshold)
+    return comparison.reset_index()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the project1 benchmark suite on synthetic STATS19 tables.')
+    parser.add_argument('--scales', type=int, nargs='*', default=[1000], help='scales of the synthetic tables (none to only benchmark imports)')
+    parser.add_argument('--attributes', default='../data/references/column attributes/')
+    parser.add_argument('--lookup', default=None, help='path to `variable lookup.xls` (draw codes from its sheets)')
+    parser.add_argument('--only', nargs='+', default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--threshold', type=float, default=.2)
+    args = parser.parse_args()
+
+    registry = None
+    if args.lookup is not None:
+        from .lookup import LookupRegistry
+        registry = LookupRegistry.load(args.lookup)
+
+    run = run_benchmarks(args.scales, args.attributes, registry=registry, only=args.only, repeat=args.repeat, output=args.output)
+    if args.baseline is not None:
+        comparison = compare_to_baseline(run, args.baseline, threshold=args.threshold)
+        print(comparison.to_string(index=False))
+        sys.exit(1 if comparison['Regression'].any() else 0)
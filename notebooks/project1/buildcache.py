@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import hashlib
+import inspect
+import numpy as np
+import pandas as pd
+
+def _update(sha1, obj):
+    """
+    Helper-Function feeding an object into a hash in a canonical form: arrays and pandas objects by their content, dicts independent of their insertion order.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        sha1.update(b'pandas')
+        _update(sha1, list(obj.columns) if isinstance(obj, pd.DataFrame) else obj.name)
+        sha1.update(pd.util.hash_pandas_object(obj, index=False).values.tobytes())
+    elif isinstance(obj, np.ndarray):
+        sha1.update(f'ndarray{obj.dtype}{obj.shape}'.encode())
+        if obj.dtype == object: _update(sha1, obj.tolist())
+        else: sha1.update(np.ascontiguousarray(obj).tobytes())
+    elif hasattr(obj, '__array__') and not isinstance(obj, type):
+        _update(sha1, np.asarray(obj)) # ie. `ColumnRef` to a memory-mapped column
+    elif isinstance(obj, dict):
+        sha1.update(b'dict')
+        for key in sorted(obj, key=repr):
+            _update(sha1, key); _update(sha1, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        sha1.update(f'{type(obj).__name__}{len(obj)}'.encode())
+        for item in obj: _update(sha1, item)
+    elif callable(obj):
+        _update(sha1, function_version(obj))
+    else:
+        sha1.update(repr(obj).encode())
+
+def fingerprint(*inputs):
+    """
+    Function to compute the fingerprint (sha1) of all inputs of an artifact, ie. the column data, its SUMMARY entry, plot parameters and the plotting function.
+
+    Parameters:
+        *inputs             : any (arrays, pd.DataFrames, dicts, lists, scalars or functions)
+    Return:
+        fingerprint         : str
+    """
+    sha1 = hashlib.sha1()
+    for obj in inputs: _update(sha1, obj)
+    return sha1.hexdigest()
+
+def function_version(function):
+    """
+    Helper-Function returning the version of a function as the hash of its source code, so that artifacts are rebuilt whenever the function producing them changes.
+    """
+    try: source = inspect.getsource(function)
+    except (OSError, TypeError): source = getattr(function, '__qualname__', repr(function))
+    return hashlib.sha1(source.encode()).hexdigest()
+
+class BuildCache:
+    """
+    Build cache for report artifacts (csv, json, pdf, html). For every artifact, the manifest stores the fingerprint of its inputs and the file it was written to. An artifact whose file exists and whose fingerprint is unchanged is skipped; all others are rebuilt. The manifest also lists what the current run rebuilt (and why) and what it skipped.
+
+    Artifacts are identified by a key, which is their path unless the filename depends on the result (ie. figures named after their Cramér's V, keyed by the filename template). Checks and records only update the cache in memory; the manifest is written by `write`, once per run or stage, or on leaving a `with BuildCache(...) as cache:` block.
+
+    Parameters:
+        manifest_path       : str (path to the manifest `json` file, ie. '../reports/leeds/manifest.json')
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.artifacts = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f: self.artifacts = json.load(f).get('artifacts', {})
+        self.rebuilt, self.skipped = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # artifacts are only recorded once built, so the manifest is also written after a failed build
+        self.write()
+        return False
+
+    def check(self, key, fingerprint):
+        """
+        Returns why an artifact has to be rebuilt ('new', 'missing' or 'changed'), or None if it is up to date.
+        """
+        if key not in self.artifacts: return 'new'
+        if not os.path.exists(self.artifacts[key]['File']): return 'missing'
+        if self.artifacts[key]['Fingerprint'] != fingerprint: return 'changed'
+        return None
+
+    def skip(self, key):
+        self.skipped.append(key)
+
+    def record(self, key, fingerprint, reason, file=None):
+        """
+        Records a rebuilt artifact with the fingerprint of its inputs and the file it was written to (defaults to `key`).
+        """
+        self.artifacts[key] = {'Fingerprint': fingerprint, 'File': file or key}
+        self.rebuilt.append({'Artifact': file or key, 'Reason': reason})
+
+    def write(self):
+        """
+        Writes the manifest (atomically, so an interrupted run never leaves a broken manifest).
+        """
+        os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+        manifest = {'updated': time.strftime('%Y-%m-%d %H:%M:%S'), 'rebuilt': self.rebuilt, 'skipped': self.skipped, 'artifacts': self.artifacts}
+        with open(self.manifest_path + '.tmp', 'w') as f: json.dump(manifest, f, indent=1)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+    def report(self):
+        """
+        Returns what the current run rebuilt (and why) and skipped.
+
+        Return:
+            report          : pd.DataFrame (one row per artifact)
+        """
+        return pd.DataFrame(self.rebuilt + [{'Artifact': key, 'Reason': 'skipped (unchanged)'} for key in self.skipped], columns=['Artifact', 'Reason'])
+
+def cached(cache, key, inputs, build):
+    """
+    Function to build an artifact through the build cache: `build` is only called if the artifact is not up to date. Without cache, the artifact is always built. The artifact is only recorded (or skipped) in the cache; the owner of the cache writes the manifest once (see `BuildCache`).
+
+    Parameters:
+        cache               : BuildCache (or None)
+        key                 : str (key of the artifact, see `BuildCache`)
+        inputs              : tuple (all inputs of the artifact, see `fingerprint`)
+        build               : callable (builds and writes the artifact, may return the written file)
+    Return:
+        built               : boolean (True if the artifact was built)
+    """
+    if cache is None:
+        build()
+        return True
+
+    fp = fingerprint(*inputs)
+    reason = cache.check(key, fp)
+    if reason is None:
+        cache.skip(key)
+        return False
+
+    file = build()
+    cache.record(key, fp, reason, file=file)
+    return True
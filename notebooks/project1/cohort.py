@@ -0,0 +1,206 @@
+import numpy as np
+from .linking import AccidentIndex
+from .instrument import instrumented
+
+# number of set bits of every byte value
+POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+class CohortIndex:
+    """
+    Bitmap index over the coded columns of the three datasets, for building cohorts (ie. the bikes of Leeds: `Vehicle_Type == 1` within `Local_Authority_(District) == 204`) without scanning the tables again for every cohort. For every coded column, one bitmap per code (one bit per row, packed into bytes) is built at the first query of the column. A condition on a column is then the bitwise OR of the bitmaps of its codes, and conditions are combined by bitwise AND, OR and NOT (see `Cohort`).
+
+    The rows of the casualties and vehicles are resolved to their accident once (through `AccidentIndex`), so that cohorts propagate through the linkage: a cohort of vehicles is lifted to the accidents having at least one such vehicle, and a cohort of accidents selects all casualties and vehicles of its accidents.
+
+    Parameters:
+        tables              : dict (holding the datasets at keys 'accidents', 'casualties', 'vehicles')
+        max_codes           : int (columns with more distinct values are not indexed, ie. `Accident_Index`)
+    """
+    @instrumented
+    def __init__(self, tables, max_codes=1024):
+        self.tables, self.max_codes = tables, max_codes
+        self.index = AccidentIndex(tables['accidents'])
+        self.sizes = {dataset: data.shape[0] for dataset, data in tables.items()}
+        self.positions = {dataset: self.index.positions(data['Accident_Index']) for dataset, data in tables.items() if dataset != 'accidents'}
+        self.bitmaps = {} # (dataset, column): {code: packed bitmap}
+        self._vehicle_of_casualties = None
+
+    def _bitmaps(self, dataset, column):
+        # bitmaps of all codes of a column, built at its first query
+        key = (dataset, column)
+        if key not in self.bitmaps:
+            codes, inverse = np.unique(np.asarray(self.tables[dataset][column]), return_inverse=True)
+            if len(codes) > self.max_codes: raise ValueError(f'{column} has {len(codes)} distinct values, more than max_codes={self.max_codes}.')
+
+            # rows grouped by code once, then one bitmap per code
+            order = np.argsort(inverse.ravel(), kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(inverse.ravel(), minlength=len(codes)))])
+            bitmaps, mask = {}, np.zeros(self.sizes[dataset], dtype=bool)
+            for i, code in enumerate(codes.tolist()):
+                rows = order[offsets[i]:offsets[i + 1]]
+                mask[rows] = True
+                bitmaps[code] = np.packbits(mask)
+                mask[rows] = False
+            self.bitmaps[key] = bitmaps
+        return self.bitmaps[key]
+
+    def empty(self, dataset):
+        """
+        Returns the cohort without any row of a dataset.
+        """
+        return Cohort(self, dataset, np.zeros((self.sizes[dataset] + 7) // 8, dtype=np.uint8))
+
+    def all(self, dataset):
+        """
+        Returns the cohort of all rows of a dataset.
+        """
+        return ~self.empty(dataset)
+
+    def where(self, dataset, conditions=None, **kwargs):
+        """
+        Function returning the cohort of the rows of a dataset that meet all conditions. A condition maps a column to one code or a list of codes (the column takes any of them). Columns can also be given as keywords if their name allows it:
+
+            index.where('vehicles', Vehicle_Type=1) & index.where('accidents', {'Road_Surface_Conditions': [2, 3], 'Accident_Severity': 1})
+
+        Parameters:
+            dataset         : str (internal name of the dataset)
+            conditions      : dict (column: code or list of codes)
+        Return:
+            cohort          : Cohort
+        """
+        cohort = self.all(dataset)
+        for i, (column, values) in enumerate({**(conditions or {}), **kwargs}.items()):
+            bitmaps = self._bitmaps(dataset, column)
+            bits = np.zeros_like(cohort.bits)
+            for value in np.atleast_1d(values).tolist():
+                if value in bitmaps: np.bitwise_or(bits, bitmaps[value], out=bits)
+            cohort = Cohort(self, dataset, bits) if i == 0 else cohort & Cohort(self, dataset, bits)
+        return cohort
+
+    def vehicle_of_casualties(self):
+        """
+        Returns the row position of the vehicle of every casualty (by accident and `Vehicle_Reference`, -1 if there is none; the first one for duplicated references), resolved once.
+        """
+        if self._vehicle_of_casualties is None:
+            references = {dataset: np.asarray(self.tables[dataset]['Vehicle_Reference'], dtype=np.int64) for dataset in ['casualties', 'vehicles']}
+            width = int(max(references['casualties'].max(initial=0), references['vehicles'].max(initial=0))) + 2
+            keys = {dataset: self.positions[dataset].astype(np.int64) * width + references[dataset] + 1 for dataset in references}
+
+            uniques, first = np.unique(keys['vehicles'], return_index=True)
+            found = np.clip(np.searchsorted(uniques, keys['casualties']), 0, max(len(uniques) - 1, 0))
+            matched = (self.positions['casualties'] >= 0) & (uniques[found] == keys['casualties']) if len(uniques) else np.zeros(self.sizes['casualties'], dtype=bool)
+            self._vehicle_of_casualties = np.where(matched, first[found] if len(uniques) else -1, -1)
+        return self._vehicle_of_casualties
+
+    def mask(self, cohort, dataset):
+        # boolean mask of a cohort over the rows of `dataset`, propagated through the linkage
+        mask = np.unpackbits(cohort.bits, count=self.sizes[cohort.dataset]).astype(bool)
+        if dataset == cohort.dataset: return mask
+
+        if cohort.dataset != 'accidents':
+            # lift to the accidents having at least one selected row
+            positions = self.positions[cohort.dataset]
+            accidents = np.zeros(self.sizes['accidents'], dtype=bool)
+            accidents[positions[mask & (positions >= 0)]] = True
+            mask = accidents
+            if dataset == 'accidents': return mask
+
+        positions = self.positions[dataset]
+        return (positions >= 0) & mask[np.where(positions >= 0, positions, 0)]
+
+class Cohort:
+    """
+    Rows of one dataset selected through a `CohortIndex`, held as a packed bitmap. Cohorts of the same dataset are combined with `&`, `|`, `^` and `~` directly on the bitmaps; cohorts of different datasets are first lifted to the accidents (see `CohortIndex`), ie. `bikes & wet` selects the accidents with a bike on a wet road. The selection feeds the existing functions through `mask`, `positions` or `tables`:
+
+        cohort = index.where('vehicles', Vehicle_Type=1) & index.where('accidents', {'Local_Authority_(District)': 204})
+        compute_numerical_summary(SUMMARY['vehicles'], cohort.tables()['vehicles'])
+
+    Parameters:
+        index               : CohortIndex
+        dataset             : str (internal name of the dataset the bitmap refers to)
+        bits                : np.array (packed bitmap, one bit per row)
+    """
+    def __init__(self, index, dataset, bits):
+        self.index, self.dataset, self.bits = index, dataset, bits
+
+    def on(self, dataset):
+        """
+        Returns the cohort propagated to the rows of another dataset.
+        """
+        if dataset == self.dataset: return self
+        return Cohort(self.index, dataset, np.packbits(self.index.mask(self, dataset)))
+
+    def _combine(self, other, operation):
+        if other.dataset != self.dataset:
+            return operation(self.on('accidents'), other.on('accidents'))
+        return Cohort(self.index, self.dataset, operation(self.bits, other.bits))
+
+    def __and__(self, other):
+        return self._combine(other, lambda a, b: a & b)
+
+    def __or__(self, other):
+        return self._combine(other, lambda a, b: a | b)
+
+    def __xor__(self, other):
+        return self._combine(other, lambda a, b: a ^ b)
+
+    def __invert__(self):
+        bits = ~self.bits
+        tail = self.index.sizes[self.dataset] % 8
+        if tail and len(bits): bits[-1] &= np.uint8(0xFF << (8 - tail) & 0xFF) # padding bits stay unset
+        return Cohort(self.index, self.dataset, bits)
+
+    def __len__(self):
+        return int(POPCOUNT[self.bits].sum(dtype=np.int64))
+
+    def count(self, dataset=None):
+        """
+        Returns the number of selected rows (of `dataset`, defaults to the dataset of the cohort).
+        """
+        return len(self.on(dataset or self.dataset))
+
+    def mask(self, dataset=None):
+        """
+        Returns the cohort as boolean mask over the rows of `dataset` (defaults to the dataset of the cohort).
+        """
+        return self.index.mask(self, dataset or self.dataset)
+
+    def positions(self, dataset=None):
+        """
+        Returns the row positions (for `iloc`) of the cohort in `dataset`.
+        """
+        return np.flatnonzero(self.mask(dataset))
+
+    def accident_indexes(self):
+        """
+        Returns the `Accident_Index` values of the accidents of the cohort.
+        """
+        return self.index.index.select(self.mask('accidents'))
+
+    def tables(self, datasets=None, keep_rows=False):
+        """
+        Function returning the rows of the accidents of the cohort in every dataset (the same structure as `AccidentIndex.subset`, ie. `DATA_LEEDS_BIKES[dataset]['all']` for a cohort of bikes). With `keep_rows`, the dataset of the cohort only keeps the selected rows (ie. `DATA_LEEDS_BIKES['vehicles']['bikers']`).
+
+        Parameters:
+            datasets        : list (internal names of the datasets, defaults to all)
+            keep_rows       : boolean
+        Return:
+            subsets         : dict (pd.DataFrame at the internal name of each dataset)
+        """
+        accidents = self.on('accidents')
+        subsets = {}
+        for dataset in datasets or list(self.index.tables):
+            cohort = self if keep_rows and dataset == self.dataset else accidents
+            subsets[dataset] = self.index.tables[dataset].iloc[cohort.positions(dataset)]
+        return subsets
+
+    def casualties(self):
+        """
+        Returns the cohort of the casualties of the selected vehicles (matched by accident and `Vehicle_Reference`), ie. the casualties riding a bike (`DATA_LEEDS_BIKES['casualties']['bikers']`).
+        """
+        assert self.dataset == 'vehicles', 'Casualties are matched to a cohort of vehicles.'
+        vehicle = self.index.vehicle_of_casualties()
+        selected = np.unpackbits(self.bits, count=self.index.sizes['vehicles']).astype(bool)
+        return Cohort(self.index, 'casualties', np.packbits((vehicle >= 0) & selected[np.where(vehicle >= 0, vehicle, 0)]))
+
+    def __repr__(self):
+        return f'Cohort({self.dataset}, {len(self)} of {self.index.sizes[self.dataset]} rows)'
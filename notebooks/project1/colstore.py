@@ -0,0 +1,179 @@
+import os
+import json
+import numpy as np
+from .lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# bump whenever the layout written by `write_store` changes, so that old stores are rewritten
+STORE_VERSION = 1
+
+# memory maps opened in this process (shared by all references to the same column file)
+_OPEN = {}
+
+def _open(path):
+    mapped = _OPEN.get(path)
+    if mapped is None:
+        mapped = _OPEN[path] = np.load(path, mmap_mode='r')
+    return mapped
+
+def write_store(data, directory):
+    """
+    Function to write a table as a columnar store: one fixed-width `npy` file per column and a small schema header (`schema.json`) holding the number of rows, the dtype of every column and the categories of encoded columns. Numeric, boolean and datetime columns are written as they are; strings and categoricals (ie. `Accident_Index`) are encoded as int32 codes into their sorted categories (-1 for missing). The schema is written last, so a store without schema is incomplete.
+
+    Parameters:
+        data                : pd.DataFrame
+        directory           : str (directory of the store, ie. PATH['data']['processed'] + 'store/accidents/')
+    Return:
+        store               : ColumnStore
+    """
+    os.makedirs(directory, exist_ok=True)
+    for path in [path for path in _OPEN if os.path.dirname(path) == os.path.normpath(directory)]:
+        del _OPEN[path]
+    schema = {'version': STORE_VERSION, 'rows': int(data.shape[0]), 'columns': []}
+
+    for position, name in enumerate(data.columns):
+        column = data.iloc[:, position]
+        entry = {'Name': name, 'File': f'{position}.npy'}
+        if not (pd.api.types.is_numeric_dtype(column.dtype) or pd.api.types.is_bool_dtype(column.dtype) or pd.api.types.is_datetime64_dtype(column.dtype)):
+            codes, categories = pd.factorize(column, sort=True)
+            values = codes.astype(np.int32)
+            entry['Categories'] = [str(category) for category in categories]
+        else:
+            values = column.to_numpy()
+            assert values.dtype != object, f'Column {name} has no fixed-width dtype.'
+        entry['Dtype'] = values.dtype.str
+        np.save(os.path.join(directory, entry['File']), np.ascontiguousarray(values), allow_pickle=False)
+        schema['columns'].append(entry)
+
+    with open(os.path.join(directory, 'schema.json'), 'w') as f: json.dump(schema, f, indent=1)
+    return ColumnStore(directory)
+
+def write_stores(tables, root):
+    """
+    Function to write each dataset of `tables` into its own store `root/<dataset>/` (see `write_store`).
+
+    Return:
+        stores              : dict (ColumnStore at the internal name of each dataset)
+    """
+    return {dataset: write_store(data, os.path.join(root, dataset)) for dataset, data in tables.items()}
+
+def open_stores(root, tablenames=('accidents', 'casualties', 'vehicles')):
+    """
+    Function to open the stores written by `write_stores`.
+    """
+    return {dataset: ColumnStore(os.path.join(root, dataset)) for dataset in tablenames}
+
+class ColumnRef:
+    """
+    Reference to one column of a `ColumnStore`. It is pickled as its file path only, so that sending a column to a worker process (ie. a figure job of `run_figure_jobs`) does not copy the data: the worker maps the same file read-only and shares the page cache with all other processes. Numpy functions accept the reference like an array (through `__array__`).
+
+    Parameters:
+        path                : str (path to the `npy` file of the column)
+        name                : str (name of the column)
+    """
+    def __init__(self, path, name):
+        self.path, self.name = path, name
+
+    def __array__(self, dtype=None, copy=None):
+        values = _open(self.path)
+        if dtype is not None: values = values.astype(dtype)
+        return np.array(values) if copy else values
+
+    def __len__(self):
+        return len(_open(self.path))
+
+    @property
+    def shape(self):
+        return _open(self.path).shape
+
+    @property
+    def dtype(self):
+        return _open(self.path).dtype
+
+    def __getitem__(self, key):
+        return _open(self.path)[key]
+
+    def __repr__(self):
+        return f'ColumnRef({self.path!r}, {self.name!r})'
+
+class ColumnStore:
+    """
+    Read-only access to a columnar store written by `write_store`. Columns are memory-mapped on first access, so that opening a store costs reading its schema only and columns are never copied: every process opening the same store shares the pages of its files. A store is pickled as its directory.
+
+    Parameters:
+        directory           : str (directory of the store)
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'schema.json')) as f: self.schema = json.load(f)
+        assert self.schema.get('version') == STORE_VERSION, f'Store {directory} was written by another version, rewrite it with `write_store`.'
+        self.columns = [entry['Name'] for entry in self.schema['columns']]
+        self._entries = {entry['Name']: entry for entry in self.schema['columns']}
+
+    def __getstate__(self):
+        return {'directory': self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'])
+
+    def __len__(self):
+        return self.schema['rows']
+
+    @property
+    def shape(self):
+        return (self.schema['rows'], len(self.columns))
+
+    def ref(self, column):
+        """
+        Returns a `ColumnRef` to a column (by name or position), ie. to send to worker processes.
+        """
+        entry = self._entries[self.columns[column]] if isinstance(column, (int, np.integer)) else self._entries[column]
+        return ColumnRef(os.path.join(self.directory, entry['File']), entry['Name'])
+
+    def column(self, column):
+        """
+        Returns a column (by name or position) as a read-only memory map, holding the codes for encoded columns.
+        """
+        return np.asarray(self.ref(column))
+
+    def __getitem__(self, column):
+        return self.column(column)
+
+    def categories(self, column):
+        """
+        Returns the categories of an encoded column (None for columns stored as they are).
+        """
+        name = self.columns[column] if isinstance(column, (int, np.integer)) else column
+        categories = self._entries[name].get('Categories')
+        return np.array(categories, dtype=object) if categories is not None else None
+
+    def decode(self, column):
+        """
+        Returns a column with the original values, ie. the strings of `Accident_Index` (this copies the column).
+        """
+        values, categories = self.column(column), self.categories(column)
+        if categories is None: return np.array(values)
+        decoded = np.full(len(values), None, dtype=object)
+        decoded[values >= 0] = categories[values[values >= 0]]
+        return decoded
+
+    def frame(self, columns=None, decode=True):
+        """
+        Function to materialise (some) columns as a pd.DataFrame, ie. for functions that need one. This copies the selected columns into memory.
+
+        Parameters:
+            columns         : list (names of the columns, defaults to all)
+            decode          : boolean (decode encoded columns, else keep their codes)
+        Return:
+            data            : pd.DataFrame
+        """
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame({name: self.decode(name) if decode else np.array(self.column(name)) for name in columns}, columns=columns)
+
+def column_data(data, position):
+    """
+    Helper-Function returning the column at `position` of a pd.DataFrame as an array, or of a `ColumnStore` as a `ColumnRef` (which is not copied when pickled).
+    """
+    if isinstance(data, ColumnStore): return data.ref(position)
+    return np.asarray(data.iloc[:, position])
@@ -0,0 +1,192 @@
+import itertools
+import numpy as np
+import pandas as pd
+from .associations import chi2_test
+from .instrument import instrumented
+
+def compact_counts(counts):
+    """
+    Helper-Function storing counts in the smallest unsigned integer type that holds them.
+    """
+    for dtype in [np.uint8, np.uint16, np.uint32]:
+        if counts.size == 0 or counts.max() <= np.iinfo(dtype).max:
+            return counts.astype(dtype)
+    return counts.astype(np.uint64)
+
+class CountCube:
+    """
+    Count cube over coded columns (ie. `Accident_Severity`, `Time`, `Day_of_Week`, `Light_Conditions`, ...). The columns (dimensions) are encoded once, then the counts of every chosen combination of dimensions (a cuboid) are stored as a dense integer array with one axis per dimension. Any group-by, slice or roll-up over the dimensions of a stored cuboid is answered from these arrays alone, without touching the data again. Missing values (-1) are kept as their own category, as in `get_uniques_and_counts`.
+
+    By default all pairs of dimensions are stored and, with `focus`, all triples of the focus and two other dimensions (ie. severity by hour and light). Cuboids are built from the largest to the smallest: one that is contained in an already built cuboid is rolled up from it instead of counted from the data.
+
+    Parameters:
+        data                : pd.DataFrame
+        dimensions          : list (names of the coded columns)
+        focus               : str (name of the dimension that is combined with every pair, ie. 'Accident_Severity')
+        combinations        : list (tuples of dimension names to store, overrides the default)
+        linked              : pd.DataFrame (columns aligned to the rows of `data`, ie. from `AccidentIndex.link`)
+    """
+    @instrumented
+    def __init__(self, data, dimensions, focus=None, combinations=None, linked=None):
+        if linked is not None:
+            data = pd.concat([data.reset_index(drop=True), pd.DataFrame(linked).reset_index(drop=True)], axis=1)
+        self.dimensions = list(dimensions)
+        if focus is not None and focus not in self.dimensions: self.dimensions.append(focus)
+        self.focus, self.total = focus, data.shape[0]
+
+        # encode every dimension once into dense codes 0, ..., #categories-1
+        self.categories, codes = {}, {}
+        for dimension in self.dimensions:
+            self.categories[dimension], inverse = np.unique(np.asarray(data[dimension]), return_inverse=True)
+            codes[dimension] = inverse.ravel()
+
+        if combinations is None:
+            combinations = list(itertools.combinations(self.dimensions, 2)) or [tuple(self.dimensions)]
+            if focus is not None:
+                others = [dimension for dimension in self.dimensions if dimension != focus]
+                combinations += [(focus,) + pair for pair in itertools.combinations(others, 2)]
+
+        self.cuboids = {}
+        for combination in sorted({self._key(c) for c in combinations}, key=len, reverse=True):
+            source = self._smallest_cuboid(combination)
+            if source is not None:
+                self.cuboids[combination] = compact_counts(self._roll_up(source, combination))
+            else:
+                shape = tuple(len(self.categories[dimension]) for dimension in combination)
+                flat = np.ravel_multi_index([codes[dimension] for dimension in combination], shape)
+                self.cuboids[combination] = compact_counts(np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape))
+
+    def _key(self, dimensions):
+        # cuboids are keyed by their dimensions in the order of `self.dimensions`
+        unknown = set(dimensions) - set(self.dimensions)
+        assert not unknown, f'{sorted(unknown)} are not dimensions of the cube.'
+        return tuple(dimension for dimension in self.dimensions if dimension in dimensions)
+
+    def _smallest_cuboid(self, dimensions):
+        # the stored cuboid with the fewest cells that contains all given dimensions
+        candidates = [key for key in self.cuboids if set(dimensions) <= set(key)]
+        if not candidates: return None
+        return min(candidates, key=lambda key: self.cuboids[key].size)
+
+    def _roll_up(self, key, dimensions):
+        # sum a stored cuboid over all axes not in `dimensions`
+        axes = tuple(i for i, dimension in enumerate(key) if dimension not in dimensions)
+        return self.cuboids[key].sum(axis=axes, dtype=np.int64)
+
+    def counts(self, by, where=None):
+        """
+        Function to count the rows per combination of categories of the dimensions in `by`, restricted to the rows whose dimensions in `where` take one of the given values (a slice). Answered from the smallest stored cuboid containing all used dimensions.
+
+        Parameters:
+            by              : str or list (dimensions to group by)
+            where           : dict (dimension: value or list of values, ie. {'Time': [7, 8, 9]})
+        Return:
+            counts          : np.array (one axis per dimension in `by`, in that order, see `categories` for the values)
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        where = where or {}
+        key = self._smallest_cuboid(set(by) | set(where))
+        if key is None:
+            raise KeyError(f'No stored combination holds the dimensions {sorted(set(by) | set(where))}. Add them to `combinations`.')
+
+        cuboid = self.cuboids[key].astype(np.int64)
+        for dimension, values in where.items():
+            values = np.atleast_1d(values)
+            positions = np.searchsorted(self.categories[dimension], values).clip(0, max(len(self.categories[dimension]) - 1, 0))
+            positions = positions[self.categories[dimension][positions] == values] if len(self.categories[dimension]) else positions[:0]
+            axis = key.index(dimension)
+            cuboid = np.take(cuboid, positions, axis=axis).sum(axis=axis, keepdims=True)
+
+        axes = tuple(i for i, dimension in enumerate(key) if dimension not in by)
+        counts = cuboid.sum(axis=axes)
+        order = [dimension for dimension in key if dimension in by]
+        return np.transpose(counts, [order.index(dimension) for dimension in by])
+
+    def table(self, by, where=None):
+        """
+        Function returning `counts` labelled with the categories: a pd.Series for one dimension, a pd.DataFrame (first dimension as index) for two.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        counts = self.counts(by, where)
+        if len(by) == 1:
+            return pd.Series(counts, index=pd.Index(self.categories[by[0]], name=by[0]), name='Count')
+        if len(by) == 2:
+            return pd.DataFrame(counts, index=pd.Index(self.categories[by[0]], name=by[0]), columns=pd.Index(self.categories[by[1]], name=by[1]))
+        index = pd.MultiIndex.from_product([self.categories[dimension] for dimension in by], names=by)
+        return pd.Series(counts.ravel(), index=index, name='Count')
+
+    def uniques(self, dimension, where=None, keep_empty=False):
+        """
+        Function returning the counts of a dimension as the `Uniques` of SUMMARY ({value: count}, sorted by value). Categories without rows in the slice are left out, as `np.unique` would.
+        """
+        counts = self.counts([dimension], where)
+        return {value: count for value, count in zip(self.categories[dimension].tolist(), counts.tolist()) if keep_empty or count > 0}
+
+    def summary(self, summary, where=None):
+        """
+        Function returning a copy of the SUMMARY of a column with `Uniques` counted from the cube, ie. to draw a `barplot` of a slice:
+
+            barplot(cube.summary(SUMMARY['accidents'][24], where={'Accident_Severity': 1}))
+
+        Parameters:
+            summary         : dict (SUMMARY of the column, its `Name` must be a dimension of the cube)
+            where           : dict (see `counts`)
+        Return:
+            summary         : dict
+        """
+        return dict(summary, Uniques=self.uniques(summary['Name'], where))
+
+    def contingency(self, a, b, where=None):
+        """
+        Function returning the contingency table of two dimensions without missing values (categories smaller than 0), as counted by `associations.contingency_table`.
+        """
+        if a == b:
+            return np.diag(self.counts([a], where)[self._valid(a)])
+        return self.counts([a, b], where)[self._valid(a)][:, self._valid(b)]
+
+    def _valid(self, dimension):
+        # mask of the categories that are not missing values
+        categories = self.categories[dimension]
+        return categories >= 0 if categories.dtype.kind in 'iuf' else np.ones(len(categories), dtype=bool)
+
+    def association_matrix(self, dimensions=None, where=None, correction=True):
+        """
+        Function to compute Pearson's Chi Squared test and Cramér's V for every pair of dimensions from the cube (see `associations.association_matrix`, same results).
+
+        Parameters:
+            dimensions      : list (defaults to all dimensions)
+            where           : dict (see `counts`, ie. to test within one severity)
+            correction      : boolean (see `associations.chi2_test`)
+        Return:
+            matrices        : dict (pd.DataFrame (dimensions x dimensions) at keys 'V', 'p', 'chi2', 'dof')
+        """
+        dimensions = list(dimensions or self.dimensions)
+        matrices = {key: np.full((len(dimensions), len(dimensions)), np.nan) for key in ['V', 'p', 'chi2', 'dof']}
+        for i in range(len(dimensions)):
+            for j in range(i, len(dimensions)):
+                observed = self.contingency(dimensions[i], dimensions[j], where)
+                chiVal, pVal, dof, V = chi2_test(observed, correction=correction)
+                for key, value in zip(['chi2', 'p', 'dof', 'V'], [chiVal, pVal, dof, V]):
+                    matrices[key][i, j] = matrices[key][j, i] = value
+
+        return {key: pd.DataFrame(matrix, index=dimensions, columns=dimensions) for key, matrix in matrices.items()}
+
+    def association_with(self, target, dimensions=None, where=None, correction=True):
+        """
+        Function to compute the association of every dimension with one target dimension (ie. `Accident_Severity`) from the cube (see `associations.association_with`).
+
+        Return:
+            associations    : pd.DataFrame (chi2, p, dof and V per dimension, sorted by V)
+        """
+        dimensions = [d for d in (dimensions or self.dimensions) if d != target]
+        rows = []
+        for dimension in dimensions:
+            chiVal, pVal, dof, V = chi2_test(self.contingency(target, dimension, where), correction=correction)
+            rows.append({'Name': dimension, 'chi2': chiVal, 'p': pVal, 'dof': dof, 'V': V})
+        return pd.DataFrame(rows).sort_values('V', ascending=False).reset_index(drop=True)
+
+    def nbytes(self):
+        """
+        Returns the memory held by all stored cuboids in bytes.
+        """
+        return sum(cuboid.nbytes for cuboid in self.cuboids.values())
@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+from .linking import AccidentIndex
+from .instrument import instrumented
+from .lazy import lazy_import
+
+# scipy and matplotlib are imported at their first use
+stats = lazy_import('scipy.stats')
+plt = lazy_import('matplotlib.pyplot')
+
+# vehicle classes of the DfT road traffic counts and the STATS19 `Vehicle_Type` codes they cover
+VEHICLE_CLASSES = {
+    'pedal_cycles': [1],
+    'two_wheeled_motor_vehicles': [2, 3, 4, 5, 23, 97],
+    'cars_and_taxis': [8, 9],
+    'buses_and_coaches': [10, 11],
+    'lgvs': [19],
+    'all_hgvs': [20, 21, 98]}
+VEHICLE_CLASSES['all_motor_vehicles'] = [code for name, codes in VEHICLE_CLASSES.items() if name != 'pedal_cycles' for code in codes]
+
+# columns of a count point (constant over its counts) that flows can be aggregated by
+AREAS = ['region_id', 'region_name', 'local_authority_id', 'local_authority_name', 'road_type']
+
+def read_flows(path):
+    """
+    Function to read a DfT road traffic count table (ie. `dft_rawcount_local_authority_id_63.csv`, or the national raw count or AADF file) with compact dtypes: only the columns needed for exposure are read, vehicle counts as integers and text columns as categoricals.
+
+    Parameters:
+        path                : str
+    Return:
+        flows               : pd.DataFrame
+    """
+    needed = set(['count_point_id', 'year', 'count_date', 'hour', 'direction_of_travel', 'link_length_km'] + AREAS + list(VEHICLE_CLASSES))
+    flows = pd.read_csv(path, usecols=lambda column: column in needed)
+    for column in flows:
+        if pd.api.types.is_object_dtype(flows[column]) or pd.api.types.is_string_dtype(flows[column]): flows[column] = flows[column].astype('category')
+        elif column in VEHICLE_CLASSES: flows[column] = pd.to_numeric(flows[column].fillna(0), downcast='integer')
+    return flows
+
+@instrumented
+def count_point_flows(flows, expansion=1.0):
+    """
+    Function to compute the daily flow of every vehicle class per count point and year in one group-by. Raw counts (tables with an `hour` column, ie. the 12 counted hours of a manual count) are summed over hours and directions per count date and then averaged over the count dates of the year; `expansion` scales counted hours up to whole days. Annual average daily flows (AADF tables, without `hour`) are summed over directions.
+
+    Parameters:
+        flows               : pd.DataFrame (DfT count table, see `read_flows`)
+        expansion           : float (ratio of whole day to counted traffic for raw counts, 1 keeps the counted hours)
+    Return:
+        points              : pd.DataFrame (one row per count point and year, daily flow per vehicle class, `link_length_km` and area columns)
+    """
+    classes = [name for name in VEHICLE_CLASSES if name in flows]
+    keys = ['count_point_id', 'year']
+    constant = [column for column in ['link_length_km'] + AREAS if column in flows]
+
+    day = keys + (['count_date'] if 'hour' in flows and 'count_date' in flows else [])
+    daily = flows.groupby(day, observed=True, sort=False)[classes].sum()
+    if len(day) > len(keys): daily = daily.groupby(level=keys, observed=True, sort=False).mean() * expansion
+
+    # attributes of the count points, taken from their first row
+    points = flows.drop_duplicates(keys).set_index(keys)[constant]
+    return daily.join(points).reset_index()
+
+@instrumented
+def vehicle_km(flows, by=('year',), expansion=1.0, days=365, missing_length=None):
+    """
+    Function to estimate the annual vehicle-km of every vehicle class, aggregated by year and optionally area (ie. `local_authority_id`): the daily flow of every count point (see `count_point_flows`) times the length of its road link, times the days of a year. Count points without link length use `missing_length` (None leaves them out).
+
+    Parameters:
+        flows               : pd.DataFrame (DfT count table, see `read_flows`)
+        by                  : list (columns to aggregate by, ie. ['year', 'local_authority_id'])
+        expansion           : float (see `count_point_flows`)
+        days                : int (days of the counted period)
+        missing_length      : float (link length in km of count points without one)
+    Return:
+        vehicle_km          : pd.DataFrame (one row per combination of `by`, one column per vehicle class)
+    """
+    points = count_point_flows(flows, expansion=expansion)
+    classes = [name for name in VEHICLE_CLASSES if name in points]
+    length = points['link_length_km'].astype(float) if 'link_length_km' in points else pd.Series(np.nan, index=points.index)
+    if missing_length is not None: length = length.fillna(missing_length)
+
+    known = length.notna().to_numpy()
+    km = points.loc[known, classes].mul(length[known] * days, axis=0)
+    return km.groupby([points.loc[known, column] for column in by], observed=True).sum()
+
+@instrumented
+def accident_counts(tables, by_year='Date', year=None, area=None, areas=None, unit='accidents'):
+    """
+    Function to count accidents per year (and area) and vehicle class. An accident counts for a class if one of its vehicles is of that class (`unit='accidents'`, every accident counts once per class), or every vehicle of a class counts (`unit='vehicles'`). All vehicles are resolved to their accident once, then every class is one `np.bincount` over the (year, area) groups.
+
+    Parameters:
+        tables              : dict (holding the datasets at keys 'accidents' and 'vehicles')
+        by_year             : str (date column of the accidents, `datetime64`)
+        year                : int (year of all accidents, if the dataset holds one year without full dates, ie. 2019)
+        area                : str (area column of the accidents, ie. 'Local_Authority_(District)', None for all accidents)
+        areas               : dict (translates the codes of `area` into the areas of the flows, ie. {204: 63} for STATS19 and DfT codes of Leeds)
+        unit                : str ('accidents' or 'vehicles')
+    Return:
+        counts              : pd.DataFrame (one row per year (and area), one column per vehicle class and 'all' for all accidents)
+    """
+    if unit not in ['accidents', 'vehicles']: raise NameError(f"'{unit}' not defined. Try 'accidents' or 'vehicles'.")
+    accidents, vehicles = tables['accidents'], tables['vehicles']
+
+    # year (and area) of every accident as one dense group code
+    if year is not None: years = np.full(accidents.shape[0], year, dtype=np.int64)
+    else:
+        dates = accidents[by_year]
+        if dates.dtype.kind != 'M': raise ValueError(f"'{by_year}' holds no full dates, give the `year` of the dataset.")
+        years = dates.dt.year.fillna(-1).to_numpy(dtype=np.int64)
+    valid, keys = years >= 0, {'year': years}
+    if area is not None:
+        codes = pd.Series(np.asarray(accidents[area]))
+        if areas is not None: valid &= codes.isin(list(areas)).to_numpy() # accidents outside the areas of the flows are left out
+        keys[area] = codes
+    keys = pd.DataFrame(keys)[valid]
+    if area is not None and areas is not None: keys[area] = keys[area].map(areas)
+    group_codes, groups = pd.MultiIndex.from_frame(keys).factorize()
+    groups = pd.MultiIndex.from_tuples(groups.tolist(), names=list(keys))
+    accident_group = np.full(accidents.shape[0], -1, dtype=np.int64)
+    accident_group[valid] = group_codes
+
+    # class membership of every vehicle type (a type can be in more than one class, ie. all motor vehicles)
+    names = list(VEHICLE_CLASSES)
+    types = np.asarray(vehicles['Vehicle_Type'], dtype=np.int64)
+    position = AccidentIndex(accidents).positions(vehicles['Accident_Index'])
+    vehicle_group = np.where(position >= 0, accident_group[np.where(position >= 0, position, 0)], -1)
+
+    counts = np.zeros((len(groups), len(names) + 1))
+    counts[:, -1] = np.bincount(accident_group[accident_group >= 0], minlength=len(groups))
+    for i, name in enumerate(names):
+        rows = np.flatnonzero(np.isin(types, VEHICLE_CLASSES[name]) & (vehicle_group >= 0))
+        if unit == 'accidents': rows = rows[np.unique(position[rows], return_index=True)[1]] # one vehicle per accident
+        counts[:, i] = np.bincount(vehicle_group[rows], minlength=len(groups))
+
+    index = groups if area is not None else groups.get_level_values('year')
+    return pd.DataFrame(counts.astype(np.int64), index=index, columns=names + ['all']).sort_index()
+
+def poisson_interval(counts, confidence=.95):
+    """
+    Helper-Function returning the exact (Garwood) confidence interval of Poisson counts, from the quantiles of the Chi Squared distribution.
+
+    Return:
+        lower, upper        : np.array
+    """
+    counts, alpha = np.asarray(counts, dtype=float), 1 - confidence
+    lower = np.where(counts > 0, stats.chi2.ppf(alpha / 2, 2 * counts) / 2, 0.0)
+    upper = stats.chi2.ppf(1 - alpha / 2, 2 * counts + 2) / 2
+    return lower, upper
+
+@instrumented
+def accident_rates(counts, vehicle_km, per=1e8, confidence=.95):
+    """
+    Function to compute accident rates per vehicle-km (per 100 million vehicle-km by default) of every vehicle class, joined on year (and area), with exact Poisson confidence intervals (see `poisson_interval`; the exposure is taken as known).
+
+    Parameters:
+        counts              : pd.DataFrame (see `accident_counts`)
+        vehicle_km          : pd.DataFrame (see `vehicle_km`, aggregated by the same keys as `counts`)
+        per                 : float (vehicle-km the rates refer to)
+        confidence          : float (level of the confidence interval)
+    Return:
+        rates               : pd.DataFrame (one row per year (and area) and vehicle class: accidents, vehicle-km, rate, lower and upper bound)
+    """
+    classes = [name for name in VEHICLE_CLASSES if name in counts and name in vehicle_km]
+    vehicle_km = vehicle_km.copy()
+    vehicle_km.index = vehicle_km.index.set_names(counts.index.names)
+    joined = counts[classes].stack().rename('Accidents').to_frame().join(vehicle_km[classes].stack().rename('Vehicle_km'), how='inner')
+    joined.index = joined.index.set_names(list(counts.index.names) + ['vehicle_class'])
+
+    lower, upper = poisson_interval(joined['Accidents'], confidence)
+    exposure = joined['Vehicle_km'].where(joined['Vehicle_km'] > 0) / per
+    joined['Rate'] = joined['Accidents'] / exposure
+    joined['Lower'], joined['Upper'] = lower / exposure, upper / exposure
+    return joined.reset_index()
+
+def plot_flows(vehicle_km, title='Annual Traffic by Vehicle Class', ylabel='Vehicle-km', dimensions=(16, 9)):
+    """
+    Function to plot the annual traffic (see `vehicle_km`, by year) of every vehicle class as lines. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline plotting
+
+    Parameter:
+        vehicle_km          : pd.DataFrame (one row per year, one column per vehicle class)
+        title               : str
+        ylabel              : str
+        dimensions          : tuple (specify size of plotted figure)
+    Return:
+        fig                 : matplotlib.Figure
+    """
+    fig = plt.figure(figsize=dimensions)
+    ax = fig.add_axes([.15, .15, .7, .7])
+
+    years = vehicle_km.index.tolist()
+    for name in vehicle_km:
+        ax.plot(years, vehicle_km[name], 'o-', label=name)
+
+    ax.set_xticks(years); ax.set_xticklabels(years)
+    ax.set_title(title, fontweight='bold', fontsize=16)
+    ax.set_xlabel('Years'); ax.set_ylabel(ylabel)
+    ax.get_yaxis().set_major_formatter(plt.FuncFormatter(lambda x, p: format(int(x), ',')))
+    ax.legend()
+
+    return fig
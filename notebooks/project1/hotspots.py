@@ -0,0 +1,195 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .instrument import instrumented
+from .lazy import lazy_import
+
+# scipy is imported at its first use
+spatial = lazy_import('scipy.spatial')
+csgraph = lazy_import('scipy.sparse.csgraph')
+sparse = lazy_import('scipy.sparse')
+
+EARTH_RADIUS = 6371008.8 # mean radius in metres
+
+def to_metres(data, coordinates='auto'):
+    """
+    Helper-Function returning planar coordinates in metres of every accident: the British National Grid columns (`Location_Easting_OSGR`, `Location_Northing_OSGR`), or `Latitude`/`Longitude` projected equirectangularly around their mean (accurate to well below a metre at the scale of a hotspot). Accidents without location are NaN.
+
+    Parameters:
+        data                : pd.DataFrame (accidents dataset)
+        coordinates         : str ('osgr', 'latlon' or 'auto' (OSGR if the dataset has the columns))
+    Return:
+        xy                  : np.array (two-dimensional, shape (rows, 2))
+    """
+    if coordinates == 'auto': coordinates = 'osgr' if 'Location_Easting_OSGR' in data and 'Location_Northing_OSGR' in data else 'latlon'
+    if coordinates == 'osgr':
+        return np.column_stack([np.asarray(data['Location_Easting_OSGR'], dtype=float), np.asarray(data['Location_Northing_OSGR'], dtype=float)])
+    if coordinates != 'latlon': raise NameError(f"'{coordinates}' not defined. Try 'osgr', 'latlon' or 'auto'.")
+
+    latitude, longitude = np.radians(np.asarray(data['Latitude'], dtype=float)), np.radians(np.asarray(data['Longitude'], dtype=float))
+    scale = np.cos(np.nanmean(latitude)) if np.isfinite(latitude).any() else 1.0
+    return np.column_stack([EARTH_RADIUS * longitude * scale, EARTH_RADIUS * latitude])
+
+def convex_hull(points):
+    """
+    Helper-Function returning the positions of the vertices of the convex hull of a set of points (counter-clockwise). Sets of less than three points, or points on one line, are returned as they are.
+    """
+    if len(points) < 3: return np.arange(len(points))
+    try: return spatial.ConvexHull(points).vertices
+    except spatial.QhullError: return np.arange(len(points))
+
+@instrumented
+def find_hotspots(data, radius=100, min_weight=5, weights=None, focus='Accident_Severity', coordinates='auto'):
+    """
+    Function to find hotspots: dense clusters of accidents, found DBSCAN-style with a KD-tree. An accident is a core point if the total weight of the accidents within `radius` metres (itself included) reaches `min_weight`; core points within `radius` of each other form one hotspot, and every other accident within `radius` of a core point joins the hotspot of that core point. All other accidents are noise (label -1).
+
+    With `weights` (ie. {1: 10, 2: 3, 3: 1} for `Accident_Severity`), serious and fatal accidents count more towards a hotspot than slight ones. Accidents at the same location are merged before the tree is built, so junctions with many accidents do not blow up the number of neighbour pairs.
+
+    Parameters:
+        data                : pd.DataFrame (accidents dataset, with `Latitude`/`Longitude` and `focus`)
+        radius              : float (neighbourhood radius in metres)
+        min_weight          : float (weight of the neighbourhood of a core point)
+        weights             : dict (weight per value of `focus`, None weighs all accidents 1)
+        focus               : str (column that is weighted and counted per hotspot)
+        coordinates         : str (see `to_metres`)
+    Return:
+        labels              : np.array (hotspot of every accident, -1 for noise, hotspots are numbered by decreasing weight)
+        hotspots            : dict (arrays at keys 'Latitude', 'Longitude' (weighted centroid), 'Members', 'Weight', 'Counts' (per value at 'Categories'), 'Radius' (largest distance of a member to the centroid in metres) and 'Hull' (list of [Latitude, Longitude] arrays))
+    """
+    xy = to_metres(data, coordinates)
+    latlon = np.column_stack([np.asarray(data['Latitude'], dtype=float), np.asarray(data['Longitude'], dtype=float)])
+    located = np.isfinite(xy).all(axis=1) & np.isfinite(latlon).all(axis=1)
+    categories, codes = np.unique(np.asarray(data[focus]), return_inverse=True)
+    codes = codes.ravel()
+    row_weights = np.ones(len(codes)) if weights is None else np.array([weights.get(category, 0) for category in categories.tolist()], dtype=float)[codes]
+
+    # one point per distinct location, carrying the weight of its accidents
+    rows = np.flatnonzero(located)
+    points, inverse = np.unique(xy[rows], axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    point_weights = np.bincount(inverse, weights=row_weights[rows], minlength=len(points))
+
+    # neighbourhood weight of every point from all pairs within the radius
+    pairs = spatial.cKDTree(points).query_pairs(radius, output_type='ndarray') if len(points) else np.empty((0, 2), dtype=np.int64)
+    neighbourhood = point_weights + np.bincount(pairs[:, 0], weights=point_weights[pairs[:, 1]], minlength=len(points)) + np.bincount(pairs[:, 1], weights=point_weights[pairs[:, 0]], minlength=len(points))
+    core = neighbourhood >= min_weight
+
+    # hotspots are the connected components of core points; border points join the hotspot of a core neighbour
+    both = core[pairs[:, 0]] & core[pairs[:, 1]]
+    graph = sparse.coo_matrix((np.ones(both.sum(), dtype=np.int8), (pairs[both, 0], pairs[both, 1])), shape=(len(points), len(points)))
+    _, components = csgraph.connected_components(graph, directed=False)
+    point_labels = np.where(core, components, -1)
+
+    border = core[pairs[:, 0]] != core[pairs[:, 1]]
+    core_side, other_side = np.where(core[pairs[border, 0]], pairs[border, 0], pairs[border, 1]), np.where(core[pairs[border, 0]], pairs[border, 1], pairs[border, 0])
+    point_labels[other_side[::-1]] = components[core_side[::-1]] # the first core neighbour wins
+
+    # dense hotspot numbers by decreasing weight
+    row_labels = np.full(len(codes), -1, dtype=np.int64)
+    row_labels[rows] = point_labels[inverse]
+    clustered = row_labels >= 0
+    uniques, dense = np.unique(row_labels[clustered], return_inverse=True)
+    total = np.bincount(dense.ravel(), weights=row_weights[clustered], minlength=len(uniques))
+    rank = np.empty(len(uniques), dtype=np.int64)
+    rank[np.argsort(-total, kind='stable')] = np.arange(len(uniques))
+    row_labels[clustered] = rank[dense.ravel()]
+
+    return row_labels, summarise_hotspots(row_labels, xy, latlon, codes, categories, row_weights)
+
+def summarise_hotspots(labels, xy, latlon, codes, categories, row_weights):
+    """
+    Helper-Function computing the centroid, members, weight, counts, radius and hull of every hotspot from the labels of the accidents (see `find_hotspots`). All per-hotspot values are computed with one `np.bincount` each; only the hulls are computed hotspot by hotspot.
+    """
+    clustered = np.flatnonzero(labels >= 0)
+    n = int(labels.max()) + 1 if len(clustered) else 0
+    label, w = labels[clustered], row_weights[clustered]
+
+    members = np.bincount(label, minlength=n)
+    weight = np.bincount(label, weights=w, minlength=n)
+    mass = np.where(weight > 0, weight, members) # centroids of hotspots without weight are unweighted
+    w = np.where(weight[label] > 0, w, 1.0)
+    latitude = np.bincount(label, weights=w * latlon[clustered, 0], minlength=n) / np.maximum(mass, 1e-12)
+    longitude = np.bincount(label, weights=w * latlon[clustered, 1], minlength=n) / np.maximum(mass, 1e-12)
+    centre = np.column_stack([np.bincount(label, weights=w * xy[clustered, i], minlength=n) / np.maximum(mass, 1e-12) for i in range(2)])
+    distance = np.hypot(*(xy[clustered] - centre[label]).T)
+    spread = np.zeros(n)
+    np.maximum.at(spread, label, distance)
+    counts = np.bincount(label * len(categories) + codes[clustered], minlength=n * len(categories)).reshape(n, len(categories))
+
+    # hulls from the members of every hotspot (grouped by one sort)
+    order = clustered[np.argsort(label, kind='stable')]
+    bounds = np.concatenate([[0], np.cumsum(members)])
+    hulls = []
+    for i in range(n):
+        member_rows = order[bounds[i]:bounds[i + 1]]
+        points, first = np.unique(xy[member_rows], axis=0, return_index=True)
+        hulls.append(latlon[member_rows[first[convex_hull(points)]]])
+
+    return {'Latitude': latitude, 'Longitude': longitude, 'Members': members, 'Weight': weight, 'Categories': categories, 'Counts': counts, 'Radius': spread, 'Hull': hulls}
+
+def _region_hotspots(job):
+    # runs `find_hotspots` on the accidents of one region in a worker process
+    region, data, kwargs = job
+    labels, hotspots = find_hotspots(data, **kwargs)
+    return region, labels, hotspots
+
+@instrumented
+def find_hotspots_by_region(data, by='Local_Authority_(District)', workers=None, **kwargs):
+    """
+    Function to find the hotspots of every region separately (see `find_hotspots`), in parallel by a process pool with `workers`. Hotspots never cross region borders. Hotspot numbers are unique over all regions, ordered by region and then by decreasing weight.
+
+    Parameters:
+        data                : pd.DataFrame (accidents dataset)
+        by                  : str (column of the region of every accident)
+        workers             : int (number of worker processes, None to find them in this process)
+        **kwargs            : see `find_hotspots` (ie. radius=100, weights={1: 10, 2: 3, 3: 1})
+    Return:
+        labels              : np.array (hotspot of every accident, -1 for noise)
+        hotspots            : dict (see `find_hotspots`, with the region of every hotspot at 'Region')
+    """
+    regions = np.asarray(data[by])
+    uniques, inverse = np.unique(regions, return_inverse=True)
+    order = np.argsort(inverse.ravel(), kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(inverse.ravel(), minlength=len(uniques)))])
+    jobs = [(region, data.iloc[order[bounds[i]:bounds[i + 1]]], kwargs) for i, region in enumerate(uniques.tolist())]
+
+    if workers is None or workers <= 1: results = map(_region_hotspots, jobs)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_region_hotspots, jobs, chunksize=max(1, len(jobs) // (4 * workers)))
+
+    labels, parts, offset = np.full(data.shape[0], -1, dtype=np.int64), [], 0
+    try:
+        for (region, _, _), (_, region_labels, hotspots) in zip(jobs, results):
+            rows = order[bounds[len(parts)]:bounds[len(parts) + 1]]
+            labels[rows] = np.where(region_labels >= 0, region_labels + offset, -1)
+            offset += len(hotspots['Members'])
+            parts.append((region, hotspots))
+    finally:
+        if workers is not None and workers > 1: pool.shutdown()
+
+    # counts of all regions over the union of their categories
+    categories = np.unique(np.concatenate([hotspots['Categories'] for _, hotspots in parts])) if parts else np.array([])
+    counts = []
+    for _, hotspots in parts:
+        aligned = np.zeros((len(hotspots['Members']), len(categories)), dtype=np.int64)
+        aligned[:, np.searchsorted(categories, hotspots['Categories'])] = hotspots['Counts']
+        counts.append(aligned)
+
+    combined = {key: np.concatenate([hotspots[key] for _, hotspots in parts]) if parts else np.array([]) for key in ['Latitude', 'Longitude', 'Members', 'Weight', 'Radius']}
+    combined['Region'] = np.concatenate([np.full(len(hotspots['Members']), region) for region, hotspots in parts]) if parts else np.array([])
+    combined['Categories'], combined['Counts'] = categories, np.concatenate(counts) if counts else np.zeros((0, 0), dtype=np.int64)
+    combined['Hull'] = [hull for _, hotspots in parts for hull in hotspots['Hull']]
+    return labels, combined
+
+def hotspot_table(hotspots, focus='Accident_Severity'):
+    """
+    Function to put the hotspots (see `find_hotspots`) into a table, one row per hotspot (without hulls).
+
+    Return:
+        table               : pd.DataFrame
+    """
+    table = pd.DataFrame({key: hotspots[key] for key in ['Region', 'Latitude', 'Longitude', 'Members', 'Weight', 'Radius'] if key in hotspots})
+    for i, category in enumerate(np.asarray(hotspots['Categories']).tolist()):
+        table[f'{focus}_{category}'] = hotspots['Counts'][:, i]
+    return table.rename_axis('Hotspot')
@@ -0,0 +1,183 @@
+import json
+import time
+import threading
+import functools
+import contextlib
+import tracemalloc
+import numpy as np
+from .lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+class Recorder:
+    """
+    Collects the stages recorded while instrumentation is enabled: one event per call of an instrumented function or `stage` block, holding its wall time, the number of rows it processed and (with `memory`) the change of traced memory. Stages may be nested (ie. `barplot` inside `save_all_single_variable_analysis`), the depth of every event is recorded.
+
+    Parameters:
+        memory              : boolean (trace memory deltas through `tracemalloc`, which slows down allocations)
+    """
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.started_tracing = False # True if `enable` started `tracemalloc` for this recorder
+        self.events = []
+        self.origin = time.perf_counter()
+        self.local = threading.local()
+
+    def begin(self):
+        depth = getattr(self.local, 'depth', 0)
+        self.local.depth = depth + 1
+        memory = tracemalloc.get_traced_memory()[0] if self.memory and tracemalloc.is_tracing() else None
+        return depth, time.perf_counter(), memory
+
+    def end(self, name, rows, state):
+        depth, start, memory = state
+        end = time.perf_counter()
+        self.local.depth = depth
+        event = {'Stage': name, 'Start': start - self.origin, 'Seconds': end - start, 'Rows': rows, 'Depth': depth, 'Thread': threading.get_ident()}
+        if memory is not None: event['Memory Delta (MB)'] = (tracemalloc.get_traced_memory()[0] - memory) / 2**20
+        self.events.append(event)
+
+# the active recorder (None while instrumentation is disabled, which is the default)
+_RECORDER = None
+
+def enable(memory=False):
+    """
+    Function to enable instrumentation: from now on, all instrumented functions and `stage` blocks are recorded (see `Recorder`).
+
+    Parameters:
+        memory              : boolean (see `Recorder`, starts `tracemalloc` if it is not running; `disable` only stops it in that case)
+    Return:
+        recorder            : Recorder
+    """
+    global _RECORDER
+    started = memory and not tracemalloc.is_tracing()
+    if started: tracemalloc.start()
+    _RECORDER = Recorder(memory=memory)
+    _RECORDER.started_tracing = started
+    return _RECORDER
+
+def disable():
+    """
+    Function to disable instrumentation. Returns the recorder holding all events recorded since `enable`. `tracemalloc` is only stopped if `enable` started it, so tracing started elsewhere (ie. by the benchmarks) keeps running.
+    """
+    global _RECORDER
+    recorder, _RECORDER = _RECORDER, None
+    if recorder is not None and recorder.started_tracing and tracemalloc.is_tracing(): tracemalloc.stop()
+    return recorder
+
+def is_enabled():
+    return _RECORDER is not None
+
+@contextlib.contextmanager
+def profiling(memory=False):
+    """
+    Context manager enabling instrumentation for a block, ie. one report run:
+
+        with profiling() as recorder:
+            compute_numerical_summary(SUMMARY['accidents'], DATA_LEEDS['accidents'])
+        summary_table(recorder)
+    """
+    recorder = enable(memory=memory)
+    try: yield recorder
+    finally: disable()
+
+def count_rows(args, kwargs):
+    """
+    Helper-Function returning the number of rows processed by a call: the length of its first table-like argument (pd.DataFrame, pd.Series or np.array), or the total length of a dict of tables. None if there is none.
+    """
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)) and value.ndim > 0:
+            return int(value.shape[0])
+        if isinstance(value, dict) and value and all(isinstance(v, pd.DataFrame) for v in value.values()):
+            return int(sum(v.shape[0] for v in value.values()))
+    return None
+
+def instrumented(function=None, name=None):
+    """
+    Decorator recording every call of a function as a stage (named `<module>.<function>` unless `name` is given). While instrumentation is disabled, the only overhead is a single check of the active recorder.
+    """
+    if function is None:
+        return lambda function: instrumented(function, name=name)
+    stage_name = name or f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        recorder = _RECORDER
+        if recorder is None:
+            return function(*args, **kwargs)
+        state = recorder.begin()
+        try: return function(*args, **kwargs)
+        finally: recorder.end(stage_name, count_rows(args, kwargs), state)
+
+    return wrapper
+
+class _Stage:
+    # context manager recording a block as a stage of the active recorder
+    __slots__ = ('recorder', 'name', 'rows', 'state')
+
+    def __init__(self, recorder, name, rows):
+        self.recorder, self.name, self.rows = recorder, name, rows
+
+    def __enter__(self):
+        self.state = self.recorder.begin()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.end(self.name, self.rows, self.state)
+        return False
+
+_NO_STAGE = contextlib.nullcontext()
+
+def stage(name, rows=None):
+    """
+    Context manager recording a block of code as a stage, ie. writing a pdf inside `save_figure`. Returns a shared no-op context while instrumentation is disabled.
+
+    Parameters:
+        name                : str (name of the stage)
+        rows                : int (number of rows processed in the block)
+    """
+    recorder = _RECORDER
+    if recorder is None: return _NO_STAGE
+    return _Stage(recorder, name, rows)
+
+def summary_table(recorder=None):
+    """
+    Function to aggregate the recorded events per stage.
+
+    Parameters:
+        recorder            : Recorder (defaults to the active recorder)
+    Return:
+        summary             : pd.DataFrame (calls, total/mean/max seconds, rows (and rows per second) and memory delta per stage, sorted by total time)
+    """
+    recorder = recorder or _RECORDER
+    columns = ['Stage', 'Calls', 'Seconds', 'Mean Seconds', 'Max Seconds', 'Rows', 'Rows per Second', 'Memory Delta (MB)']
+    if recorder is None or not recorder.events: return pd.DataFrame(columns=columns)
+
+    events = pd.DataFrame(recorder.events)
+    if 'Memory Delta (MB)' not in events: events['Memory Delta (MB)'] = np.nan
+    grouped = events.groupby('Stage')
+    summary = pd.DataFrame({
+        'Calls': grouped.size(),
+        'Seconds': grouped['Seconds'].sum(),
+        'Mean Seconds': grouped['Seconds'].mean(),
+        'Max Seconds': grouped['Seconds'].max(),
+        'Rows': grouped['Rows'].sum(min_count=1),
+        'Memory Delta (MB)': grouped['Memory Delta (MB)'].sum(min_count=1)}).reset_index()
+    summary['Rows per Second'] = summary['Rows'] / summary['Seconds']
+    return summary[columns].sort_values('Seconds', ascending=False).reset_index(drop=True)
+
+def write_trace(path, recorder=None):
+    """
+    Function to write the recorded events as a `json` trace in the Trace Event Format, which can be opened in `chrome://tracing` or Perfetto to see the nested stages on a timeline.
+
+    Parameters:
+        path                : str (path of the `json` file)
+        recorder            : Recorder (defaults to the active recorder)
+    """
+    recorder = recorder or _RECORDER
+    events = []
+    for event in (recorder.events if recorder is not None else []):
+        args = {key: event[key] for key in ['Rows', 'Memory Delta (MB)'] if event.get(key) is not None}
+        events.append({'name': event['Stage'], 'cat': event['Stage'].split('.')[0], 'ph': 'X', 'ts': event['Start'] * 1e6, 'dur': event['Seconds'] * 1e6, 'pid': 0, 'tid': event['Thread'], 'args': args})
+
+    with open(path, 'w') as f: json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,29 @@
+import sys
+import types
+import importlib
+
+class LazyModule(types.ModuleType):
+    """
+    Placeholder of a module that is only imported at the first access of one of its attributes, ie. `plt.figure` imports `matplotlib.pyplot`. Heavy dependencies (scipy, matplotlib, seaborn, folium) are bound through it, so that importing a part of `project1` that does not plot (ie. `numerical_summary`) does not pay for them.
+
+    Parameters:
+        name                : str (full name of the module, ie. 'matplotlib.pyplot')
+    """
+    def __init__(self, name):
+        super().__init__(name)
+
+    def __getattr__(self, attribute):
+        # only called for attributes that are not (yet) in __dict__: import the module and take over its attributes
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+    def __dir__(self):
+        return dir(importlib.import_module(self.__name__))
+
+def lazy_import(name):
+    """
+    Function returning a module if it is already imported, else a `LazyModule` importing it at first use.
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
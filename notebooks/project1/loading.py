@@ -0,0 +1,203 @@
+import os
+import json
+import hashlib
+import pickle
+import importlib.util
+import numpy as np
+import pandas as pd
+from .instrument import instrumented
+
+# bump whenever the typed layout produced by `read_table` changes, so that old caches are rebuilt
+LOADER_VERSION = 1
+
+# columns that are not coded variables and get their own dtype
+COORDINATES = ['Location_Easting_OSGR', 'Location_Northing_OSGR', 'Longitude', 'Latitude']
+CATEGORICAL = ['Accident_Index', 'Local_Authority_(Highway)', 'LSOA_of_Accident_Location']
+
+def read_column_attributes(path):
+    """
+    Function to read the column specifications in `data/references/column attributes/*.csv`. Each file holds three rows: the column indexes, whether a five-number summary is computed and the plot type of the column.
+
+    Parameters:
+        path                : str (path to a `*_column_attributes.csv` file)
+    Return:
+        attributes          : list (one dict {'Summary': bool, 'Plot': 'bar'/'hist'/None} per column)
+    """
+    with open(path) as f:
+        rows = [[value.strip() for value in line.split(',')] for line in f.read().splitlines() if line.strip()]
+
+    plots = {'bar': 'bar', 'hist': 'hist', 'histogram': 'hist'}
+    return [{'Summary': summary == 'True', 'Plot': plots.get(plot.lower())} for summary, plot in zip(rows[1], rows[2])]
+
+def parse_date(dates):
+    """
+    Function to parse a column of `dd/mm/yyyy` strings into `datetime64` in one vectorized pass.
+
+    Parameters:
+        dates               : pd.DataFrame (one-dimensional, strings)
+    Return:
+        pd.Series (datetime64, NaT for unparsable dates)
+    """
+    return pd.to_datetime(pd.Series(dates), format='%d/%m/%Y', errors='coerce')
+
+def parse_hour(times):
+    """
+    Function to extract the hour from a column of `HH:MM` strings in one vectorized pass. Missing or malformed times are encoded as `-1`, as in the rest of the dataset.
+
+    Parameters:
+        times               : pd.DataFrame (one-dimensional, strings)
+    Return:
+        pd.Series (int8)
+    """
+    # parse each distinct time once (a day has at most 1440 of them), then spread the hours to all rows
+    codes, uniques = pd.factorize(pd.Series(times))
+    hours = pd.to_numeric(pd.Series(uniques, dtype='string').str[:2], errors='coerce').fillna(-1).to_numpy(dtype=np.int8)
+    return pd.Series(np.where(codes >= 0, hours[codes.clip(0)] if len(hours) else -1, -1).astype(np.int8))
+
+def compact(column, attributes=None):
+    """
+    Helper-Function to convert a single column into its compact dtype: coordinates to float32, identifiers and string codes to categoricals and integer variables to the smallest integer type holding all values. Coded variables (plotted as `bar` or `hist` in the column attributes) stay integer even if values are missing, by encoding those as `-1` like the rest of the dataset does.
+
+    Parameters:
+        column              : pd.Series
+        attributes          : dict (attributes of the column, see `read_column_attributes`)
+    Return:
+        pd.Series
+    """
+    if column.name in COORDINATES:
+        return column.astype(np.float32)
+    if column.name in CATEGORICAL or column.dtype == object:
+        return column.astype('category')
+
+    coded = attributes is not None and attributes['Plot'] is not None
+    if column.dtype.kind == 'f' and coded and (column.dropna() % 1 == 0).all():
+        column = column.fillna(-1).astype(np.int64)
+
+    if column.dtype.kind in 'iu':
+        return pd.to_numeric(column, downcast='integer')
+    if column.dtype.kind == 'f':
+        return pd.to_numeric(column, downcast='float')
+    return column
+
+@instrumented
+def read_table(path, attributes=None, parse_dates=True):
+    """
+    Function to read one of the three datasets from `csv` with compact dtypes (see `compact`). With `parse_dates`, a `Date` column of `dd/mm/yyyy` strings is parsed to `datetime64` and a `Time` column of `HH:MM` strings to the hour of the accident (-1 if missing), both vectorized. Columns that already hold numbers (ie. the months and hours of `data/processed/`) are kept as they are.
+
+    Parameters:
+        path                : str (path to the `csv` file)
+        attributes          : list (column attributes, see `read_column_attributes`)
+        parse_dates         : boolean (parse `Date` and `Time` if True, else keep them as strings)
+    Return:
+        data                : pd.DataFrame
+    """
+    data = pd.read_csv(path, dtype={name: str for name in CATEGORICAL}, low_memory=False)
+    if attributes is None: attributes = [None] * data.shape[1]
+
+    for i, name in enumerate(list(data)):
+        text = pd.api.types.is_object_dtype(data[name]) or pd.api.types.is_string_dtype(data[name])
+        if parse_dates and text and name == 'Date':
+            dates = parse_date(data[name])
+            if dates.isna().all() and data[name].notna().any(): raise ValueError(f"'{name}' of {path} holds no `dd/mm/yyyy` dates (ie. {data[name].dropna().iloc[0]!r}).")
+            data[name] = dates
+        elif parse_dates and text and name == 'Time': data[name] = parse_hour(data[name])
+        else: data[name] = compact(data[name], attributes[i] if i < len(attributes) else None)
+
+    return data
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Helper-Function to compute the sha1 hash of a file, reading it in blocks.
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def default_cache_format():
+    """
+    Helper-Function returning the cache format to use: `parquet` if `pyarrow` is installed, else `pickle` (which keeps all dtypes, including categoricals, without additional dependencies). `pyarrow` is only looked up, not imported.
+    """
+    return 'parquet' if importlib.util.find_spec('pyarrow') is not None else 'pickle'
+
+def _write_cache(data, path, cache_format):
+    if cache_format == 'parquet': data.to_parquet(path)
+    elif cache_format == 'feather': data.to_feather(path)
+    elif cache_format == 'pickle':
+        with open(path, 'wb') as f: pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    else: raise NameError(f"'{cache_format}' not defined. Try 'parquet', 'feather' or 'pickle'.")
+
+def _read_cache(path, cache_format):
+    if cache_format == 'parquet': return pd.read_parquet(path)
+    elif cache_format == 'feather': return pd.read_feather(path)
+    elif cache_format == 'pickle':
+        with open(path, 'rb') as f: return pickle.load(f)
+    else: raise NameError(f"'{cache_format}' not defined. Try 'parquet', 'feather' or 'pickle'.")
+
+@instrumented
+def load_table(path, attributes_path=None, cache_dir=None, cache_format=None, parse_dates=True, force=False):
+    """
+    Function to load one of the three datasets with compact dtypes (see `read_table`) through a binary columnar cache. The cache stores the source file's modification time, size and hash next to the typed table: it is used as long as the source is unchanged (checked via mtime and size, falling back to the hash if the mtime moved) and rebuilt otherwise.
+
+    Parameters:
+        path                : str (path to the `csv` file)
+        attributes_path     : str (path to the `*_column_attributes.csv` file of the dataset)
+        cache_dir           : str (directory of the cache, None to read without caching)
+        cache_format        : str (either `parquet`, `feather` or `pickle`, see `default_cache_format`)
+        parse_dates         : boolean (see `read_table`)
+        force               : boolean (rebuild the cache even if it is valid)
+    Return:
+        data                : pd.DataFrame
+    """
+    attributes = read_column_attributes(attributes_path) if attributes_path is not None else None
+    if cache_dir is None:
+        return read_table(path, attributes, parse_dates=parse_dates)
+
+    if cache_format is None: cache_format = default_cache_format()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, f'{name}.{cache_format}')
+    meta_path = os.path.join(cache_dir, f'{name}.json')
+    stat = os.stat(path)
+    source = {'mtime': stat.st_mtime, 'size': stat.st_size, 'format': cache_format, 'parse_dates': parse_dates, 'version': LOADER_VERSION}
+
+    if not force and os.path.exists(cache_path) and os.path.exists(meta_path):
+        with open(meta_path) as f: meta = json.load(f)
+        same_layout = all(meta.get(key) == source[key] for key in ['size', 'format', 'parse_dates', 'version'])
+
+        if same_layout and meta.get('mtime') == source['mtime']:
+            return _read_cache(cache_path, cache_format)
+        if same_layout and meta.get('sha1') == file_hash(path):
+            # source was touched but not changed: keep the cache and remember the new mtime
+            meta['mtime'] = source['mtime']
+            with open(meta_path, 'w') as f: json.dump(meta, f)
+            return _read_cache(cache_path, cache_format)
+
+    data = read_table(path, attributes, parse_dates=parse_dates)
+    _write_cache(data, cache_path, cache_format)
+    source['sha1'] = file_hash(path)
+    with open(meta_path, 'w') as f: json.dump(source, f)
+    return data
+
+def load_datasets(data_path, filenames, attributes_path=None, cache_dir=None, cache_format=None, parse_dates=True, tablenames=('accidents', 'casualties', 'vehicles')):
+    """
+    Function to load all three datasets through `load_table`.
+
+    Parameters:
+        data_path           : str (directory of the `csv` files, ie. PATH['data']['raw'])
+        filenames           : dict (filename of each dataset, ie. FILENAME)
+        attributes_path     : str (directory of the column attributes, ie. PATH['references'] + 'column attributes/')
+        cache_dir           : str (directory of the cache, None to read without caching)
+        cache_format        : str (see `load_table`)
+        parse_dates         : boolean (see `read_table`)
+        tablenames          : iterable (internal names of the datasets)
+    Return:
+        data                : dict (pd.DataFrame at the internal name of each dataset)
+    """
+    data = {}
+    for dataset in tablenames:
+        attributes = os.path.join(attributes_path, f'{dataset}_column_attributes.csv') if attributes_path is not None else None
+        data[dataset] = load_table(os.path.join(data_path, filenames[dataset]), attributes, cache_dir=cache_dir, cache_format=cache_format, parse_dates=parse_dates)
+    return data
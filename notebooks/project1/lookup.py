@@ -0,0 +1,292 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from .loading import file_hash
+
+# bump whenever the layout of the compiled lookup changes, so that old artifacts are rebuilt
+LOOKUP_VERSION = 1
+
+# sheet of `variable lookup.xls` holding the labels of each coded column (replaces the sheet offsets `start_at` of `initialise_summary`)
+COLUMN_SHEETS = {
+    'accidents': {
+        'Police_Force': 'Police Force',
+        'Accident_Severity': 'Accident Severity',
+        'Day_of_Week': 'Day of Week',
+        'Local_Authority_(District)': 'Local Authority (District)',
+        'Local_Authority_(Highway)': 'Local Authority (Highway)',
+        '1st_Road_Class': '1st Road Class',
+        'Road_Type': 'Road Type',
+        'Speed_limit': 'Speed Limit',
+        'Junction_Detail': 'Junction Detail',
+        'Junction_Control': 'Junction Control',
+        '2nd_Road_Class': '2nd Road Class',
+        'Pedestrian_Crossing-Human_Control': 'Ped Cross - Human',
+        'Pedestrian_Crossing-Physical_Facilities': 'Ped Cross - Physical',
+        'Light_Conditions': 'Light Conditions',
+        'Weather_Conditions': 'Weather',
+        'Road_Surface_Conditions': 'Road Surface',
+        'Special_Conditions_at_Site': 'Special Conditions at Site',
+        'Carriageway_Hazards': 'Carriageway Hazards',
+        'Urban_or_Rural_Area': 'Urban Rural',
+        'Did_Police_Officer_Attend_Scene_of_Accident': 'Police Officer Attend'},
+    'casualties': {
+        'Casualty_Class': 'Casualty Class',
+        'Sex_of_Casualty': 'Sex of Casualty',
+        'Age_Band_of_Casualty': 'Age Band',
+        'Casualty_Severity': 'Casualty Severity',
+        'Pedestrian_Location': 'Ped Location',
+        'Pedestrian_Movement': 'Ped Movement',
+        'Car_Passenger': 'Car Passenger',
+        'Bus_or_Coach_Passenger': 'Bus Passenger',
+        'Pedestrian_Road_Maintenance_Worker': 'Ped Road Maintenance Worker',
+        'Casualty_Type': 'Casualty Type',
+        'Casualty_Home_Area_Type': 'Home Area Type',
+        'Casualty_IMD_Decile': 'IMD Decile'},
+    'vehicles': {
+        'Vehicle_Type': 'Vehicle Type',
+        'Towing_and_Articulation': 'Towing and Articulation',
+        'Vehicle_Manoeuvre': 'Vehicle Manoeuvre',
+        'Vehicle_Location-Restricted_Lane': 'Vehicle Location',
+        'Junction_Location': 'Junction Location',
+        'Skidding_and_Overturning': 'Skidding and Overturning',
+        'Hit_Object_in_Carriageway': 'Hit Object in Carriageway',
+        'Vehicle_Leaving_Carriageway': 'Veh Leaving Carriageway',
+        'Hit_Object_off_Carriageway': 'Hit Object Off Carriageway',
+        '1st_Point_of_Impact': '1st Point of Impact',
+        'Was_Vehicle_Left_Hand_Drive': 'Was Vehicle Left Hand Drive',
+        'Journey_Purpose_of_Driver': 'Journey Purpose',
+        'Sex_of_Driver': 'Sex of Driver',
+        'Age_Band_of_Driver': 'Age Band',
+        'Propulsion_Code': 'Vehicle Propulsion Code'}}
+
+# maps that are not part of the excel sheet (set by hand in the notebook so far)
+MONTHS = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+DERIVED = {
+    'accidents': {
+        'Time': {**{i: f"{i}-{i+1}" for i in range(24)}, -1: 'N/A'},
+        'Date': {i+1: MONTHS[i] for i in range(12)}}}
+
+# bounded cache of dense code-to-label arrays, keyed by the content of the mapping they were built from (see `mapping_hash`), least recently used first
+LABEL_CACHE_SIZE = 256
+_LABEL_CACHE = OrderedDict()
+_LABEL_LOCK = threading.Lock() # the query service decodes from several threads
+
+def mapping_hash(mapping):
+    """
+    Helper-Function to compute the sha1 hash of the integer codes and labels of a lookup dictionary, ie. of everything `label_array` compiles. Equal mappings share their compiled arrays, while a changed mapping gets a new hash (and is compiled again).
+    """
+    items = sorted((int(code), str(label)) for code, label in mapping.items() if isinstance(code, (int, np.integer)) and not isinstance(code, bool))
+    return hashlib.sha1(repr(items).encode()).hexdigest()
+
+def cache_labels(key, compiled):
+    """
+    Helper-Function to add compiled arrays to `_LABEL_CACHE`, evicting the least recently used ones beyond `LABEL_CACHE_SIZE`.
+    """
+    with _LABEL_LOCK:
+        _LABEL_CACHE[key] = compiled
+        _LABEL_CACHE.move_to_end(key)
+        while len(_LABEL_CACHE) > LABEL_CACHE_SIZE:
+            _LABEL_CACHE.popitem(last=False)
+
+def label_array(mapping):
+    """
+    Helper-Function to compile a lookup dictionary (ie. the `Map` of a column in SUMMARY) into a dense numpy array, such that the label of an integer code `c` is found at position `c - offset`. Compiled arrays are cached by the content of the mapping (see `mapping_hash`), so that a mapping is only compiled once as long as it is unchanged.
+
+    Parameters:
+        mapping         : dict (mapping integer codes to labels)
+    Return:
+        offset          : int (smallest code in the mapping, None if the mapping has no integer codes)
+        labels          : np.array (one-dimensional, labels as strings)
+        known           : np.array (one-dimensional, boolean mask of the codes present in the mapping)
+    """
+    key = mapping_hash(mapping)
+    with _LABEL_LOCK:
+        if key in _LABEL_CACHE:
+            _LABEL_CACHE.move_to_end(key)
+            return _LABEL_CACHE[key]
+
+    codes = [code for code in mapping if isinstance(code, (int, np.integer)) and not isinstance(code, bool)]
+    if len(codes) == 0:
+        offset, labels, known = None, np.array([], dtype=object), np.array([], dtype=bool)
+    else:
+        offset = int(min(codes))
+        labels = np.full(int(max(codes)) - offset + 1, '', dtype=object)
+        known = np.zeros(len(labels), dtype=bool)
+        for code in codes:
+            labels[int(code) - offset] = str(mapping[code])
+            known[int(code) - offset] = True
+
+    cache_labels(key, (offset, labels, known))
+    return offset, labels, known
+
+def decode_column(values, mapping):
+    """
+    Function to translate a whole column of codes into their labels at once. Integer codes (and integral values of float columns) are resolved through the dense array of `label_array`, all other values through a lookup of their uniques. Values that are not in the mapping (or columns without mapping) fall back to their string representation, just as the popups of `map_accidents` always did.
+
+    Parameters:
+        values          : pd.Series / np.array (one-dimensional)
+        mapping         : dict (mapping codes to labels) or None
+    Return:
+        decoded         : np.array (one-dimensional, dtype object holding strings)
+    """
+    values = np.asarray(values)
+    decoded = values.astype(str).astype(object)
+    if mapping is None or len(values) == 0:
+        return decoded
+
+    if values.dtype.kind in 'iuf':
+        offset, labels, known = label_array(mapping)
+        if offset is None:
+            return decoded
+
+        # float columns (ie. codes with NaN after a merge) are resolved where they hold integral values
+        integral = np.ones(len(values), dtype=bool) if values.dtype.kind in 'iu' else np.isfinite(values) & (np.floor(values) == values)
+        positions = np.full(len(values), -1, dtype=np.int64)
+        positions[integral] = values[integral].astype(np.int64) - offset
+        mapped = integral & (positions >= 0) & (positions < len(labels))
+        mapped[mapped] = known[positions[mapped]]
+        decoded[mapped] = labels[positions[mapped]]
+    else:
+        # non-integer columns (ie. string codes) are resolved once per unique value
+        uniques, inverse = np.unique(decoded, return_inverse=True)
+        original = {str(code): label for code, label in mapping.items()}
+        decoded = np.array([str(original.get(unique, unique)) for unique in uniques], dtype=object)[inverse.ravel()]
+
+    return decoded
+
+def read_sheet(frame):
+    """
+    Helper-Function to read the lookup of one excel sheet into a dictionary mapping codes to labels. Accounts for the irregularities of the sheet: capitalised column names ('Local Authority (Highway)') and the code ' M' for undefined propulsion codes ('Vehicle Propulsion Code'), which is stored as -1 as in the datasets.
+    """
+    frame = frame.rename(columns=str.lower)
+    mapping = dict(zip(frame['code'], frame['label']))
+    if ' M' in mapping:
+        mapping[-1] = mapping.pop(' M')
+    return mapping
+
+def compile_lookup(path):
+    """
+    Function to parse `variable lookup.xls` into one lookup dictionary per sheet (starting from the sheet 'Police Force', since previous sheets do not encode lookups). Requires an excel reader for `pandas` (`xlrd`), which is only needed when (re)compiling.
+
+    Parameters:
+        path                : str (path to `variable lookup.xls`)
+    Return:
+        sheets              : dict (lookup dictionary at the name of each sheet)
+        names               : list (names of all sheets, position = sheet index)
+    """
+    xls = pd.ExcelFile(path)
+    sheets = {name: read_sheet(xls.parse(name)) for name in xls.sheet_names[2:]}
+    return sheets, list(xls.sheet_names)
+
+class LookupRegistry:
+    """
+    Registry of all variable lookups of `variable lookup.xls`. The excel file is compiled once into a binary artifact (see `load`), which holds the lookup dictionary and the dense code-to-label arrays (see `label_array`) of every sheet, so that warm runs neither parse excel nor rebuild any lookup. Columns are mapped to their sheets by name through `COLUMN_SHEETS` instead of sheet offsets.
+
+    Parameters:
+        sheets              : dict (lookup dictionary at the name of each sheet)
+        names               : list (names of all sheets, position = sheet index)
+        tables              : dict ((offset, labels, known) at the name of each sheet, compiled if not given)
+    """
+    def __init__(self, sheets, names, tables=None):
+        self.sheets, self.names = sheets, names
+        if tables is None:
+            tables = {name: label_array(mapping) for name, mapping in sheets.items()}
+        self.tables = tables
+
+        # register the compiled arrays, so that `decode_column` uses them directly for the maps of this registry
+        for name, mapping in sheets.items():
+            cache_labels(mapping_hash(mapping), tuple(tables[name]))
+
+    @classmethod
+    def load(cls, path, cache_dir=None, force=False):
+        """
+        Function to load the registry through a binary artifact in `cache_dir`. As for `load_table`, the artifact stores the modification time, size and hash of the excel file: it is used as long as the file is unchanged and recompiled otherwise.
+
+        Parameters:
+            path            : str (path to `variable lookup.xls`)
+            cache_dir       : str (directory of the artifact, None to compile without caching)
+            force           : boolean (recompile even if the artifact is valid)
+        Return:
+            registry        : LookupRegistry
+        """
+        if cache_dir is None:
+            return cls(*compile_lookup(path))
+
+        os.makedirs(cache_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(path))[0]
+        artifact_path = os.path.join(cache_dir, f'{name}.pickle')
+        meta_path = os.path.join(cache_dir, f'{name}.json')
+        stat = os.stat(path)
+        source = {'mtime': stat.st_mtime, 'size': stat.st_size, 'version': LOOKUP_VERSION}
+
+        if not force and os.path.exists(artifact_path) and os.path.exists(meta_path):
+            with open(meta_path) as f: meta = json.load(f)
+            same_layout = all(meta.get(key) == source[key] for key in ['size', 'version'])
+
+            if same_layout and (meta.get('mtime') == source['mtime'] or meta.get('sha1') == file_hash(path)):
+                if meta.get('mtime') != source['mtime']:
+                    meta['mtime'] = source['mtime']
+                    with open(meta_path, 'w') as f: json.dump(meta, f)
+                with open(artifact_path, 'rb') as f: artifact = pickle.load(f)
+                return cls(artifact['sheets'], artifact['names'], artifact['tables'])
+
+        registry = cls(*compile_lookup(path))
+        with open(artifact_path, 'wb') as f:
+            pickle.dump({'sheets': registry.sheets, 'names': registry.names, 'tables': registry.tables}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        source['sha1'] = file_hash(path)
+        with open(meta_path, 'w') as f: json.dump(source, f)
+        return registry
+
+    def sheet_of(self, dataset_name, column):
+        """
+        Returns the name of the sheet holding the labels of a column (None if the column has no lookup).
+        """
+        return COLUMN_SHEETS.get(dataset_name, {}).get(column.rstrip('?'))
+
+    def map(self, dataset_name, column):
+        """
+        Returns the lookup dictionary of a column, from the excel sheet or from the derived maps (`DERIVED`). None if the column has no lookup.
+        """
+        sheet = self.sheet_of(dataset_name, column)
+        if sheet is not None: return self.sheets[sheet]
+        return DERIVED.get(dataset_name, {}).get(column)
+
+    def decode(self, dataset_name, column, values):
+        """
+        Function to translate a column of codes into labels through the dense arrays of the registry (see `decode_column`).
+
+        Parameters:
+            dataset_name    : str (internal name of the dataset, ie. 'accidents')
+            column          : str (name of the column)
+            values          : pd.Series / np.array (one-dimensional)
+        Return:
+            decoded         : np.array (one-dimensional, dtype object holding strings)
+        """
+        return decode_column(values, self.map(dataset_name, column))
+
+    def attach_maps(self, summary, dataset_name, derived=True):
+        """
+        Function to add the lookup of every coded column to the SUMMARY of a dataset (at `Map`), by column name. Replaces the sheet offsets and special cases of `initialise_summary`.
+
+        Parameters:
+            summary         : dict (SUMMARY of one dataset, as created by `initialise_summary`)
+            dataset_name    : str (internal name of the dataset, ie. 'accidents')
+            derived         : boolean (also attach the maps of `DERIVED`, ie. hours of `Time`)
+        """
+        for column in summary:
+            sheet = self.sheet_of(dataset_name, summary[column]['Name'])
+            if sheet is not None:
+                summary[column]['Map'] = self.sheets[sheet]
+            elif derived and summary[column]['Name'] in DERIVED.get(dataset_name, {}):
+                summary[column]['Map'] = DERIVED[dataset_name][summary[column]['Name']]
+
+    def variable_lookup(self):
+        """
+        Returns the lookups keyed by sheet index, as the notebook's `VARIABLE_LOOKUP` (ie. for `initialise_summary`).
+        """
+        return {i: self.sheets[name] for i, name in enumerate(self.names) if name in self.sheets}
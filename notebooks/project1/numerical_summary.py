@@ -1,5 +1,10 @@
+import json
 import numpy as np
+import pandas as pd
+from .instrument import instrumented
+from .colstore import column_data
 
+@instrumented
 def get_uniques_and_counts(data):
     """
     Helper-Function to return the uniques and their corresponding counts for a one-dimensional array/ vector or list of numbers using numpy's              'np.unique' method. 
@@ -15,6 +20,7 @@ def get_uniques_and_counts(data):
 
     return uniques, counts
 
+@instrumented
 def get_fivenumsummary(data):
     """
     Helper-Function to return a five-number summary for a one dimensional array/ dataframe (column) using numpy's `np.percentile` function. This function restricts the input to only values greater than or equal to 0, in order to disregard missing values (`-1`)
@@ -28,15 +34,132 @@ def get_fivenumsummary(data):
     except: fivenum = None
     return fivenum
 
-def compute_numerical_summary(summary, data): #
+def get_percentiles_from_counts(uniques, counts, q):
+    """
+    Helper-Function to compute percentiles of a column that is only given by its uniques and their counts (ie. a value-count histogram). The result equals `np.percentile` (linear interpolation) on the expanded column.
+
+    Parameter: 
+        uniques             : np.array (one-dimensional, sorted)
+        counts              : np.array (one-dimensional)
+        q                   : list (percentiles in [0, 100])
+    Return:
+        percentiles         : np.array (one-dimensional)
+    """
+    uniques, counts = np.asarray(uniques), np.asarray(counts)
+    cumulative = np.cumsum(counts)
+    ranks = np.asarray(q, dtype=float) / 100 * (cumulative[-1] - 1)
+
+    lower, upper = np.floor(ranks), np.ceil(ranks)
+    lower_values = uniques[np.searchsorted(cumulative, lower, side='right')]
+    upper_values = uniques[np.searchsorted(cumulative, upper, side='right')]
+    return lower_values + (upper_values - lower_values) * (ranks - lower)
+
+def get_fivenumsummary_from_counts(uniques, counts):
+    """
+    Helper-Function to return the five-number summary (see `get_fivenumsummary`) of a column that is only given by its uniques and their counts. Values smaller than 0 (missing values) are disregarded.
+
+    Parameter: 
+        uniques             : np.array (one-dimensional, sorted)
+        counts              : np.array (one-dimensional)
+    Return:
+        fivenum             : np.array (one-dimensional, None if there are no values >= 0 or the values are not numeric)
+    """
+    uniques, counts = np.asarray(uniques), np.asarray(counts)
+    if uniques.dtype.kind not in 'iuf': return None
+    mask = uniques >= 0
+    if not mask.any(): return None
+    return get_percentiles_from_counts(uniques[mask], counts[mask], [0, 25, 50, 75, 100])
+
+@instrumented
+def get_distribution_by_category(data_categorical, data_numerical, q=(5, 25, 50, 75, 95), bins=40, sample=300, exclude=0, seed=0):
+    """
+    Helper-Function to aggregate the distribution of a numerical column per category of a categorical column, ie. to draw a categorical scatterplot from a fixed amount of data however many rows there are. Records with a missing value (-1) in either column and categories with fewer than `exclude` records are disregarded. Integer columns are counted per category and value without sorting the records. Per category, the function computes its percentiles (as `np.percentile`), a histogram on bins shared by all categories (the outline of a violin) and a random sample of at most `sample` values (stratified: drawn from every category separately, so that rare categories stay visible).
+
+    Parameter:
+        data_categorical    : np.array (one-dimensional)
+        data_numerical      : np.array (one-dimensional)
+        q                   : list (percentiles in [0, 100])
+        bins                : int (number of histogram bins)
+        sample              : int (maximum number of sampled values per category)
+        exclude             : int (minimum number of records of a category)
+        seed                : int (seed of the sample)
+    Return:
+        distribution        : dict ('Categories', 'Counts', 'Percentiles' (categories x q), 'Edges', 'Density' (categories x bins, counts per bin), 'Sample' (list of arrays, one per category))
+    """
+    categorical, numerical = np.asarray(data_categorical), np.asarray(data_numerical)
+    valid = (categorical > -1) & (numerical > -1)
+    categorical, numerical = categorical[valid], numerical[valid]
+    rng = np.random.default_rng(seed)
+
+    if numerical.dtype.kind in 'iub' and categorical.dtype.kind in 'iub' and len(numerical):
+        # integer columns (ages, speed limits, ...): counts per category and value in one `np.bincount`, without sorting the records
+        c_min, v_min = int(categorical.min()), int(numerical.min())
+        c_range, v_range = int(categorical.max()) - c_min + 1, int(numerical.max()) - v_min + 1
+        if c_range * v_range <= 10**7:
+            table = np.bincount((categorical.astype(np.int64) - c_min) * v_range + (numerical - v_min), minlength=c_range * v_range).reshape(c_range, v_range)
+            counts = table.sum(axis=1)
+            keep = (counts > 0) & (counts >= exclude)
+            categories, table, counts = np.arange(c_min, c_min + c_range)[keep], table[keep], counts[keep]
+            values = np.arange(v_min, v_min + v_range)
+
+            percentiles = np.array([get_percentiles_from_counts(values[row > 0], row[row > 0], q) for row in table]).reshape(len(categories), len(q))
+            samples = [np.repeat(values, rng.multivariate_hypergeometric(row, min(sample, int(row.sum())))).astype(float) for row in table]
+            edges = np.histogram_bin_edges(values[table.sum(axis=0) > 0], bins=bins)
+            positions = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, bins - 1)
+            density = np.stack([np.bincount(positions, weights=row, minlength=bins).astype(np.int64) for row in table]) if len(table) else np.zeros((0, bins), dtype=np.int64)
+            return {'Categories': categories, 'Counts': counts, 'Percentiles': percentiles, 'Edges': edges, 'Density': density, 'Sample': samples}
+
+    numerical = numerical.astype(float)
+    categories, codes, counts = np.unique(categorical, return_inverse=True, return_counts=True)
+    keep = counts >= exclude
+    if not keep.all():
+        mask = keep[codes]
+        categories, counts, numerical = categories[keep], counts[keep], numerical[mask]
+        codes = np.cumsum(keep)[codes[mask]] - 1
+    codes = codes.ravel()
+
+    # one sort groups the values by category (sorted within each category)
+    order = np.lexsort((numerical, codes))
+    ordered = numerical[order]
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    ranks = np.asarray(q, dtype=float) / 100
+    percentiles = np.empty((len(categories), len(ranks)))
+    samples = []
+    for i in range(len(categories)):
+        values = ordered[offsets[i]:offsets[i + 1]]
+        position = ranks * (len(values) - 1)
+        lower, upper = np.floor(position).astype(int), np.ceil(position).astype(int)
+        percentiles[i] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+        samples.append(values[rng.choice(len(values), size=min(sample, len(values)), replace=False)] if sample else values[:0])
+
+    # counts per category and bin, in one pass
+    edges = np.histogram_bin_edges(ordered, bins=bins) if len(ordered) else np.linspace(0, 1, bins + 1)
+    positions = np.clip(np.searchsorted(edges, numerical, side='right') - 1, 0, bins - 1)
+    density = np.bincount(codes * bins + positions, minlength=len(categories) * bins).reshape(len(categories), bins)
+
+    return {'Categories': categories, 'Counts': counts, 'Percentiles': percentiles, 'Edges': edges, 'Density': density, 'Sample': samples}
+
+@instrumented
+def compute_numerical_summary(summary, data, copy=True): #
+    """
+    Function to compute the numerical summary of every column of a dataset into SUMMARY. `data` can also be a `ColumnStore`. With `copy=False`, the `Data` of histogram/five-number-summary columns is not copied into SUMMARY: it references the column of `data` (a view of the DataFrame, or a `ColumnRef` to the memory-mapped column of a store, which worker processes open without copying).
+
+    Parameters:
+        summary             : dict (SUMMARY of one dataset, as created by `initialise_summary`)
+        data                : pd.DataFrame or ColumnStore
+        copy                : boolean (copy the data of columns into SUMMARY)
+    """
     for column in range(len(summary)):
+        values = column_data(data, column)
+
         # compute number of uniques and counts for every column
-        uniques, counts = get_uniques_and_counts(data.iloc[:,column])
+        uniques, counts = get_uniques_and_counts(np.asarray(values))
         summary[column]['No_Uniques'] = len(uniques) # attach number of uniques for each column to SUMMARY
             
         # compute five-number summary if specified
         if summary[column]['Summary'] == True:
-            summary[column]['Five_Number_Summary'] = get_fivenumsummary(data.iloc[:,column])
+            summary[column]['Five_Number_Summary'] = get_fivenumsummary(np.asarray(values))
 
         # attach uniques/ counts as dictionary for all variables that we want to plot as a barplot
         if summary[column]['Plot'] == 'bar': 
@@ -45,4 +168,278 @@ def compute_numerical_summary(summary, data): #
         
         # attach data of the column for all variables that we want to plot as a histogram or need a five-number-summary
         if summary[column]['Plot'] == 'hist' or summary[column]['Summary'] == True:
-            summary[column]['Data'] = np.array(data[summary[column]['Name']])
\ No newline at end of file
+            summary[column]['Data'] = np.array(values) if copy else values
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch (KLL) for numerical columns. The sketch keeps a hierarchy of compactors: level `h` holds items of weight 2^h and is compacted (sorted, every other item promoted to the next level) when it exceeds its capacity, so that only O(k) items are retained for any number of values. Quantiles have an absolute rank error of about `rank_error()` (roughly 1.7% of the number of values for the default k=200, with 99% confidence), minimum and maximum are exact.
+
+    Parameters:
+        k                   : int (accuracy parameter, size of the largest compactor)
+        seed                : int (seed of the random compaction offsets)
+    """
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.min, self.max = None, None
+        self.levels = [np.array([], dtype=float)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        return max(2, int(np.ceil(self.k * (2/3) ** (len(self.levels) - level - 1))))
+
+    def _compress(self):
+        while sum(len(level) for level in self.levels) > sum(self._capacity(h) for h in range(len(self.levels))):
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) >= self._capacity(h):
+                    if h + 1 == len(self.levels): self.levels.append(np.array([], dtype=float))
+                    level = np.sort(self.levels[h])
+                    odd = len(level) % 2 # an odd item stays on its level
+                    self.levels[h] = level[:odd]
+                    self.levels[h+1] = np.concatenate([self.levels[h+1], level[odd:][self._rng.integers(2)::2]])
+                    break
+
+    def update(self, values):
+        """
+        Adds a batch of values (ie. one column of a chunk) to the sketch.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        if len(values) == 0: return self
+        self.n += len(values)
+        self.min = float(values.min()) if self.min is None else min(self.min, float(values.min()))
+        self.max = float(values.max()) if self.max is None else max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """
+        Returns a new sketch summarising the values of both sketches.
+        """
+        merged = QuantileSketch(k=min(self.k, other.k))
+        merged.n = self.n + other.n
+        merged.min = min([m for m in [self.min, other.min] if m is not None], default=None)
+        merged.max = max([m for m in [self.max, other.max] if m is not None], default=None)
+        merged.levels = [np.concatenate([self.levels[h] if h < len(self.levels) else [], other.levels[h] if h < len(other.levels) else []]) for h in range(max(len(self.levels), len(other.levels)))]
+        merged._compress()
+        return merged
+
+    def quantiles(self, q):
+        """
+        Returns the approximate percentiles `q` (in [0, 100]) of all values added to the sketch, NaN for an empty sketch.
+        """
+        q = np.asarray(q, dtype=float) / 100
+        if self.n == 0: return np.full(q.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+
+        positions = np.minimum(np.searchsorted(cumulative, q * cumulative[-1], side='left'), len(items) - 1)
+        result = items[positions]
+        result[q <= 0], result[q >= 1] = self.min, self.max
+        return result
+
+    def rank_error(self):
+        """
+        Returns the approximate normalised rank error of a single quantile (99% confidence), as measured for KLL sketches of the same `k`.
+        """
+        return 2.446 / self.k ** 0.9433
+
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'min': self.min, 'max': self.max, 'levels': [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, d):
+        sketch = cls(k=d['k'])
+        sketch.n, sketch.min, sketch.max = d['n'], d['min'], d['max']
+        sketch.levels = [np.array(level, dtype=float) for level in d['levels']]
+        return sketch
+
+
+class ColumnSummary:
+    """
+    Mergeable summary of one column. Values are counted exactly as long as the column has at most `max_exact` distinct values (always the case for the coded categorical variables), which gives exact uniques, counts and five-number summaries. Numerical columns (ie. ages, engine capacity) additionally feed a `QuantileSketch`, which takes over the five-number summary once the exact counts are dropped. Missing values (`-1`) are counted, but never enter the sketch; nulls (`NaN`, `None`) are counted as missing and never enter the counts either. Identifier columns (ie. `Accident_Index`) keep no counts, only their distinct values (for an exact `No_Uniques`) as long as there are at most `max_exact` of them.
+
+    Parameters:
+        name                : str (name of the column)
+        kind                : str (either 'categorical' or 'numerical')
+        max_exact           : int (maximum number of distinct values counted exactly, None for no limit, 0 for a sketch-only summary)
+        k                   : int (accuracy parameter of the sketch, see `QuantileSketch`)
+        identifier          : boolean (only keep the distinct values, without their counts)
+    """
+    def __init__(self, name, kind='categorical', max_exact=10000, k=200, identifier=False):
+        assert kind in ['categorical', 'numerical'], f"kind = '{kind}' is not defined. Try 'categorical' or 'numerical'"
+        self.name, self.kind, self.max_exact, self.identifier = name, kind, max_exact, identifier
+        self.n, self.missing = 0, 0
+        self.counts = None if max_exact == 0 or identifier else {}
+        self.distinct = set() if identifier and max_exact != 0 else None
+        self.sketch = QuantileSketch(k=k) if kind == 'numerical' else None
+
+    def _add_counts(self, uniques, counts):
+        if self.counts is None: return
+        for unique, count in zip(uniques, counts):
+            self.counts[unique] = self.counts.get(unique, 0) + count
+        if self.max_exact is not None and len(self.counts) > self.max_exact:
+            self.counts = None
+
+    def _add_distinct(self, values):
+        if self.distinct is None: return
+        self.distinct.update(values)
+        if self.max_exact is not None and len(self.distinct) > self.max_exact:
+            self.distinct = None
+
+    def update(self, values):
+        """
+        Adds a batch of values (ie. one column of a chunk or a daily delta) to the summary.
+        """
+        values = np.asarray(values)
+        self.n += len(values)
+        null = pd.isna(values)
+        if null.any(): # nulls (ie. NaN in raw `object` columns) are missing values, they can neither be sorted nor merged as keys
+            self.missing += int(null.sum())
+            values = values[~null]
+        if values.dtype.kind in 'iuf':
+            self.missing += int(np.sum(values < 0))
+            if self.sketch is not None: self.sketch.update(values[values >= 0])
+        self._add_distinct(values.tolist())
+        if self.counts is None: return self
+        uniques, counts = np.unique(values, return_counts=True)
+        self._add_counts(uniques.tolist(), counts.tolist())
+        return self
+
+    def merge(self, other):
+        """
+        Returns a new summary of both summaries' values (ie. a month of new data, or two regions rolled up).
+        """
+        assert self.name == other.name and self.kind == other.kind, 'Only summaries of the same column can be merged.'
+        merged = ColumnSummary(self.name, self.kind, self.max_exact, identifier=self.identifier)
+        merged.n, merged.missing = self.n + other.n, self.missing + other.missing
+        if self.distinct is None or other.distinct is None: merged.distinct = None
+        else:
+            merged.distinct = set(self.distinct)
+            merged._add_distinct(other.distinct)
+        if self.counts is None or other.counts is None: merged.counts = None
+        else:
+            merged.counts = dict(self.counts)
+            merged._add_counts(list(other.counts.keys()), list(other.counts.values()))
+        if self.sketch is not None: merged.sketch = self.sketch.merge(other.sketch)
+        return merged
+
+    def is_exact(self):
+        return self.counts is not None
+
+    def uniques_and_counts(self):
+        """
+        Returns the sorted uniques and their counts (as `get_uniques_and_counts`), None if the counts are no longer exact.
+        """
+        if self.counts is None: return None
+        uniques = np.array(sorted(self.counts))
+        return uniques, np.array([self.counts[unique] for unique in uniques.tolist()], dtype=np.int64)
+
+    def no_uniques(self):
+        """
+        Returns the number of distinct values, None if they are no longer exact.
+        """
+        if self.counts is not None: return len(self.counts)
+        return None if self.distinct is None else len(self.distinct)
+
+    def fivenumsummary(self):
+        """
+        Returns the five-number summary of all values >= 0: exact from the counts if available, else approximated by the sketch.
+        """
+        if self.counts is not None:
+            return get_fivenumsummary_from_counts(*self.uniques_and_counts())
+        if self.sketch is not None and self.sketch.n > 0:
+            return self.sketch.quantiles([0, 25, 50, 75, 100])
+        return None
+
+    def to_dict(self):
+        uniques_counts = self.uniques_and_counts()
+        return {'name': self.name, 'kind': self.kind, 'max_exact': self.max_exact, 'identifier': self.identifier, 'n': self.n, 'missing': self.missing,
+                'counts': None if uniques_counts is None else [uniques_counts[0].tolist(), uniques_counts[1].tolist()],
+                'distinct': None if self.distinct is None else sorted(self.distinct),
+                'sketch': None if self.sketch is None else self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        summary = cls(d['name'], d['kind'], d['max_exact'], identifier=d.get('identifier', False))
+        summary.n, summary.missing = d['n'], d['missing']
+        summary.counts = None if d['counts'] is None else dict(zip(d['counts'][0], d['counts'][1]))
+        summary.distinct = None if d.get('distinct') is None else set(d['distinct'])
+        if d['sketch'] is not None: summary.sketch = QuantileSketch.from_dict(d['sketch'])
+        return summary
+
+    def dumps(self):
+        """
+        Serializes the summary into a compact `json` string.
+        """
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    @classmethod
+    def loads(cls, s):
+        return cls.from_dict(json.loads(s))
+
+def init_column_summaries(summary, max_exact=10000, k=200, identifiers=()):
+    """
+    Function to create one empty `ColumnSummary` per column of a SUMMARY: columns plotted as histogram are summarised as 'numerical', all others as 'categorical'. Identifier columns (one distinct value per row, ie. `Accident_Index`) are never counted, only their distinct values are kept up to `max_exact`.
+
+    Parameters:
+        summary             : dict (SUMMARY of one dataset)
+        max_exact           : int (see `ColumnSummary`)
+        k                   : int (see `QuantileSketch`)
+        identifiers         : list (names of identifier columns, see `ColumnSummary`)
+    Return:
+        column_summaries    : list (one ColumnSummary per column)
+    """
+    return [ColumnSummary(summary[column]['Name'], 'numerical' if summary[column]['Plot'] == 'hist' else 'categorical', max_exact=max_exact, k=k, identifier=summary[column]['Name'] in identifiers) for column in range(len(summary))]
+
+def update_column_summaries(column_summaries, data):
+    """
+    Function to add the rows of a dataset (or chunk, or delta) to the summaries of its columns.
+
+    Parameters:
+        column_summaries    : list (one ColumnSummary per column, updated in place)
+        data                : pd.DataFrame
+    """
+    for column in range(len(column_summaries)):
+        column_summaries[column].update(data.iloc[:,column])
+
+def merge_column_summaries(*column_summaries):
+    """
+    Function to merge the column summaries of several datasets (ie. regions or days) column by column.
+
+    Parameters:
+        column_summaries    : lists (each holding one ColumnSummary per column)
+    Return:
+        merged              : list (one ColumnSummary per column)
+    """
+    merged = list(column_summaries[0])
+    for other in column_summaries[1:]:
+        merged = [a.merge(b) for a, b in zip(merged, other)]
+    return merged
+
+def apply_column_summaries(summary, column_summaries):
+    """
+    Function to fill a SUMMARY from the column summaries, with the same entries `compute_numerical_summary` computes from the whole dataset. Since the raw column is not kept, the `Data` entry is replaced by `Counts` (uniques and their counts) where those are exact.
+
+    Parameters:
+        summary             : dict (SUMMARY of one dataset, filled in place)
+        column_summaries    : list (one ColumnSummary per column)
+    """
+    for column in range(len(summary)):
+        column_summary = column_summaries[column]
+        summary[column]['No_Uniques'] = column_summary.no_uniques()
+
+        if summary[column]['Summary'] == True:
+            summary[column]['Five_Number_Summary'] = column_summary.fivenumsummary()
+
+        if not column_summary.is_exact(): continue
+        uniques, counts = column_summary.uniques_and_counts()
+
+        if summary[column]['Plot'] == 'bar':
+            if len(uniques) < 100:
+                summary[column]['Uniques'] = {uniques[i]: counts[i] for i in range(len(uniques))}
+
+        if summary[column]['Plot'] == 'hist' or summary[column]['Summary'] == True:
+            summary[column]['Counts'] = {uniques[i]: counts[i] for i in range(len(uniques))}
@@ -0,0 +1,318 @@
+import os
+import time
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import pandas as pd
+from .buildcache import BuildCache, fingerprint
+from .instrument import instrumented, stage
+
+class Stage:
+    """
+    One stage of a `Pipeline`: a function called with the results of its input stages (as keyword arguments named after them) and its fixed parameters. Its result is the input of all stages depending on it.
+
+    Parameters:
+        name                : str (unique name of the stage, ie. 'summary_accidents')
+        function            : callable
+        inputs              : list (names of the stages whose results are passed to `function` as keywords of the same name) or dict (keyword: name of the stage)
+        params              : dict (fixed keyword arguments of `function`)
+        files               : list (paths of files read by the stage, their size and modification time are part of its fingerprint)
+        resources           : list (names of resources used exclusively, ie. 'matplotlib': stages sharing a resource never run at the same time)
+        cache               : boolean (store the result in the cache directory of the run)
+    """
+    def __init__(self, name, function, inputs=(), params=None, files=(), resources=(), cache=True):
+        self.name, self.function = name, function
+        self.inputs = dict(inputs) if isinstance(inputs, dict) else {dependency: dependency for dependency in inputs}
+        self.params, self.files = dict(params or {}), list(files)
+        self.resources, self.cache = list(resources), cache
+
+    @property
+    def dependencies(self):
+        return list(dict.fromkeys(self.inputs.values()))
+
+    def __repr__(self):
+        return f'Stage({self.name!r}, inputs={self.dependencies})'
+
+class Pipeline:
+    """
+    Runner for a DAG of stages (see `Stage`) with explicit inputs and outputs, ie. the notebook workflow from loading to the exported reports (see `report_pipeline`). Stages whose inputs are ready run concurrently in a thread pool, ie. the summaries of the three datasets, or the map next to the pdf export; numpy, pandas and file I/O release the GIL for most of their work. Stages using the same resource (ie. matplotlib, which is not thread-safe) are serialised.
+
+    With a cache directory, the result of every stage is stored as a `pickle` artifact together with its fingerprint: the function, its parameters, the files it reads and the fingerprints of its inputs (so data is never hashed). A stage whose fingerprint is unchanged is loaded instead of run, so a second run only reruns what changed and everything downstream of it.
+    """
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, function, inputs=(), params=None, files=(), resources=(), cache=True):
+        """
+        Function to add a stage (see `Stage`). Returns the pipeline, so that stages can be chained.
+        """
+        assert name not in self.stages, f'Stage {name} is already defined.'
+        self.stages[name] = Stage(name, function, inputs, params, files, resources, cache)
+        return self
+
+    def order(self, targets=None):
+        """
+        Function returning the stages needed for `targets` (defaults to all) in topological order.
+        """
+        order, state = [], {}
+        def visit(name):
+            assert name in self.stages, f'Unknown stage {name}.'
+            if state.get(name) == 'done': return
+            assert state.get(name) != 'visiting', f'The pipeline has a cycle through {name}.'
+            state[name] = 'visiting'
+            for dependency in self.stages[name].dependencies: visit(dependency)
+            state[name] = 'done'
+            order.append(name)
+        for name in (targets or list(self.stages)): visit(name)
+        return order
+
+    def _fingerprint(self, stage, fingerprints):
+        files = [(path, os.path.getsize(path), os.path.getmtime(path)) if os.path.exists(path) else (path, None, None) for path in stage.files]
+        return fingerprint(stage.function, stage.params, files, {argument: fingerprints[dependency] for argument, dependency in stage.inputs.items()})
+
+    @instrumented
+    def run(self, targets=None, workers=4, cache_dir=None, results=None):
+        """
+        Function to run the stages needed for `targets`. A stage fails if its function raises, all stages depending on it are then skipped; the other stages still run.
+
+        Parameters:
+            targets         : list (names of the stages to compute, defaults to all)
+            workers         : int (number of threads running stages concurrently)
+            cache_dir       : str (directory of the stage results, None to run every stage)
+            results         : dict (results of stages that are already computed, ie. from a previous run in the same session)
+        Return:
+            results         : dict (result of every stage at its name)
+            report          : pd.DataFrame (one row per stage, see `timing_report`)
+        """
+        order = self.order(targets)
+        results = dict(results or {})
+        cache = BuildCache(os.path.join(cache_dir, 'pipeline.json')) if cache_dir is not None else None
+        if cache_dir is not None: os.makedirs(cache_dir, exist_ok=True)
+        fingerprints, reports, failed = {}, {}, set()
+        locks = {resource: threading.Lock() for name in order for resource in self.stages[name].resources}
+        origin = time.perf_counter()
+
+        def execute(current, kwargs):
+            # runs in a worker thread, holding the locks of all resources of the stage
+            held = [locks[resource] for resource in sorted(current.resources)]
+            for lock in held: lock.acquire()
+            try:
+                start = time.perf_counter()
+                with stage(f'pipeline.{current.name}'):
+                    result = current.function(**kwargs, **current.params)
+                return result, start, time.perf_counter()
+            finally:
+                for lock in held: lock.release()
+
+        pending, running = list(order), {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while pending or running:
+                # start every stage whose inputs are done
+                for name in list(pending):
+                    current = self.stages[name]
+                    if any(dependency in failed for dependency in current.dependencies):
+                        pending.remove(name)
+                        failed.add(name)
+                        reports[name] = {'Stage': name, 'Status': 'skipped', 'Start': None, 'End': None, 'Seconds': 0.0, 'Error': 'an input failed'}
+                        continue
+                    if not all(dependency in results and (cache is None or dependency in fingerprints) for dependency in current.dependencies): continue
+                    pending.remove(name)
+
+                    if cache is not None:
+                        fingerprints[name] = self._fingerprint(current, fingerprints)
+                        key, file = f'stage:{name}', os.path.join(cache_dir, f'{name}.pickle')
+                        if current.cache and cache.check(key, fingerprints[name]) is None and name not in results:
+                            with open(file, 'rb') as f: results[name] = pickle.load(f)
+                            cache.skip(key)
+                            now = time.perf_counter() - origin
+                            reports[name] = {'Stage': name, 'Status': 'cached', 'Start': now, 'End': now, 'Seconds': 0.0, 'Error': None}
+                            continue
+                    if name in results:
+                        reports[name] = {'Stage': name, 'Status': 'given', 'Start': None, 'End': None, 'Seconds': 0.0, 'Error': None}
+                        continue
+                    running[pool.submit(execute, current, {argument: results[dependency] for argument, dependency in current.inputs.items()})] = name
+
+                if not running: continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name], start, end = future.result()
+                        reports[name] = {'Stage': name, 'Status': 'ran', 'Start': start - origin, 'End': end - origin, 'Seconds': end - start, 'Error': None}
+                        if cache is not None and self.stages[name].cache:
+                            file = os.path.join(cache_dir, f'{name}.pickle')
+                            try:
+                                with open(file, 'wb') as f: pickle.dump(results[name], f, protocol=pickle.HIGHEST_PROTOCOL)
+                                cache.record(f'stage:{name}', fingerprints[name], 'ran', file=file)
+                            except (pickle.PicklingError, TypeError, AttributeError): os.remove(file) # results that cannot be pickled (ie. figures) are not cached
+                    except Exception as e:
+                        failed.add(name)
+                        reports[name] = {'Stage': name, 'Status': 'failed', 'Start': None, 'End': None, 'Seconds': 0.0, 'Error': f'{type(e).__name__}: {e}'}
+                    status = reports[name]['Status'] if reports[name]['Status'] == 'failed' else f"{reports[name]['Seconds']:.2f}s"
+                    print(f"[{len(reports)}/{len(order)}] {name} ({status})")
+
+        if cache is not None: cache.write()
+
+        report = self.timing_report([reports[name] for name in order if name in reports])
+        print(f"Ran {int((report['Status'] == 'ran').sum())} of {len(order)} stages in {time.perf_counter() - origin:.2f}s (cached={int((report['Status'] == 'cached').sum())}, failed={int((report['Status'] == 'failed').sum())}, workers={workers})")
+        return results, report
+
+    def timing_report(self, reports):
+        """
+        Function to build the timing report of a run: per stage its status ('ran', 'cached', 'given', 'failed' or 'skipped'), start and end (in seconds since the start of the run), time and whether it lies on the critical path (the chain of dependent stages with the largest total time, which bounds the run time however many workers are used).
+
+        Return:
+            report          : pd.DataFrame
+        """
+        report = pd.DataFrame(reports, columns=['Stage', 'Status', 'Start', 'End', 'Seconds', 'Error'])
+        path = self.critical_path(dict(zip(report['Stage'], report['Seconds'])))
+        report['Critical Path'] = report['Stage'].isin(path)
+        return report
+
+    def critical_path(self, seconds):
+        """
+        Function returning the critical path: the chain of dependent stages with the largest total time.
+
+        Parameters:
+            seconds         : dict (time of every stage)
+        Return:
+            path            : list (names of the stages from the first to the last)
+        """
+        finish, previous = {}, {}
+        for name in self.order(list(seconds)):
+            inputs = [dependency for dependency in self.stages[name].dependencies if dependency in finish]
+            before = max(inputs, key=lambda dependency: finish[dependency], default=None)
+            finish[name] = seconds.get(name, 0.0) + (finish[before] if before is not None else 0.0)
+            previous[name] = before
+
+        path, name = [], max(finish, key=finish.get, default=None)
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1]
+
+# stages of `report_pipeline` (module-level functions, so that their source is part of the stage fingerprints)
+
+def _subset(district, **tables):
+    from .linking import AccidentIndex
+    tables = {dataset[len('load_'):]: data for dataset, data in tables.items()}
+    return AccidentIndex(tables['accidents']).subset_by_district(tables, district) if district is not None else tables
+
+def _clean(subset, dataset):
+    from .processing import RULES, clean
+    return clean(subset[dataset], RULES.get(dataset, []))[0]
+
+def _tables(**cleaned):
+    return {dataset[len('clean_'):]: data for dataset, data in cleaned.items()}
+
+def _summaries(tables, registry, attributes_path):
+    from .visualisations import initial_summaries
+    return initial_summaries(tables, attributes_path, registry)
+
+def _severity(tables, focus):
+    from .linking import AccidentIndex
+    index = AccidentIndex(tables['accidents'])
+    return {dataset: np.asarray(data[focus]) if dataset == 'accidents' else index.link(data, focus) for dataset, data in tables.items()}
+
+def _summary(tables, summaries, dataset):
+    from .visualisations import copy_summary
+    from .numerical_summary import compute_numerical_summary
+    summary = copy_summary(summaries[dataset])
+    compute_numerical_summary(summary, tables[dataset])
+    return summary
+
+def _export(function, manifest, **kwargs):
+    # every export stage keeps its own build cache, so that concurrent stages never share a manifest
+    from .buildcache import BuildCache
+    with BuildCache(manifest) as cache:
+        return function(**kwargs, cache=cache)
+
+def _save_processed(tables, dataset, path, filename):
+    from .save import save_csv
+    save_csv(tables[dataset], path, filename)
+
+def _report(summary, path, dataset):
+    from .save import save_numerical_report
+    save_numerical_report(summary, path, dataset)
+
+def _figures(summary, path, manifest):
+    from .save import save_all_single_variable_analysis
+    return _export(save_all_single_variable_analysis, manifest, summary=summary, path=path)
+
+def _associations(tables, summary, severity, dataset, focus, path):
+    from .associations import association_with, categorical_columns
+    from .save import save_csv
+    columns = [column for column in categorical_columns(summary) if column in tables[dataset] and column != focus]
+    associations = association_with(tables[dataset], severity[dataset], columns=columns)
+    save_csv(associations, path, f'associations_{focus}')
+    return associations
+
+def _association_figures(tables, summary, summary_accidents, severity, dataset, path, manifest):
+    from .save import save_all_categorical_scatters, save_all_categorical_associations
+    scatters = _export(save_all_categorical_scatters, manifest.replace('.json', '_scatters.json'), data=tables[dataset], summary=summary, severity=severity[dataset], path=path)
+    tests = _export(save_all_categorical_associations, manifest, data=tables[dataset], severity_summary=summary_accidents, dataset_name=dataset, summary=summary, severity=severity[dataset], path=path)
+    return pd.concat([scatters, tests], ignore_index=True)
+
+def _map(tables, summary_accidents, focus, colors, path, manifest):
+    from .buildcache import BuildCache
+    from .spatial_visualisation import map_accidents
+    from .save import save_map
+    data = tables['accidents']
+    centroid = [float(data['Latitude'].mean()), float(data['Longitude'].mean())]
+    with BuildCache(manifest) as cache:
+        save_map(lambda: map_accidents(data, summary_accidents, centroid=centroid, colors=list(colors), focus=focus, fast=True), path, f'{focus}_Map', cache=cache, inputs=(data, summary_accidents, focus, list(colors)))
+
+def report_pipeline(paths, filenames, district=None, focus='Accident_Severity', tablenames=('accidents', 'casualties', 'vehicles'), load_cache=None, figures=True, association_figures=False, maps=True):
+    """
+    Function to declare the workflow of `project1.ipynb` as a `Pipeline`: loading the three datasets, subsetting to a district, cleaning (see `processing.RULES`), saving the processed tables, building and computing SUMMARY, and exporting the numerical reports, figures, associations and the map. Independent stages (ie. the three loads, the three summaries, the map and the pdf export) run concurrently; all plotting stages share the resource 'matplotlib'. Export stages always run, but skip unchanged files through their own `BuildCache`.
+
+        pipeline = report_pipeline({'data': PATH['data']['raw'], 'references': PATH['references'], 'reports': PATH['reports']['leeds'], 'processed': PATH['data']['processed']}, FILENAME, district=204)
+        results, report = pipeline.run(workers=4, cache_dir=PATH['data']['interim'] + 'pipeline/')
+
+    Parameters:
+        paths               : dict (directories at keys 'data' (raw or interim tables; processed tables keep their months and hours), 'references', 'reports' and optionally 'processed' (save the cleaned tables))
+        filenames           : dict (filename of each dataset and of the variable lookup at 'variable_lookup', ie. FILENAME)
+        district            : int (code of `Local_Authority_(District)`, None for all accidents)
+        focus               : str (accident column the associations and the map are computed for)
+        tablenames          : list (internal names of the datasets)
+        load_cache          : str (cache directory of `load_table` and `LookupRegistry.load`)
+        figures             : boolean (export the figures of the single variable analysis)
+        association_figures : boolean (export the categorical scatters and association tests)
+        maps                : boolean (export the map of all accidents)
+    Return:
+        pipeline            : Pipeline
+    """
+    from .loading import load_table
+    from .lookup import LookupRegistry
+
+    attributes_path = os.path.join(paths['references'], 'column attributes', '')
+    lookup_path = os.path.join(paths['references'], filenames['variable_lookup'])
+    reports = paths['reports']
+    pipeline = Pipeline()
+
+    pipeline.add('registry', LookupRegistry.load, params={'path': lookup_path, 'cache_dir': load_cache}, files=[lookup_path])
+    for dataset in tablenames:
+        path = os.path.join(paths['data'], filenames[dataset])
+        pipeline.add(f'load_{dataset}', load_table, params={'path': path, 'attributes_path': os.path.join(attributes_path, f'{dataset}_column_attributes.csv'), 'cache_dir': load_cache}, files=[path])
+    pipeline.add('subset', _subset, inputs=[f'load_{dataset}' for dataset in tablenames], params={'district': district})
+    for dataset in tablenames:
+        pipeline.add(f'clean_{dataset}', _clean, inputs=['subset'], params={'dataset': dataset})
+    pipeline.add('tables', _tables, inputs=[f'clean_{dataset}' for dataset in tablenames], cache=False)
+    pipeline.add('summaries', _summaries, inputs=['tables', 'registry'], params={'attributes_path': attributes_path})
+    pipeline.add('severity', _severity, inputs=['tables'], params={'focus': focus})
+
+    for dataset in tablenames:
+        path = os.path.join(reports, dataset, '')
+        if paths.get('processed'):
+            pipeline.add(f'save_processed_{dataset}', _save_processed, inputs=['tables'], params={'dataset': dataset, 'path': paths['processed'], 'filename': filenames[dataset][:-4]}, cache=False)
+        pipeline.add(f'summary_{dataset}', _summary, inputs=['tables', 'summaries'], params={'dataset': dataset})
+        pipeline.add(f'report_{dataset}', _report, inputs={'summary': f'summary_{dataset}'}, params={'path': path, 'dataset': dataset}, cache=False)
+        pipeline.add(f'associations_{dataset}', _associations, inputs={'tables': 'tables', 'summary': f'summary_{dataset}', 'severity': 'severity'}, params={'dataset': dataset, 'focus': focus, 'path': path}, cache=False)
+        if figures:
+            pipeline.add(f'figures_{dataset}', _figures, inputs={'summary': f'summary_{dataset}'}, params={'path': path + 'figures/', 'manifest': path + 'figures/manifest.json'}, resources=['matplotlib'], cache=False)
+        if association_figures:
+            pipeline.add(f'association_figures_{dataset}', _association_figures, inputs={'tables': 'tables', 'summary': f'summary_{dataset}', 'summary_accidents': 'summary_accidents', 'severity': 'severity'}, params={'dataset': dataset, 'path': path + 'associations/', 'manifest': path + 'associations/manifest.json'}, resources=['matplotlib'], cache=False)
+    if maps:
+        pipeline.add('map', _map, inputs=['tables', 'summary_accidents'], params={'focus': focus, 'colors': ('black', 'red', 'green'), 'path': os.path.join(reports, 'maps', ''), 'manifest': os.path.join(reports, 'maps', 'manifest.json')}, cache=False)
+    return pipeline
@@ -1,32 +1,194 @@
-def check_indexes_in_subset(sub_dataset_indexes, main_dataset_indexes):
+import numpy as np
+import pandas as pd
+from .linking import AccidentIndex
+from .loading import parse_date, parse_hour
+from .instrument import instrumented
+
+@instrumented
+def check_indexes_in_subset(sub_dataset_indexes, main_dataset_indexes, index=None):
     """ 
-    Helper-Function to evaluate whether there are indexes in the two linked sub datasets that do not appear in the main dataset.
+    Helper-Function to evaluate whether there are indexes in the two linked sub datasets that do not appear in the main dataset. The lookup is done through an `AccidentIndex` on the main dataset, which can be passed in to be reused across calls.
 
     Parameters:
         sub_dataset_indexes         : pd.DataFrame
         main_dataset_indexes        : pd.DataFrame
+        index                       : AccidentIndex (optional, prebuilt index on the main dataset)
     Return:
         #Wrong Indexes              : int (None if len() == 0)
     """
     assert len(main_dataset_indexes.shape) == 1 and len(sub_dataset_indexes.shape) == 1, 'Both function arguments must be one-dimensional'
 
-    accidents_indexes = set(main_dataset_indexes)
-    wrong_indexes = [i for i in set(sub_dataset_indexes) if i not in accidents_indexes]
+    if index is None: index = AccidentIndex.from_indexes(main_dataset_indexes)
+    wrong_indexes = index.missing(sub_dataset_indexes)
 
-    if len(wrong_indexes) == 0:
+    if wrong_indexes == 0:
         return None
     else:
-        return len(wrong_indexes)
+        return wrong_indexes
 
+@instrumented
 def check_columns_for_missing_values(data):
     """
-    For a dataset provided as a pd.DataFrame the function returns an informative string about each column containing null values, namely the number of missing values, the column index and the variable name of the column.
+    For a dataset provided as a pd.DataFrame the function returns an informative string about each column containing null values, namely the number of missing values, the column index and the variable name of the column. The null values of all columns are counted in one pass.
 
     Parameters:
         data                : pd.DataFrame
     Return:
         Informative String for each column containing null values, else None
     """
-    for column in range(data.shape[1]):
-        if sum(data.iloc[:,column].isnull()) != 0:
-            print(f'{sum(data.iloc[:,column].isnull())} ({data.columns[column]}({column}))')
\ No newline at end of file
+    nulls = data.isnull().sum().to_numpy()
+    for column in np.flatnonzero(nulls):
+        print(f'{nulls[column]} ({data.columns[column]}({column}))')
+
+def map_distinct(column, function, missing=-1):
+    """
+    Helper-Function applying a derivation to every distinct value of a column once and spreading the results to all rows (through the codes of a categorical column, as loaded by `loading.load_table`, or of `pd.factorize`). Columns like `Date` and `Time` hold a few hundred distinct values, so the cost of parsing does not grow with the number of rows. Missing values become `missing`.
+
+    Parameters:
+        column              : pd.Series
+        function            : callable (maps a pd.Series of distinct values to an array of results)
+        missing             : value for missing values
+    Return:
+        pd.Series
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype): codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+    else: codes, uniques = pd.factorize(column)
+    values = np.asarray(function(pd.Series(uniques)))
+    result = np.full(len(codes), missing, dtype=values.dtype if len(values) else np.int8)
+    result[codes >= 0] = values[codes[codes >= 0]]
+    return pd.Series(result, index=column.index)
+
+def derive_hour(column):
+    """
+    Derivation of the hour from `HH:MM` strings (see `loading.parse_hour`), -1 for missing times. Columns already holding hours (integers) are kept.
+    """
+    if column.dtype.kind in 'iu': return column
+    return map_distinct(column, lambda times: parse_hour(times).to_numpy())
+
+def derive_month(column):
+    """
+    Derivation of the month from `dd/mm/yyyy` strings or dates, -1 for missing or malformed dates. Columns already holding months (integers) are kept.
+    """
+    if column.dtype.kind in 'iu': return column
+    if column.dtype.kind == 'M': return column.dt.month.fillna(-1).astype(np.int8)
+    return map_distinct(column, lambda dates: parse_date(dates).dt.month.fillna(-1).astype(np.int8).to_numpy())
+
+def derive_weekday(column):
+    """
+    Derivation of the day of week (1 = Sunday, ..., 7 = Saturday, as `Day_of_Week`) from `dd/mm/yyyy` strings or dates, -1 for missing or malformed dates.
+    """
+    weekday = lambda dates: ((dates.dt.dayofweek + 1) % 7 + 1).fillna(-1).astype(np.int8)
+    if column.dtype.kind == 'M': return weekday(column)
+    return map_distinct(column, lambda dates: weekday(parse_date(dates)).to_numpy())
+
+# derivations available to `derive` rules by name (each maps a whole column to a new column)
+DERIVATIONS = {'hour': derive_hour, 'month': derive_month, 'weekday': derive_weekday}
+
+# cleaning rules of the notebook's `Process Data` section, per dataset
+RULES = {
+    'accidents': [
+        {'Rule': 'derive', 'Column': 'Time', 'Function': 'hour'},
+        {'Rule': 'derive', 'Column': 'Date', 'Function': 'month'},
+        {'Rule': 'remap', 'Column': '2nd_Road_Class', 'Map': {-1: 0}}],
+    'casualties': [],
+    'vehicles': []}
+
+def apply_rule(data, rule):
+    """
+    Function to apply one cleaning rule to a whole column at once. A rule is a dictionary with the keys
+        'Rule'      : 'derive' (new values of `Column` computed from column `From` (default `Column`) by `Function`, a name in `DERIVATIONS` or a callable on a pd.Series)
+                      'remap'  (values replaced through `Map`, ie. {-1: 0}; all values are looked up in the original column, so maps may swap values)
+                      'clip'   (values clipped into [`Lower`, `Upper`], missing values (-1) are kept)
+                      'missing'(values marked as missing (-1): NaN, the values in `Values`, values outside [`Lower`, `Upper`] and, with `Valid`, all values not in `Valid`)
+        'Column'    : str (name of the column)
+
+    Parameters:
+        data                : pd.DataFrame (changed in place)
+        rule                : dict
+    Return:
+        changed             : int (number of changed values)
+    """
+    name, kind = rule['Column'], rule['Rule']
+    before = data[name] if name in data else None
+
+    if kind == 'derive':
+        function = rule['Function']
+        function = DERIVATIONS[function] if isinstance(function, str) else function
+        after = function(data[rule.get('From', name)])
+
+    elif kind == 'remap':
+        values = before.to_numpy()
+        after = values.copy()
+        for old, new in rule['Map'].items():
+            after[values == old] = new
+        after = pd.Series(after, index=before.index)
+
+    elif kind == 'clip':
+        missing = before == -1
+        after = before.clip(rule.get('Lower'), rule.get('Upper')).where(~missing, -1)
+
+    elif kind == 'missing':
+        invalid = before.isnull()
+        if 'Values' in rule: invalid |= before.isin(rule['Values'])
+        if 'Lower' in rule: invalid |= before < rule['Lower']
+        if 'Upper' in rule: invalid |= before > rule['Upper']
+        if 'Valid' in rule: invalid |= ~before.isin(list(rule['Valid']) + [-1])
+        after = before.where(~invalid, -1)
+        if after.dtype.kind == 'f' and (after.dropna() % 1 == 0).all(): after = after.astype(np.int64)
+
+    else: raise NameError(f"Rule '{kind}' not defined. Try 'derive', 'remap', 'clip' or 'missing'.")
+
+    data[name] = after
+    if before is None or before.dtype != after.dtype: return len(after) # ie. strings derived into codes
+    return int((~(before.eq(after) | (before.isnull() & after.isnull()))).sum())
+
+@instrumented
+def clean(data, rules, inplace=False):
+    """
+    Function to run the cleaning stage on a dataset: every rule (see `apply_rule`) is applied to its whole column in turn. Replaces the element-wise loops over `Time`, `Date` and `2nd_Road_Class`, and runs the same way on every dataset (ie. the national tables).
+
+    Parameters:
+        data                : pd.DataFrame
+        rules               : list (rules, ie. RULES['accidents'])
+        inplace             : boolean (change `data` itself instead of a copy)
+    Return:
+        data                : pd.DataFrame (cleaned)
+        log                 : pd.DataFrame (number of values changed by every rule)
+    """
+    if not inplace: data = data.copy()
+    log = [{'Rule': rule['Rule'], 'Column': rule['Column'], 'Changed': apply_rule(data, rule)} for rule in rules]
+    return data, pd.DataFrame(log, columns=['Rule', 'Column', 'Changed'])
+
+def valid_codes(summary):
+    """
+    Helper-Function returning the valid codes of every column with a lookup (`Map`) in SUMMARY, for `missing_value_report`.
+    """
+    return {entry['Name']: list(entry['Map'].keys()) for entry in summary.values() if entry.get('Map')}
+
+@instrumented
+def missing_value_report(data, codes=None):
+    """
+    Function to report missing and invalid values of all columns of a dataset in a single pass per column: every column is factorized once (nulls get no code), and values coded as missing (-1) and, with `codes`, values that are not valid codes of their column (ie. not in its variable lookup) are then found among its uniques and counted through the counts of the uniques.
+
+    Parameters:
+        data                : pd.DataFrame
+        codes               : dict (valid codes per column name, see `valid_codes`)
+    Return:
+        report              : pd.DataFrame (one row per column: index, name, #null, #missing (-1), #invalid and the share of affected rows)
+    """
+    codes = codes or {}
+    nulls, coded_missing, invalid = np.zeros(data.shape[1], dtype=np.int64), np.zeros(data.shape[1], dtype=np.int64), np.zeros(data.shape[1], dtype=np.int64)
+    for column, name in enumerate(data.columns):
+        values = data.iloc[:, column]
+        labels, uniques = pd.factorize(values, use_na_sentinel=True)
+        counts = np.bincount(labels + 1, minlength=len(uniques) + 1) # nulls are counted at position 0
+        nulls[column], counts = counts[0], counts[1:]
+
+        if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+            coded_missing[column] = counts[np.asarray(uniques == -1)].sum()
+        if name in codes:
+            invalid[column] = counts[~np.asarray(pd.Index(uniques).isin(list(codes[name]) + [-1]))].sum()
+
+    report = pd.DataFrame({'Column': range(data.shape[1]), 'Name': data.columns, 'Null': nulls, 'Missing (-1)': coded_missing, 'Invalid': invalid})
+    report['Share'] = (report['Null'] + report['Missing (-1)'] + report['Invalid']) / max(data.shape[0], 1)
+    return report
@@ -1,8 +1,31 @@
+import io
 import os
+import time
+import queue
+import zipfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from .visualisations import *
+from .visualisations import barplot, histogram, boxplot, categorical_scatterplot, categorical_association_test
+from .buildcache import cached, fingerprint
+from .instrument import instrumented, stage
+from .colstore import column_data
 
-def save_csv(data, path, filename, index=False, force=True):
+# directories created (or found) by `ensure_directory` in this process
+_DIRECTORIES = set()
+
+def ensure_directory(path):
+    """
+    Helper-Function creating a directory (and its parents) once per process: later calls for the same path return without touching the filesystem.
+    """
+    path = os.path.normpath(path)
+    if path not in _DIRECTORIES:
+        os.makedirs(path, exist_ok=True)
+        _DIRECTORIES.add(path)
+
+@instrumented
+def save_csv(data, path, filename, index=False, force=True, cache=None):
     """
     Helper-Function to export pandas DataFrames into `csv` format using pandas built-in method `to_csv()`. The function provides functionality to force the creation of the path if not previously located in the file structure.
 
@@ -12,15 +35,18 @@ def save_csv(data, path, filename, index=False, force=True):
         filename            : str (descriptive filename (NOTE: without `.csv` file extension))
         index               : boolean (Specifies saving process in pandas.to_csv(). For more information check out the documentation of `to_csv()`)
         force               : boolean (True for automatic path creation using `os`)
+        cache               : BuildCache (skips writing if `data` is unchanged since the last run)
     Return:
         None
     """
-    if force:
-        try: os.makedirs(path)
-        except: None
-    data.to_csv(f"{path}{filename}.csv", index=index)
+    def build():
+        if force: ensure_directory(path)
+        data.to_csv(f"{path}{filename}.csv", index=index)
+
+    cached(cache, f"{path}{filename}.csv", (save_csv, data, index), build)
 
-def save_numerical_report(summary, path, filename, force=True, save_to='csv'):
+@instrumented
+def save_numerical_report(summary, path, filename, force=True, save_to='csv', cache=None):
     """
     Function to save the SUMMARY['dataset_name`] dictionary into either `csv` or `json` format for further use or extensive inspection by specifying a having path and filename. 
 
@@ -29,129 +55,442 @@ def save_numerical_report(summary, path, filename, force=True, save_to='csv'):
         path            : str (Relative path to location of saving)
         filename        : str (Filename (without suffix `.csv` or `.json`))
         save_to         : str (either `csv` or `json`)
+        cache           : BuildCache (skips writing if `summary` is unchanged since the last run)
     Return: None 
     """
-    summary_dataframe = pd.DataFrame(summary)
-    
-    if force:
-        try: os.makedirs(path)
-        except: None
+    if save_to not in ['csv', 'json']: raise NameError(f"'{save_to}' not defined. Try saving to 'csv' or 'json' format.")
 
-    if save_to == 'csv': summary_dataframe.to_csv(f'{path}/summary_{filename}.csv')
-    elif save_to == 'json': summary_dataframe.to_json(f'{path}/summary_{filename}.json')
-    else: raise NameError(f"'{save_to}' not defined. Try saving to 'csv' or 'json' format.")
-    print(f"Saved: {filename}.{save_to} to {path}")
+    def build():
+        summary_dataframe = pd.DataFrame(summary)
+        if force: ensure_directory(path)
 
-def save_figure(figure, path, filename, force=True, save_to='pdf'):
+        if save_to == 'csv': summary_dataframe.to_csv(f'{path}/summary_{filename}.csv')
+        elif save_to == 'json': summary_dataframe.to_json(f'{path}/summary_{filename}.json')
+        print(f"Saved: {filename}.{save_to} to {path}")
+
+    cached(cache, f'{path}/summary_{filename}.{save_to}', (save_numerical_report, summary, save_to), build)
+
+@instrumented
+def save_figure(figure, path, filename, force=True, save_to='pdf', cache=None, inputs=None, export=None):
     """
-    Function to save any matplotlib figure into a specified (relative) path and given filename. The function provides functionality to force the creation of the path if not previously located in the file structure.
+    Function to save any matplotlib figure into a specified (relative) path and given filename. The function provides functionality to force the creation of the path if not previously located in the file structure. With a build cache, the figure can be given as a function creating it, which is then only called if the `inputs` of the figure changed since the last run. With an `ExportPipeline`, the figure is handed to its writer threads (and closed) instead of written here.
 
     Parameters:
-        figure          : plt.Figure 
+        figure          : plt.Figure (or callable returning one)
         path            : str (Relative path to location of saving)
         filename        : str (Filename (without suffix `.csv` or `.json`))
         force           : boolean (Creates Path automatically if `True`, else `False`)
         save_to         : str (either `csv` or `json`)
+        cache           : BuildCache (used together with `inputs`)
+        inputs          : tuple (everything the figure depends on, ie. summary entry and plot parameters)
+        export          : ExportPipeline
     Return: None 
     """
-    if force:
-        try: os.makedirs(path)
-        except: None
+    def build():
+        fig = figure() if callable(figure) else figure
+        if export is not None: return export.figure(fig, path, filename, save_to=save_to)
+
+        if force: ensure_directory(path)
+        with stage(f'save.write_{save_to}'):
+            fig.savefig(f'{path}/{filename}.{save_to}')
+        print(f"Saved: '{filename}.{save_to}' to {path}")
 
-    figure.savefig(f'{path}/{filename}.{save_to}')
-    print(f"Saved: '{filename}.{save_to}' to {path}")
+    assert cache is None or export is None or export.bundle is None, 'Bundled figures cannot be skipped by a build cache.'
+    cached(cache if inputs is not None else None, f'{path}/{filename}.{save_to}', (save_figure, save_to) + tuple(inputs or ()), build)
+
+def _render_and_save(job, export=None):
+    """
+    Helper-Function rendering a single figure job, saving it and closing the figure. A job is a tuple (plot, args, kwargs, path, filename), where `plot` is the name of one of the plotting functions in `visualisations`. Filenames may contain `{V}`, which is filled with the Cramér's V returned by `categorical_association_test`.
 
-def save_all_single_variable_analysis(summary, path, missing_values=False):
+    Parameters:
+        job                 : tuple
+        export              : ExportPipeline (see `save_figure`)
+    Return:
+        report              : dict (filename, path, seconds and error of the job)
+    """
+    import matplotlib.pyplot as plt
+    plot, args, kwargs, path, filename = job
+
+    start = time.perf_counter()
+    try:
+        result = PLOTS[plot](*args, **kwargs)
+        if isinstance(result, tuple): 
+            fig, V = result
+            filename = filename.format(V=V)
+        else: fig = result
+
+        fig = getattr(fig, 'fig', fig) # seaborn returns a FacetGrid holding the figure
+        save_figure(fig, path, filename=filename, save_to='pdf', export=export)
+        plt.close(fig)
+        error = None
+    except Exception as e:
+        plt.close('all')
+        error = f'{type(e).__name__}: {e}'
+
+    return {'Filename': filename, 'Path': path, 'Seconds': time.perf_counter() - start, 'Error': error}
+
+def init_worker():
+    """
+    Helper-Function run once in every worker process: figures are only written to files, so the headless `Agg` backend is used.
     """
-    Function to save all figures from the single variable analysis automatically into a specified (relative) path. Filenames are generated automatically. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline plotting
+    import matplotlib
+    matplotlib.use('Agg')
+
+class _BundleStream:
+    # file-like object handing everything written to it to a writer thread of an `ExportPipeline` in chunks (used as the file of a multi-page pdf)
+    def __init__(self, pipeline, file):
+        self.pipeline, self.file = pipeline, file
+        self.buffer, self.position = io.BytesIO(), 0
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        if self.buffer.tell() >= self.pipeline.chunk_size: self.flush()
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        # the stream only moves forward, seeking is supported to the current position only
+        if (offset, whence) not in [(self.position, 0), (0, 1)]: raise io.UnsupportedOperation('The bundle stream cannot seek.')
+        return self.position
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        if self.buffer.tell():
+            self.pipeline._queue(self.file).put(('append', self.file, None, self.buffer.getvalue()))
+            self.buffer = io.BytesIO()
+
+    def close(self):
+        self.flush()
+
+class ExportPipeline:
+    """
+    Pipeline writing reports in background threads, so that rendering the next figure overlaps with writing the previous one (which dominates the run time on slow network filesystems). Figures and maps are rendered into byte buffers by the calling thread (matplotlib is not thread-safe) and queued for `writers` writer threads. Every queue holds at most `max_pending` buffers, so a producer that is faster than the disk waits instead of holding all reports in memory. All writes to one file go through the same writer thread, so bundles are written in order. Directories are created once, when a file is first queued for them.
+
+    With `bundle='pdf'`, all figures for the same directory (ie. all boxplots of a dataset) are written as the pages of one pdf `<directory>.pdf`, with `bundle='zip'` all files go into one archive `<directory>.zip`. `bundle_path` puts all files into a single bundle instead, ie. all figures of a dataset:
+
+        with ExportPipeline(bundle='pdf', bundle_path=PATH['reports']['leeds'] + 'accidents') as export:
+            save_all_single_variable_analysis(SUMMARY['accidents'], path, export=export)
+        export.report()
+
+    Parameters:
+        writers             : int (number of writer threads)
+        max_pending         : int (maximum number of queued buffers per writer thread)
+        bundle              : str (None for one file per report, 'pdf' or 'zip')
+        bundle_path         : str (path of the single bundle without suffix, defaults to one bundle per directory)
+        chunk_size          : int (size in bytes of the buffers that pdf bundles are queued in)
+    """
+    def __init__(self, writers=2, max_pending=8, bundle=None, bundle_path=None, chunk_size=2**20):
+        if bundle not in [None, 'pdf', 'zip']: raise NameError(f"bundle = '{bundle}' is not defined. Try None, 'pdf' or 'zip'")
+        self.bundle, self.bundle_path, self.chunk_size = bundle, bundle_path, chunk_size
+        self.reports, self.closed = [], False
+        self.start = time.perf_counter()
+        self._pages = {} # bundle file: (PdfPages, _BundleStream)
+        self._lock = threading.Lock()
+        self._queues = [queue.Queue(maxsize=max_pending) for _ in range(writers)]
+        self._threads = [threading.Thread(target=self._write, args=(q,), daemon=True) for q in self._queues]
+        for thread in self._threads: thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _queue(self, file):
+        return self._queues[hash(file) % len(self._queues)]
+
+    def _bundle_file(self, path, suffix):
+        file = f'{os.path.normpath(self.bundle_path or path)}.{suffix}'
+        ensure_directory(os.path.dirname(file) or '.')
+        return file
+
+    def put(self, path, filename, data):
+        """
+        Function to queue a buffer to be written to `path/filename` (or into the zip bundle). Waits while the queue of its writer thread is full.
+
+        Return:
+            file            : str (file the buffer is written to)
+        """
+        if self.closed: raise RuntimeError('The export pipeline is closed.')
+        if self.bundle == 'zip':
+            file = self._bundle_file(path, 'zip')
+            name = os.path.relpath(os.path.join(path, filename), os.path.dirname(file)) if self.bundle_path else filename
+            self._queue(file).put(('zip', file, name, data))
+        else:
+            ensure_directory(path)
+            file = os.path.join(path, filename)
+            self._queue(file).put(('file', file, filename, data))
+        return file
+
+    def figure(self, fig, path, filename, save_to='pdf'):
+        """
+        Function to render a figure into a buffer (or as a page of the pdf bundle), close it and queue it for writing.
+
+        Return:
+            file            : str (file the figure is written to)
+        """
+        import matplotlib.pyplot as plt
+        fig = getattr(fig, 'fig', fig)
+        try:
+            with stage(f'save.render_{save_to}'):
+                if self.bundle == 'pdf' and save_to == 'pdf':
+                    return self._page(fig, path)
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format=save_to)
+        finally: plt.close(fig)
+        return self.put(path, f'{filename}.{save_to}', buffer.getvalue())
+
+    def _page(self, fig, path):
+        # adds a figure as page to the pdf bundle of `path`
+        from matplotlib.backends.backend_pdf import PdfPages
+        file = self._bundle_file(path, 'pdf')
+        with self._lock:
+            if file not in self._pages:
+                stream = _BundleStream(self, file)
+                self._pages[file] = (PdfPages(stream), stream)
+            pages = self._pages[file][0]
+            pages.savefig(fig)
+        return file
+
+    def map(self, folium_map, path, filename):
+        """
+        Function to render a `folium.Map` into `html` and queue it for writing (maps are written as files in pdf bundles).
+
+        Return:
+            file            : str (file the map is written to)
+        """
+        with stage('save.render_html'):
+            data = folium_map.get_root().render().encode('utf8')
+        if self.bundle == 'pdf':
+            ensure_directory(path)
+            file = os.path.join(path, f'{filename}.html')
+            self._queue(file).put(('file', file, f'{filename}.html', data))
+            return file
+        return self.put(path, f'{filename}.html', data)
+
+    def _write(self, q):
+        # writer thread: writes queued buffers until it receives None, then closes its bundles
+        handles = {}
+        while True:
+            item = q.get()
+            if item is None: break
+            kind, file, name, data = item
+            start, error = time.perf_counter(), None
+            try:
+                with stage(f'save.write_{kind}'):
+                    if kind == 'file':
+                        with open(file, 'wb') as f: f.write(data)
+                    else:
+                        if file not in handles: handles[file] = open(file, 'wb') if kind == 'append' else zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED)
+                        if kind == 'append': handles[file].write(data)
+                        else: handles[file].writestr(name, data)
+            except Exception as e: error = f'{type(e).__name__}: {e}'
+            if kind != 'append':
+                with self._lock: self.reports.append({'File': file, 'Name': name, 'Bytes': len(data), 'Seconds': time.perf_counter() - start, 'Error': error})
+
+        for file, handle in handles.items():
+            if isinstance(handle, zipfile.ZipFile): # entries are reported one by one
+                handle.close()
+                continue
+            size = handle.tell()
+            handle.close()
+            with self._lock: self.reports.append({'File': file, 'Name': os.path.basename(file), 'Bytes': size, 'Seconds': 0.0, 'Error': None})
+
+    def close(self):
+        """
+        Function to finish all bundles, wait until everything is written and stop the writer threads. Returns the report (see `report`).
+        """
+        if self.closed: return self.report()
+        for pages, stream in self._pages.values():
+            pages.close()
+            stream.close()
+        self.closed = True
+        for q in self._queues: q.put(None)
+        for thread in self._threads: thread.join()
+
+        report = self.report()
+        print(f"Exported {len(report)} files ({report['Bytes'].sum() / 2**20:.1f} MB) in {time.perf_counter() - self.start:.2f}s (writers={len(self._threads)}, failed={report['Error'].notna().sum()})")
+        return report
+
+    def report(self):
+        """
+        Returns one row per written file (or zip entry) with its size, write time and error.
+        """
+        with self._lock: return pd.DataFrame(self.reports, columns=['File', 'Name', 'Bytes', 'Seconds', 'Error'])
+
+@instrumented
+def run_figure_jobs(jobs, workers=None, cache=None, export=None):
+    """
+    Function to render and save a list of figure jobs (see `_render_and_save`), either one after another or spread over a process pool with `workers` processes. Every figure is closed after saving, so memory stays flat. Prints a progress line per figure and the total time. With a build cache, jobs whose inputs (plotting function, arguments and path) are unchanged since the last run are skipped before rendering.
+
+    Parameters:
+        jobs                : list (figure jobs)
+        workers             : int (number of worker processes, None or 1 to render in this process)
+        cache               : BuildCache (skips unchanged figures)
+        export              : ExportPipeline (figures rendered in this process are written by its threads, see `save_figure`)
+    Return:
+        report              : pd.DataFrame (one row per figure with filename, path, seconds, error and status)
+    """
+    assert export is None or workers is None or workers <= 1, 'An export pipeline writes figures rendered in this process, use it without workers.'
+    assert cache is None or export is None or export.bundle is None, 'Bundled figures cannot be skipped by a build cache.'
+    start = time.perf_counter()
+    reports, status = [], {}
+
+    if cache is not None:
+        stale = []
+        for job in jobs:
+            key, fp = f'{job[3]}/{job[4]}.pdf', fingerprint(PLOTS[job[0]], *job[1:3])
+            reason = cache.check(key, fp)
+            if reason is None:
+                cache.skip(key)
+                reports.append({'Filename': job[4], 'Path': job[3], 'Seconds': 0.0, 'Error': None, 'Status': 'skipped'})
+            else:
+                status[key] = (fp, reason)
+                stale.append(job)
+        if len(stale) < len(jobs): print(f"Skipping {len(jobs) - len(stale)} unchanged figures")
+        jobs = stale
+
+    if workers is None or workers <= 1:
+        results = map(lambda job: _render_and_save(job, export=export), jobs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+        results = pool.map(_render_and_save, jobs, chunksize=max(1, len(jobs) // (4 * workers)))
+
+    try:
+        for i, (job, report) in enumerate(zip(jobs, results)):
+            report['Status'] = 'failed' if report['Error'] else 'rebuilt'
+            if cache is not None and not report['Error']:
+                key = f'{job[3]}/{job[4]}.pdf'
+                cache.record(key, status[key][0], status[key][1], file=f"{report['Path']}/{report['Filename']}.pdf")
+            reports.append(report)
+            progress = 'failed' if report['Error'] else f"{report['Seconds']:.2f}s"
+            print(f"[{i+1}/{len(jobs)}] {report['Filename']} ({progress})")
+    finally:
+        if pool is not None: pool.shutdown()
+        if cache is not None: cache.write()
+
+    print(f"Rendered {len(jobs)} figures in {time.perf_counter() - start:.2f}s (workers={workers or 1})")
+    return pd.DataFrame(reports, columns=['Filename', 'Path', 'Seconds', 'Error', 'Status'])
+
+@instrumented
+def save_all_single_variable_analysis(summary, path, missing_values=False, workers=None, cache=None, export=None):
+    """
+    Function to save all figures from the single variable analysis automatically into a specified (relative) path. Filenames are generated automatically. Figures are closed after saving; with `workers`, they are rendered in parallel by a process pool (only the summary of each column is sent to the workers).
 
     Parameter:
         summary             : dict (central data structure to hold information about all columns in dataset)
         path                : str (Relative path to location of saving)
         keep_missing_values : boolean (plot with or without missing values)
+        workers             : int (number of worker processes, None to render in this process)
+        cache               : BuildCache (skips figures whose inputs are unchanged since the last run)
+        export              : ExportPipeline (writes the figures in background threads, see `run_figure_jobs`)
     Return: 
-        fig                 : matplotlib.Figure 
+        report              : pd.DataFrame (see `run_figure_jobs`)
     """
+    jobs = []
     for column in range(len(summary)):
+        # set path to save to 
+        if missing_values: spath = path + 'with_missing_values'
+        else: spath = path + 'without_missing_values'
+
         if summary[column]['Plot'] == 'bar':
             # create barplot
-            fig = barplot(summary[column], keep_missing_values=missing_values)
-
-            # set path to save to 
-            if missing_values: spath = path + 'with_missing_values'
-            else: spath = path + 'without_missing_values'
-
-            # save to path
-            save_figure(fig, spath, filename=f"{column}_{summary[column]['Name']}", save_to='pdf')
+            jobs.append(('barplot', (summary[column],), {'keep_missing_values': missing_values}, spath, f"{column}_{summary[column]['Name']}"))
 
         elif summary[column]['Plot'] == 'hist':
             # create histogram
-            fig = histogram(summary[column], keep_missing_values=missing_values)
-
-            # set path to save to 
-            if missing_values: spath = path + 'with_missing_values'
-            else: spath = path + 'without_missing_values'
-
-            save_figure(fig, spath, filename=f"{column}_{summary[column]['Name']}", save_to='pdf')
+            jobs.append(('histogram', (summary[column],), {'keep_missing_values': missing_values}, spath, f"{column}_{summary[column]['Name']}"))
 
         if summary[column]['Summary']:
             # create boxplot
-            fig = boxplot(summary[column])
+            jobs.append(('boxplot', (summary[column],), {}, path + 'boxplots', f"{column}_{summary[column]['Name']}"))
 
-            # set path to save to 
-            spath = path + 'boxplots'
-            
-            save_figure(fig, spath, filename=f"{column}_{summary[column]['Name']}", save_to='pdf')
+    return run_figure_jobs(jobs, workers=workers, cache=cache, export=export)
 
-def save_all_categorical_scatters(data, summary, severity, path):
+@instrumented
+def save_all_categorical_scatters(data, summary, severity, path, workers=None, cache=None, kind='auto', export=None):
     """
-    Function to save all categorical scatters for a given dataset automatically into a specified (relative) path. Filenames are generated automatically. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline     plotting
+    Function to save all categorical scatters for a given dataset automatically into a specified (relative) path. Filenames are generated automatically. Figures are closed after saving; with `workers`, they are rendered in parallel by a process pool (only the two plotted columns are sent to the workers). By default, columns with more than a few thousand records are drawn from aggregates instead of as a swarm (see `categorical_scatterplot`).
 
     Parameter:
-        data                : pd.DataFrame (whole dataset)
+        data                : pd.DataFrame (whole dataset) or ColumnStore (columns are sent to workers without copying)
         summary             : dict (central data structure to hold information about all columns in dataset)
         path                : str (Relative path to location of saving)
-        keep_missing_values : boolean (plot with or without missing values)
+        workers             : int (number of worker processes, None to render in this process)
+        cache               : BuildCache (skips figures whose inputs are unchanged since the last run)
+        export              : ExportPipeline (writes the figures in background threads, see `run_figure_jobs`)
+        kind                : str (see `_kind` of `categorical_scatterplot`)
+    Return: 
+        report              : pd.DataFrame (see `run_figure_jobs`)
     """
+    jobs = []
     for i in range(len(summary)):
         if summary[i]['Plot'] == 'hist':
-                fig = categorical_scatterplot(summary[6], severity, summary[i], data.iloc[:,i], _exclude=0, _kind='svarm') # catch errors when scatter cannot be computed
+            args = (summary[6], severity, summary[i], column_data(data, i))
+            jobs.append(('categorical_scatterplot', args, {'_exclude': 0, '_kind': kind}, path, f"scatter_{i}_{summary[i]['Name']}"))
 
-                spath = path 
-                save_figure(fig, spath, filename=f"scatter_{i}_{summary[i]['Name']}", save_to='pdf')
+    return run_figure_jobs(jobs, workers=workers, cache=cache, export=export)
 
-def save_all_categorical_associations(data, severity_summary, dataset_name, summary, severity, path):
+@instrumented
+def save_all_categorical_associations(data, severity_summary, dataset_name, summary, severity, path, workers=None, cache=None, export=None):
     """
-    Function to save all association plots between two categorical variables for a given dataset automatically into a specified (relative) path. Filenames are generated automatically. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline     plotting
+    Function to save all association plots between two categorical variables for a given dataset automatically into a specified (relative) path. Filenames are generated automatically. Figures are closed after saving; with `workers`, they are rendered in parallel by a process pool (only the two tested columns are sent to the workers). Columns for which the test cannot be computed are reported with their error.
 
     Parameter:
-        data                : pd.DataFrame (whole dataset)
+        data                : pd.DataFrame (whole dataset) or ColumnStore (columns are sent to workers without copying)
         summary             : dict (central data structure to hold information about all columns in dataset)
         path                : str (Relative path to location of saving)
         dataset_name        : str (Identifier for dataset)
+        workers             : int (number of worker processes, None to render in this process)
+        cache               : BuildCache (skips figures whose inputs are unchanged since the last run)
+        export              : ExportPipeline (writes the figures in background threads, see `run_figure_jobs`)
+    Return: 
+        report              : pd.DataFrame (see `run_figure_jobs`)
     """
+    jobs = []
     for i in range(len(summary)):
-            try: 
-                if summary[i]['Map']: # local authority highway and local authority district 
-                    fig, V = categorical_association_test(data, severity_summary[6], severity, summary[i], data.iloc[:,i])
+        if summary[i].get('Map'): # local authority highway and local authority district 
+            args = (None, severity_summary[6], severity, summary[i], column_data(data, i))
+            jobs.append(('categorical_association_test', args, {}, path, f"chi2_{{V}}_{i}_{summary[i]['Name']}"))
 
-                    spath = path 
-                    save_figure(fig, spath, filename=f"chi2_{V}_{i}_{summary[i]['Name']}", save_to='pdf')
-            except: None
+    return run_figure_jobs(jobs, workers=workers, cache=cache, export=export)
 
 # save_all_categorical_associations(data = DATA_LEEDS[dataset], severity_summary=SUMMARY['accidents'][6], dataset_name=dataset, summary=SUMMARY[dataset], severity= SEVERITY[dataset], path=PATH['reports']['leeds'] + PATH[dataset] + 'associations/')
 
-def save_map(_map, path, filename):
+# plotting functions available to figure jobs (looked up by name, so that jobs can be sent to worker processes)
+PLOTS = {
+    'barplot': barplot,
+    'histogram': histogram,
+    'boxplot': boxplot,
+    'categorical_scatterplot': categorical_scatterplot,
+    'categorical_association_test': categorical_association_test}
+
+@instrumented
+def save_map(_map, path, filename, cache=None, inputs=None, export=None):
     """
-    Function to save a `folium.Map` object in `html` format into the specified (relative) path with the given filename.
+    Function to save a `folium.Map` object in `html` format into the specified (relative) path with the given filename. With a build cache, the map can be given as a function creating it (ie. `lambda: map_accidents(...)`), which is then only called if the `inputs` of the map changed since the last run.
 
     Parameters:
-        _map        : folium.Map
+        _map        : folium.Map (or callable returning one)
         path        : str (Representing relative path to save location)
         filename    : str 
+        cache       : BuildCache (used together with `inputs`)
+        inputs      : tuple (everything the map depends on, ie. data, summary and map parameters)
+        export      : ExportPipeline (hands the rendered map to its writer threads)
     """
-    try:
-        os.makedirs(path)
-    except: None
+    def build():
+        folium_map = _map() if callable(_map) else _map
+        if export is not None: return export.map(folium_map, path, filename)
+
+        ensure_directory(path)
+        with stage('save.write_html'):
+            folium_map.save(f'{path}/{filename}.html')
 
-    _map.save(f'{path}/{filename}.html')
\ No newline at end of file
+    cached(cache if inputs is not None else None, f'{path}/{filename}.html', (save_map,) + tuple(inputs or ()), build)
\ No newline at end of file
@@ -0,0 +1,359 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from .cohort import CohortIndex
+from .spatial_index import GridIndex
+from .associations import contingency_table, chi2_test
+from .numerical_summary import get_fivenumsummary
+from .instrument import instrumented, stage
+
+class LRUCache:
+    """
+    Size-bounded cache of encoded query results, evicting the least recently used entries once `max_bytes` or `max_entries` is exceeded. Concurrent requests for the same missing key wait for the first one to compute it instead of computing it again.
+
+    Parameters:
+        max_bytes           : int (upper bound of the total size of the cached results)
+        max_entries         : int (upper bound of the number of cached results)
+    """
+    def __init__(self, max_bytes=64 * 2**20, max_entries=4096):
+        self.max_bytes, self.max_entries = max_bytes, max_entries
+        self.entries, self.nbytes = OrderedDict(), 0
+        self.pending = {} # key: threading.Event of the request computing it
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        Function returning the cached result of `key`, computing it through `compute` (returning bytes) if it is not cached.
+
+        Return:
+            result          : bytes
+            hit             : boolean (True if the result was cached)
+        """
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key], True
+                event = self.pending.get(key)
+                if event is None:
+                    self.pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait() # another request computes the same key
+
+        try:
+            result = compute()
+            self.put(key, result)
+            return result, False
+        finally:
+            with self.lock: self.pending.pop(key).set()
+
+    def put(self, key, result):
+        with self.lock:
+            if key in self.entries: self.nbytes -= len(self.entries.pop(key))
+            if len(result) > self.max_bytes: return # never cached, would evict everything else
+            self.entries[key], self.nbytes = result, self.nbytes + len(result)
+            while self.nbytes > self.max_bytes or len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """
+        Returns the number of entries, bytes, hits, misses and evictions of the cache.
+        """
+        with self.lock:
+            return {'Entries': len(self.entries), 'Bytes': self.nbytes, 'Max_Bytes': self.max_bytes, 'Hits': self.hits, 'Misses': self.misses, 'Evictions': self.evictions}
+
+def to_json(value):
+    """
+    Helper-Function encoding a query result as JSON bytes: numpy scalars and arrays become numbers and lists, NaN becomes null.
+    """
+    def default(obj):
+        if isinstance(obj, np.generic): return obj.item()
+        if isinstance(obj, np.ndarray): return obj.tolist()
+        raise TypeError(f'{type(obj).__name__} is not JSON serializable')
+    def clean(obj):
+        if isinstance(obj, float) and not np.isfinite(obj): return None
+        if isinstance(obj, dict): return {str(k): clean(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)): return [clean(v) for v in obj]
+        if isinstance(obj, np.floating): return clean(float(obj))
+        return obj
+    return json.dumps(clean(value), default=default).encode('utf-8')
+
+class QueryService:
+    """
+    Answers the queries of the local HTTP service (see `serve`) from data loaded once: the three datasets, their SUMMARY (column names, plot types and lookup maps), a `CohortIndex` for filters (so a filter is a few bitmap operations instead of a scan of the table) and a `GridIndex` of the accidents for map layers. Results are encoded as JSON and kept in an `LRUCache` keyed by the normalised query, so repeated dashboard queries are answered without computing anything.
+
+    Filters map a column to one code or a list of codes. Filters on accident columns also apply to casualties and vehicles (and the other way round) through the accident linkage, ie. the vehicles of fatal accidents: `{'Accident_Severity': 1}` on 'vehicles'.
+
+    Parameters:
+        tables              : dict (holding the datasets at keys 'accidents', 'casualties', 'vehicles')
+        summaries           : dict (SUMMARY of each dataset, ie. from `initial_summaries`)
+        registry            : LookupRegistry (labels of the codes, None to return codes only)
+        cell_size           : float (edge length of the map grid in metres, see `GridIndex`)
+        focus               : str (accident column counted per map cell)
+        max_bytes           : int (size of the result cache, see `LRUCache`)
+    """
+    @instrumented
+    def __init__(self, tables, summaries, registry=None, cell_size=1000, focus='Accident_Severity', max_bytes=64 * 2**20):
+        self.tables, self.summaries, self.registry, self.focus = tables, summaries, registry, focus
+        self.index = CohortIndex(tables)
+        self.grid = GridIndex(tables['accidents'], cell_size=cell_size, focus=focus)
+        self.cache = LRUCache(max_bytes=max_bytes)
+        self.columns = {dataset: {summary[column]['Name'] for column in summary} & set(tables[dataset]) for dataset, summary in summaries.items()}
+
+        # grid cell of every accident (position in `grid.cells`, -1 if not located), for aggregating map layers of any selection
+        self.cell_of = np.full(tables['accidents'].shape[0], -1, dtype=np.int64)
+        self.cell_of[self.grid.rows] = np.repeat(np.arange(len(self.grid.cells)), np.diff(self.grid.offsets))
+
+    def _entry(self, dataset, column):
+        # SUMMARY entry of a column (by name)
+        for entry in self.summaries[dataset].values():
+            if entry['Name'] == column: return entry
+        raise KeyError(f'Unknown column {column} of {dataset}.')
+
+    def _dataset_of(self, dataset, column):
+        # dataset holding a column: the dataset itself, or the accidents for linked accident columns
+        if column in self.columns[dataset]: return dataset
+        if column in self.columns['accidents']: return 'accidents'
+        raise KeyError(f'Unknown column {column} of {dataset}.')
+
+    def _values(self, dataset, column):
+        # values of a column aligned to the rows of `dataset` (accident columns are linked, -1 for unmatched rows)
+        source = self._dataset_of(dataset, column)
+        values = np.asarray(self.tables[source][column])
+        if source == dataset: return values
+        positions = self.index.positions[dataset]
+        return np.where(positions >= 0, values[np.where(positions >= 0, positions, 0)], -1)
+
+    def select(self, dataset, filters=None):
+        """
+        Function returning the rows of a dataset meeting all filters, as boolean mask (None without filters).
+
+        Parameters:
+            dataset         : str (internal name of the dataset)
+            filters         : dict (column: code or list of codes, columns of any dataset)
+        Return:
+            mask            : np.array (boolean, one value per row of `dataset`) or None
+        """
+        if not filters: return None
+        by_dataset = {}
+        for column, values in filters.items():
+            sources = [source for source in [dataset, 'accidents'] + list(self.tables) if column in self.columns.get(source, ())]
+            if not sources: raise KeyError(f'Unknown column {column}.')
+            by_dataset.setdefault(sources[0], {})[column] = values
+
+        mask = None
+        for source, conditions in by_dataset.items():
+            selected = self.index.where(source, conditions).mask(dataset)
+            mask = selected if mask is None else mask & selected
+        return mask
+
+    def _labels(self, dataset, column, codes):
+        # labels of codes through the lookup registry (codes without a label are kept as they are)
+        if self.registry is None or self.registry.map(dataset, column) is None: return None
+        mapping = self.registry.map(dataset, column)
+        return [mapping.get(code, code) for code in codes]
+
+    def summary(self, dataset, column, filters=None):
+        """
+        Function to compute the summary of one column of the selected rows: number of rows and missing values (-1), number of uniques, five-number summary (for columns with `Summary` in SUMMARY) and the value counts (for bar plot columns).
+
+        Return:
+            summary         : dict
+        """
+        entry, values = self._entry(self._dataset_of(dataset, column), column), self._values(dataset, column)
+        mask = self.select(dataset, filters)
+        if mask is not None: values = values[mask]
+
+        uniques, counts = np.unique(values, return_counts=True)
+        result = {'Dataset': dataset, 'Name': column, 'Rows': int(len(values)), 'Missing': int(counts[uniques < 0].sum()) if uniques.dtype.kind in 'iuf' else 0, 'No_Uniques': len(uniques), 'Plot': entry['Plot']}
+        if entry['Summary']:
+            fivenum = get_fivenumsummary(values)
+            result['Five_Number_Summary'] = None if fivenum is None else fivenum.tolist()
+        if entry['Plot'] == 'bar' and len(uniques) < 100:
+            result['Uniques'] = dict(zip(uniques.tolist(), counts.tolist()))
+            labels = self._labels(self._dataset_of(dataset, column), column, uniques.tolist())
+            if labels is not None: result['Labels'] = dict(zip(uniques.tolist(), labels))
+        return result
+
+    def value_counts(self, dataset, column, filters=None, normalize=False):
+        """
+        Function to count the values of one column of the selected rows (ie. `Vehicle_Type` of the vehicles in fatal accidents in Leeds).
+
+        Return:
+            counts          : dict (codes, labels, counts and the number of selected rows)
+        """
+        values = self._values(dataset, column)
+        mask = self.select(dataset, filters)
+        if mask is not None: values = values[mask]
+
+        uniques, counts = np.unique(values, return_counts=True)
+        result = {'Dataset': dataset, 'Name': column, 'Rows': int(len(values)), 'Codes': uniques.tolist(), 'Counts': (counts / max(len(values), 1)).tolist() if normalize else counts.tolist()}
+        labels = self._labels(self._dataset_of(dataset, column), column, uniques.tolist())
+        if labels is not None: result['Labels'] = labels
+        return result
+
+    def association(self, dataset, a, b, filters=None, correction=True):
+        """
+        Function to compute Pearson's Chi Squared test and Cramér's V of two categorical columns of the selected rows (see `chi2_test`). Missing values (-1) are left out, as in `association_with`.
+
+        Return:
+            association     : dict (chi2, p, dof, V and the number of rows tested)
+        """
+        mask = self.select(dataset, filters)
+        codes, sizes = [], []
+        for column in [a, b]:
+            values = self._values(dataset, column)
+            if mask is not None: values = values[mask]
+            valid = values >= 0 if values.dtype.kind in 'iuf' else np.ones(len(values), dtype=bool)
+            uniques, inverse = np.unique(values[valid], return_inverse=True)
+            column_codes = np.full(len(values), -1, dtype=np.int64)
+            column_codes[valid] = inverse.ravel()
+            codes.append(column_codes)
+            sizes.append(len(uniques))
+
+        observed = contingency_table(codes[0], codes[1], sizes[0], sizes[1])
+        chiVal, pVal, dof, V = chi2_test(observed, correction=correction)
+        return {'Dataset': dataset, 'A': a, 'B': b, 'Rows': int(observed.sum()), 'chi2': chiVal, 'p': pVal, 'dof': dof, 'V': V}
+
+    def map_layer(self, bbox=None, filters=None, limit=5000):
+        """
+        Function to build a map layer of the selected accidents, aggregated on the grid of the `GridIndex`: per non-empty cell its mean location and the number of accidents per value of `focus`. A region is selected through `filters` (ie. `{'Local_Authority_(District)': 204}`), an area through `bbox`. Filters on casualty or vehicle columns select the accidents having such a casualty or vehicle.
+
+        Parameters:
+            bbox            : tuple (min_easting, min_northing, max_easting, max_northing in OSGR metres)
+            filters         : dict (see `select`)
+            limit           : int (the cells with most accidents are returned, None for all)
+        Return:
+            layer           : dict (cells as lists of [Latitude, Longitude, Accidents, counts per focus value])
+        """
+        data = self.tables['accidents']
+        rows = self.grid.query_bbox(*bbox) if bbox is not None else self.grid.rows
+        mask = self.select('accidents', filters)
+        if mask is not None: rows = rows[mask[rows]]
+
+        cells, inverse = np.unique(self.cell_of[rows], return_inverse=True)
+        inverse = inverse.ravel()
+        accidents = np.bincount(inverse, minlength=len(cells))
+        latitude = np.bincount(inverse, weights=np.asarray(data['Latitude'], dtype=float)[rows], minlength=len(cells)) / np.maximum(accidents, 1)
+        longitude = np.bincount(inverse, weights=np.asarray(data['Longitude'], dtype=float)[rows], minlength=len(cells)) / np.maximum(accidents, 1)
+        categories = len(self.grid.categories)
+        counts = np.bincount(inverse * categories + self.grid.codes[rows], minlength=len(cells) * categories).reshape(len(cells), categories)
+
+        order = np.argsort(-accidents, kind='stable')[:limit]
+        return {
+            'Focus': self.focus,
+            'Categories': self.grid.categories.tolist(),
+            'Accidents': int(len(rows)),
+            'Cells': int(len(cells)),
+            'Columns': ['Latitude', 'Longitude', 'Accidents'] + [f'{self.focus}_{category}' for category in self.grid.categories.tolist()],
+            'Data': np.column_stack([latitude[order], longitude[order], accidents[order], counts[order]]).tolist()}
+
+    def query(self, endpoint, params):
+        """
+        Function to answer a query through the result cache. The cache key is the endpoint with its sorted parameters, so that the same query always hits the same entry.
+
+        Parameters:
+            endpoint        : str (one of `ENDPOINTS`)
+            params          : dict (parameter name: str, as in the query string)
+        Return:
+            result          : bytes (JSON)
+            hit             : boolean
+        """
+        if endpoint not in ENDPOINTS: raise KeyError(f'Unknown endpoint {endpoint}, try one of {sorted(ENDPOINTS)}.')
+        key = endpoint + '?' + '&'.join(f'{name}={params[name]}' for name in sorted(params))
+
+        def compute():
+            with stage(f'service.{endpoint}'):
+                return to_json(ENDPOINTS[endpoint](self, **parse_params(params)))
+        return self.cache.get(key, compute)
+
+def parse_params(params):
+    """
+    Helper-Function translating the parameters of a query string into keyword arguments: 'dataset', 'column', 'a', 'b' are taken as they are, 'bbox' as four numbers, 'limit' as int, 'normalize' as boolean, and every other parameter as filter of a column by one or more codes (ie. `Vehicle_Type=1,2`).
+    """
+    kwargs, filters = {}, {}
+    for name, value in params.items():
+        if name in ['dataset', 'column', 'a', 'b']: kwargs[name] = value
+        elif name == 'bbox': kwargs[name] = tuple(float(v) for v in value.split(','))
+        elif name == 'limit': kwargs[name] = int(value)
+        elif name == 'normalize': kwargs[name] = value.lower() in ['1', 'true', 'yes']
+        else: filters[name] = [int(v) if v.lstrip('-').isdigit() else v for v in value.split(',')]
+    if filters: kwargs['filters'] = filters
+    return kwargs
+
+# endpoints of the service (path: method of `QueryService`)
+ENDPOINTS = {
+    'summary': QueryService.summary,
+    'counts': QueryService.value_counts,
+    'association': QueryService.association,
+    'map': QueryService.map_layer}
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of `serve`: `GET /<endpoint>?<params>` answers a query of the `QueryService` of the server as JSON, `GET /stats` returns the statistics of the result cache.
+    """
+    protocol_version = 'HTTP/1.1' # keep-alive, so dashboards reuse their connections
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint, params = url.path.strip('/'), {name: values[-1] for name, values in parse_qs(url.query).items()}
+        start = time.perf_counter()
+        try:
+            if endpoint == 'stats': body, hit = to_json(self.server.service.cache.stats()), False
+            else: body, hit = self.server.service.query(endpoint, params)
+            status = 200
+        except KeyError as e: body, hit, status = to_json({'Error': str(e).strip("'")}), False, 404
+        except (ValueError, TypeError) as e: body, hit, status = to_json({'Error': f'{type(e).__name__}: {e}'}), False, 400
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Cache', 'hit' if hit else 'miss')
+        self.send_header('X-Seconds', f'{time.perf_counter() - start:.6f}')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose: super().log_message(format, *args)
+
+def make_server(service, host='127.0.0.1', port=8050, verbose=False):
+    """
+    Function to create the HTTP server of a `QueryService` (one thread per connection). Use `serve_forever` to run it, or `serve`.
+
+    Return:
+        server              : ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.service, server.verbose = service, verbose
+    return server
+
+def serve(service, host='127.0.0.1', port=8050, verbose=False):
+    """
+    Function to run the local query service until interrupted, ie. `curl 'localhost:8050/counts?dataset=vehicles&column=Vehicle_Type&Local_Authority_(District)=204'`.
+
+    Parameters:
+        service             : QueryService
+        host                : str
+        port                : int
+        verbose             : boolean (log every request)
+    """
+    server = make_server(service, host, port, verbose)
+    print(f"Serving {sorted(ENDPOINTS)} on http://{host}:{server.server_address[1]}/")
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+    finally: server.server_close()
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+class GridIndex:
+    """
+    Spatial index of accidents on a fixed grid over the British National Grid coordinates (`Location_Easting_OSGR`, `Location_Northing_OSGR`, in metres). Accidents are sorted by grid cell once, so that bounding-box and radius queries only look at the accidents of the cells they overlap instead of scanning the whole dataset. Per non-empty cell, the index holds the number of accidents for every value of the `focus` column (ie. `Accident_Severity`) and the mean latitude/longitude, which feeds a pre-aggregated heat map.
+
+    Parameters:
+        data                : pd.DataFrame (accidents dataset)
+        cell_size           : float (edge length of a grid cell in metres)
+        focus               : str (name of the column that is counted per cell)
+    """
+    def __init__(self, data, cell_size=1000, focus='Accident_Severity'):
+        self.cell_size, self.focus = cell_size, focus
+        self.easting = np.asarray(data['Location_Easting_OSGR'], dtype=float)
+        self.northing = np.asarray(data['Location_Northing_OSGR'], dtype=float)
+        valid = np.isfinite(self.easting) & np.isfinite(self.northing)
+
+        # integer cell coordinates of every located accident, combined into one cell id
+        self.origin = (np.floor(self.easting[valid].min() / cell_size) * cell_size, np.floor(self.northing[valid].min() / cell_size) * cell_size) if valid.any() else (0.0, 0.0)
+        ix = ((self.easting[valid] - self.origin[0]) // cell_size).astype(np.int64)
+        iy = ((self.northing[valid] - self.origin[1]) // cell_size).astype(np.int64)
+        self.shape = (int(ix.max()) + 1 if len(ix) else 0, int(iy.max()) + 1 if len(iy) else 0)
+        cell_ids = ix * max(self.shape[1], 1) + iy
+
+        # rows of the dataset sorted by cell (CSR layout: rows of cell i are rows[offsets[i]:offsets[i+1]])
+        order = np.argsort(cell_ids, kind='stable')
+        self.rows = np.flatnonzero(valid)[order]
+        self.cells, inverse, counts = np.unique(cell_ids, return_inverse=True, return_counts=True)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        inverse = inverse.ravel()
+
+        # counts per cell and value of the focus column
+        self.categories, focus_codes = np.unique(np.asarray(data[focus])[valid], return_inverse=True)
+        self.codes = np.full(len(valid), -1, dtype=np.int64)
+        self.codes[valid] = focus_codes.ravel()
+        self.counts = np.bincount(inverse * len(self.categories) + self.codes[valid], minlength=len(self.cells) * len(self.categories)).reshape(len(self.cells), len(self.categories))
+
+        # mean location of the accidents in each cell (for plotting on a map)
+        self.latitude = np.bincount(inverse, weights=np.asarray(data['Latitude'], dtype=float)[valid], minlength=len(self.cells)) / counts
+        self.longitude = np.bincount(inverse, weights=np.asarray(data['Longitude'], dtype=float)[valid], minlength=len(self.cells)) / counts
+
+    def _cells_in_box(self, min_easting, min_northing, max_easting, max_northing):
+        # positions (in self.cells) of all non-empty cells overlapping the box
+        ix = np.arange(max(0, int((min_easting - self.origin[0]) // self.cell_size)), min(self.shape[0], int((max_easting - self.origin[0]) // self.cell_size) + 1))
+        iy = np.arange(max(0, int((min_northing - self.origin[1]) // self.cell_size)), min(self.shape[1], int((max_northing - self.origin[1]) // self.cell_size) + 1))
+        if len(ix) == 0 or len(iy) == 0: return np.array([], dtype=np.int64)
+
+        candidates = (ix[:, None] * self.shape[1] + iy[None, :]).ravel()
+        positions = np.searchsorted(self.cells, candidates)
+        found = positions < len(self.cells)
+        positions, candidates = positions[found], candidates[found]
+        return positions[self.cells[positions] == candidates]
+
+    def _rows_of_cells(self, positions):
+        # rows of all given cells, gathered from the CSR layout without a loop over the cells
+        starts, lengths = self.offsets[positions], self.offsets[positions + 1] - self.offsets[positions]
+        steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return self.rows[np.repeat(starts, lengths) + steps]
+
+    def query_bbox(self, min_easting, min_northing, max_easting, max_northing):
+        """
+        Returns the row positions (for `data.iloc`) of all accidents inside a bounding box (in OSGR metres).
+        """
+        rows = self._rows_of_cells(self._cells_in_box(min_easting, min_northing, max_easting, max_northing))
+        inside = (self.easting[rows] >= min_easting) & (self.easting[rows] <= max_easting) & (self.northing[rows] >= min_northing) & (self.northing[rows] <= max_northing)
+        return np.sort(rows[inside])
+
+    def query_radius(self, easting, northing, radius):
+        """
+        Returns the row positions (for `data.iloc`) of all accidents within `radius` metres of a point (in OSGR metres).
+        """
+        rows = self.query_bbox(easting - radius, northing - radius, easting + radius, northing + radius)
+        return rows[(self.easting[rows] - easting) ** 2 + (self.northing[rows] - northing) ** 2 <= radius ** 2]
+
+    def count_bbox(self, min_easting, min_northing, max_easting, max_northing):
+        """
+        Returns the number of accidents per value of the focus column inside a bounding box. Cells completely inside the box are taken from the pre-aggregated counts, only the accidents of cells on the border are checked one by one.
+
+        Return:
+            counts          : dict (value of the focus column: number of accidents)
+        """
+        positions = self._cells_in_box(min_easting, min_northing, max_easting, max_northing)
+        ix, iy = self.cells[positions] // max(self.shape[1], 1), self.cells[positions] % max(self.shape[1], 1)
+        cell_min_e, cell_min_n = self.origin[0] + ix * self.cell_size, self.origin[1] + iy * self.cell_size
+        full = (cell_min_e >= min_easting) & (cell_min_e + self.cell_size <= max_easting) & (cell_min_n >= min_northing) & (cell_min_n + self.cell_size <= max_northing)
+
+        counts = self.counts[positions[full]].sum(axis=0)
+        rows = self._rows_of_cells(positions[~full])
+        inside = (self.easting[rows] >= min_easting) & (self.easting[rows] <= max_easting) & (self.northing[rows] >= min_northing) & (self.northing[rows] <= max_northing)
+        return dict(zip(self.categories.tolist(), (counts + self._focus_counts(rows[inside])).tolist()))
+
+    def _focus_counts(self, rows):
+        # counts per value of the focus column for single accidents
+        return np.bincount(self.codes[rows], minlength=len(self.categories))
+
+    def cell_table(self):
+        """
+        Returns all non-empty cells with their centre (OSGR), mean location and counts.
+
+        Return:
+            cells           : pd.DataFrame (one row per non-empty cell)
+        """
+        ix, iy = self.cells // max(self.shape[1], 1), self.cells % max(self.shape[1], 1)
+        table = pd.DataFrame({
+            'Easting': self.origin[0] + (ix + .5) * self.cell_size,
+            'Northing': self.origin[1] + (iy + .5) * self.cell_size,
+            'Latitude': self.latitude,
+            'Longitude': self.longitude,
+            'Accidents': self.counts.sum(axis=1)})
+        for i, category in enumerate(self.categories):
+            table[f'{self.focus}_{category}'] = self.counts[:, i]
+        return table
+
+    def heatmap_points(self, weights=None):
+        """
+        Returns one weighted point per non-empty cell for `folium.plugins.HeatMap`, instead of one point per accident. Weights are the (optionally focus-weighted) accident counts, scaled to [0, 1].
+
+        Parameters:
+            weights         : dict (weight per value of the focus column, ie. {1: 10, 2: 3, 3: 1}; None counts all accidents equally)
+        Return:
+            points          : list ([Latitude, Longitude, weight] per cell)
+        """
+        if weights is None: cell_weights = self.counts.sum(axis=1).astype(float)
+        else: cell_weights = self.counts @ np.array([weights.get(category, 0) for category in self.categories.tolist()], dtype=float)
+        if len(cell_weights) and cell_weights.max() > 0: cell_weights = cell_weights / cell_weights.max()
+        return np.column_stack([self.latitude, self.longitude, cell_weights]).tolist()
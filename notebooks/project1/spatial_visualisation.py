@@ -1,7 +1,12 @@
 import random
 import numpy as np
-import folium                                         
-from folium.plugins import HeatMap, MarkerCluster
+from .lookup import label_array, decode_column
+from .instrument import instrumented
+from .lazy import lazy_import
+
+# folium is imported at its first use
+folium = lazy_import('folium')
+plugins = lazy_import('folium.plugins')
 
 def plot_marker(_map, _location, _popup, _color, _fill=True):
     """
@@ -30,10 +35,49 @@ def random_color():
     hex_number = str(hex(random_number))
     return '#'+ hex_number[2:]
 
-def map_accidents(data, summary, centroid, colors='random', heat_map=True, marker_cluster=True, focus='Accident_Severity'):
+# javascript callback used by `FastMarkerCluster` to draw one circle marker per row of [lat, lon, popup, color]
+MARKER_CALLBACK = """
+var callback = function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {radius: 5, color: row[3], fill: false});
+    marker.bindPopup(row[2]);
+    marker.bindTooltip('Check this Accident');
+    return marker;
+};
+"""
+
+@instrumented
+def build_popups(data, summary, focus):
+    """
+    Function to build the html popup of every accident column by column (instead of row by row). Every column is decoded once through its lookup and then prepended by its (highlighted) column name, before all columns are joined by line breaks.
+
+    Parameters:
+        data            : pd.DataFrame
+        summary         : dict (Central data structure)
+        focus           : str (name of the column that is highlighted in the popup)
+    Return:
+        popups          : np.array (one-dimensional, one html string per row in `data`)
+    """
+    popups = None
+    for x, col_name in enumerate(list(data)):
+        try: mapping = summary[x]['Map']
+        except (KeyError, TypeError): mapping = None
+
+        if col_name == focus: col_name = f"<strong>{col_name}</strong>"
+        labels = f"{col_name}: " + decode_column(data.iloc[:,x], mapping)
+
+        if popups is None: popups = labels
+        else: popups = popups + "<br>" + labels
+
+    if popups is None: popups = np.full(data.shape[0], '', dtype=object)
+    return popups
+
+@instrumented
+def map_accidents(data, summary, centroid, colors='random', heat_map=True, marker_cluster=True, focus='Accident_Severity', fast=False, grid=None, heat_weights=None, hotspots=None):
     """
     Function to generate a `folium.Map` that maps all accidents (color coded for a specified variable `focus`) on a map around the centroid. Depending on the paramters `heat_map` and `marker_cluster`, the map has addional layers that can be hidden and shown through a layer control menu. Through this menu, the appearance of the map can also be adjusted interactively.
 
+    Popups and colors are computed for all accidents at once (see `build_popups`), so that the function also scales to the national dataset. For large inputs, `fast=True` emits all accidents as a single `FastMarkerCluster` layer, which is drawn in the browser from one data array instead of one `folium.CircleMarker` object per accident.
+
     Parameters:
         data            : pd.DataFrame
         summary         : dict (Central data structure)
@@ -41,6 +85,10 @@ def map_accidents(data, summary, centroid, colors='random', heat_map=True, marke
         heat_map        : boolean (Displays Layer 'Heat Map' if True, else not)
         marker_cluster  : boolean (Clusters Accidents automatically if True, else not)
         focus           : str (represent the name of the column in 'data' for which the color code should apply)
+        fast            : boolean (Emits all markers as a single layer if True, else one object per accident)
+        grid            : GridIndex (draws the heat map from its pre-aggregated cells instead of one point per accident)
+        heat_weights    : dict (weight per value of the grid's focus column in the heat map, see `GridIndex.heatmap_points`)
+        hotspots        : dict (hotspots from `find_hotspots`, drawn as layer 'Hotspots' with their hull and centroid; with `marker_cluster=False`, they replace the clustering in the browser)
 
     Return:
         _map            : folium.Map
@@ -54,62 +102,70 @@ def map_accidents(data, summary, centroid, colors='random', heat_map=True, marke
     folium.TileLayer('cartodbpositron').add_to(_map)
     folium.TileLayer('cartodbdark_matter').add_to(_map)
 
+    # accidents without location cannot be placed on the map
+    data = data[data['Latitude'].notna() & data['Longitude'].notna()]
+
     # plotting accidents
-    uniques = np.unique(data[focus])
+    uniques, inverse = np.unique(np.asarray(data[focus]), return_inverse=True)
     no_uniques = len(uniques)
     
     if colors=='random':
         colors = [random_color() for _ in range(no_uniques)]
-    
-    if marker_cluster:
-        marker_cluster = MarkerCluster().add_to(folium.FeatureGroup(name='Clusters').add_to(_map))
-
-        for i in range(data.shape[0]):
-            labels = []
-            for x in range(data.shape[1]):
-                if x == list(data).index(focus):
-                    col_name = f"<strong>{list(data)[x]}</strong>"
-                else: col_name = list(data)[x]
-                try: mapping = summary[x]['Map'][data.iloc[i,x]]
-                except: mapping = data.iloc[i,x]
-                labels.append(": ".join([col_name, str(mapping)]))
-
-            for j in range(no_uniques):
-                if data[focus].iloc[i] == uniques[j]:
-                    plot_marker(
-                        marker_cluster, 
-                        _location=(data['Latitude'].iloc[i], data['Longitude'].iloc[i]), 
-                        _popup = labels,
-                        _color=colors[j], 
-                        _fill=False)
 
+    # one vectorized lookup for the color of every accident
+    marker_colors = np.asarray(colors, dtype=object)[inverse.ravel()]
+    popups = build_popups(data, summary, focus)
+    latitudes, longitudes = np.asarray(data['Latitude'], dtype=float), np.asarray(data['Longitude'], dtype=float)
+
+    layer_name = 'Clusters' if marker_cluster else 'Accidents'
+    if fast:
+        rows = [[lat, lon, popup, color] for lat, lon, popup, color in zip(latitudes.tolist(), longitudes.tolist(), popups, marker_colors)]
+        options = {} if marker_cluster else {'disableClusteringAtZoom': 0} # clustering disabled on every zoom level
+        plugins.FastMarkerCluster(rows, callback=MARKER_CALLBACK, name=layer_name, **options).add_to(_map)
     else:
-        accidents = folium.FeatureGroup(name='Accidents').add_to(_map)
-        for i in range(data.shape[0]):
-            labels = []
-            for x in range(data.shape[1]):
-                if x == list(data).index(focus):
-                    col_name = f"<strong>{list(data)[x]}</strong>"
-                else: col_name = list(data)[x]
-                try: mapping = summary[x]['Map'][data.iloc[i,x]]
-                except: mapping = data.iloc[i,x]
-                labels.append(": ".join([col_name, str(mapping)]))
-
-            for j in range(no_uniques):
-                if data[focus].iloc[i] == uniques[j]:
-                    plot_marker(
-                        accidents, 
-                        _location=(data['Latitude'].iloc[i], data['Longitude'].iloc[i]), 
-                        _popup = labels,
-                        _color=colors[j], 
-                        _fill=False)
+        if marker_cluster: layer = plugins.MarkerCluster().add_to(folium.FeatureGroup(name=layer_name).add_to(_map))
+        else: layer = folium.FeatureGroup(name=layer_name).add_to(_map)
+
+        for i in range(len(popups)):
+            plot_marker(
+                layer, 
+                _location=(latitudes[i], longitudes[i]), 
+                _popup = [popups[i]],
+                _color=marker_colors[i], 
+                _fill=False)
 
     if heat_map:
-        latlons = np.array(data[['Latitude', 'Longitude']])
+        if grid is not None: latlons = grid.heatmap_points(heat_weights)
+        else: latlons = np.array(data[['Latitude', 'Longitude']])
 
         # plot heatmap to map
-        HeatMap(latlons).add_to(folium.FeatureGroup(name='Heat Map').add_to(_map))
+        plugins.HeatMap(latlons).add_to(folium.FeatureGroup(name='Heat Map').add_to(_map))
     
+    if hotspots is not None:
+        plot_hotspots(folium.FeatureGroup(name='Hotspots').add_to(_map), hotspots, focus)
+
     folium.LayerControl().add_to(_map)
 
-    return _map
\ No newline at end of file
+    return _map
+
+def plot_hotspots(_map, hotspots, focus='Accident_Severity', color='crimson', max_hotspots=500):
+    """
+    Function to draw hotspots (see `find_hotspots`) on a map: the hull of every hotspot as polygon (a circle around the centroid for hotspots at one or two locations) and its centroid as marker, with the members, weight and counts per value of `focus` as popup. Only the `max_hotspots` heaviest hotspots are drawn.
+
+    Parameters:
+        _map            : folium.Map (or layer of it)
+        hotspots        : dict (see `find_hotspots`)
+        focus           : str (name of the column counted per hotspot)
+        color           : str (color code)
+        max_hotspots    : int
+    """
+    order = np.argsort(-np.asarray(hotspots['Weight']), kind='stable')[:max_hotspots]
+    categories = np.asarray(hotspots['Categories']).tolist()
+    for i in order.tolist():
+        popup = [f"<strong>Hotspot {i}</strong>", f"Members: {int(hotspots['Members'][i])}", f"Weight: {float(hotspots['Weight'][i]):g}"]
+        popup += [f"{focus} {category}: {int(count)}" for category, count in zip(categories, hotspots['Counts'][i])]
+
+        hull = np.asarray(hotspots['Hull'][i])
+        if len(hull) >= 3: folium.Polygon(locations=hull.tolist(), color=color, weight=2, fill=True, fill_opacity=.2).add_to(_map)
+        else: folium.Circle(location=[float(hotspots['Latitude'][i]), float(hotspots['Longitude'][i])], radius=max(float(hotspots['Radius'][i]), 10.0), color=color, weight=2, fill=True, fill_opacity=.2).add_to(_map)
+        folium.CircleMarker(location=[float(hotspots['Latitude'][i]), float(hotspots['Longitude'][i])], radius=4, color=color, fill=True, tooltip=f'Hotspot {i}', popup="<br>".join(popup)).add_to(_map)
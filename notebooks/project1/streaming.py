@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from .linking import AccidentIndex
+from .loading import CATEGORICAL
+from .numerical_summary import init_column_summaries, update_column_summaries, apply_column_summaries
+
+def read_chunks(path, chunksize=100000, transform=None):
+    """
+    Generator reading a `csv` file in chunks of at most `chunksize` rows, so that only one chunk is held in memory at a time.
+
+    Parameters:
+        path                : str (path to the `csv` file)
+        chunksize           : int (number of rows per chunk)
+        transform           : callable (applied to every chunk, ie. cleaning of `Date` and `Time`)
+    Yield:
+        chunk               : pd.DataFrame
+    """
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype={name: str for name in CATEGORICAL}, low_memory=False):
+        if transform is not None: chunk = transform(chunk)
+        yield chunk
+
+def district_predicate(district):
+    """
+    Returns a predicate selecting the accidents of one local authority (ie. 204 for Leeds), for use in `stream_accidents`.
+    """
+    return lambda chunk: chunk['Local_Authority_(District)'] == district
+
+def stream_accidents(path, chunksize=100000, predicate=None, transform=None):
+    """
+    Generator streaming the accidents dataset chunk by chunk, filtered by a predicate.
+
+    Parameters:
+        path                : str (path to the accidents `csv` file)
+        chunksize           : int (number of rows per chunk)
+        predicate           : callable (maps a chunk to a boolean mask of the accidents to keep, None keeps all)
+        transform           : callable (see `read_chunks`)
+    Yield:
+        chunk               : pd.DataFrame
+    """
+    for chunk in read_chunks(path, chunksize, transform):
+        if predicate is not None: chunk = chunk[np.asarray(predicate(chunk), dtype=bool)]
+        yield chunk
+
+def stream_linked(path, index, link=(), chunksize=100000, transform=None):
+    """
+    Generator streaming a linked dataset (casualties or vehicles) chunk by chunk. Only rows belonging to an accident of `index` are kept, and the accident columns in `link` are attached to every row.
+
+    Parameters:
+        path                : str (path to the `csv` file)
+        index               : AccidentIndex (on the selected accidents, holding the columns in `link`)
+        link                : list (names of accident columns to attach, ie. ['Accident_Severity'])
+        chunksize           : int (number of rows per chunk)
+        transform           : callable (see `read_chunks`)
+    Yield:
+        chunk               : pd.DataFrame
+        linked              : pd.DataFrame (accident columns aligned to the rows of `chunk`)
+    """
+    for chunk in read_chunks(path, chunksize, transform):
+        chunk = chunk[index.contains(chunk['Accident_Index'])]
+        yield chunk, index.link(chunk, list(link))
+
+def stream_numerical_summary(paths, summaries, chunksize=100000, predicate=None, link=('Accident_Severity',), transform=None, on_chunk=None, max_exact=10000, identifiers=('Accident_Index',)):
+    """
+    Function to compute the numerical summary of all three datasets by streaming the `csv` files in chunks, for inputs that do not fit into memory (ie. multi-year national extracts). The accidents are filtered by `predicate`, casualties and vehicles are reduced to the selected accidents and linked to them. Per column only a mergeable `ColumnSummary` is kept and updated chunk by chunk, so that the memory of the summaries depends on the chunk size and `max_exact`, not on the input size. Identifier columns have no `Uniques`/`Counts`; `No_Uniques` of the accidents' identifier is the number of selected accidents, that of the linked identifiers is exact up to `max_exact` distinct values (as in memory) and None beyond. Columns with at most `max_exact` distinct values equal those of `compute_numerical_summary` (with `Counts` in place of `Data`).
+
+    By design, the `Accident_Index` and `link` columns of every selected accident are kept to build the returned `AccidentIndex` that links casualties and vehicles, so this part of the memory is O(selected accidents), ie. a few MB for a district, and is the bound for national extracts without `predicate`.
+
+    Parameters:
+        paths               : dict (path to the `csv` file of each dataset at keys 'accidents', 'casualties', 'vehicles')
+        summaries           : dict (SUMMARY of each dataset, as created by `initialise_summary`, filled in place)
+        chunksize           : int (number of rows per chunk)
+        predicate           : callable (see `stream_accidents`, ie. `district_predicate(204)`)
+        link                : list (accident columns attached to the rows of the linked datasets)
+        transform           : callable or dict (see `read_chunks`, can be given per dataset)
+        on_chunk            : callable (called with (dataset, chunk, linked) for every chunk, ie. to collect severities)
+        max_exact           : int (see `ColumnSummary`, bounds the memory of columns with many distinct values)
+        identifiers         : list (names of identifier columns, see `init_column_summaries`)
+    Return:
+        index               : AccidentIndex (on the selected accidents, holding `Accident_Index` and the columns in `link`)
+        column_summaries    : dict (list of ColumnSummary per dataset, ie. to merge with later deltas)
+    """
+    if not isinstance(transform, dict): transform = {dataset: transform for dataset in paths}
+    link = list(link)
+
+    column_summaries = {dataset: init_column_summaries(summaries[dataset], max_exact=max_exact, identifiers=identifiers) for dataset in paths}
+    selected = []
+    for chunk in stream_accidents(paths['accidents'], chunksize, predicate, transform.get('accidents')):
+        update_column_summaries(column_summaries['accidents'], chunk)
+        selected.append(chunk[['Accident_Index'] + link])
+        if on_chunk is not None: on_chunk('accidents', chunk, chunk[link])
+    apply_column_summaries(summaries['accidents'], column_summaries['accidents'])
+
+    index = AccidentIndex(pd.concat(selected, ignore_index=True))
+    for column in range(len(summaries['accidents'])):
+        if summaries['accidents'][column]['Name'] == 'Accident_Index': summaries['accidents'][column]['No_Uniques'] = len(index)
+    for dataset in paths:
+        if dataset == 'accidents': continue
+
+        for chunk, linked in stream_linked(paths[dataset], index, link, chunksize, transform.get(dataset)):
+            update_column_summaries(column_summaries[dataset], chunk)
+            if on_chunk is not None: on_chunk(dataset, chunk, linked)
+        apply_column_summaries(summaries[dataset], column_summaries[dataset])
+
+    return index, column_summaries
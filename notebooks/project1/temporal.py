@@ -0,0 +1,260 @@
+import numpy as np
+import pandas as pd
+from .instrument import instrumented
+from .lazy import lazy_import
+
+# matplotlib is imported at its first use
+plt = lazy_import('matplotlib.pyplot')
+
+# datetime64 units of the calendar frequencies (buckets are whole units since the epoch)
+UNITS = {'hour': 'h', 'day': 'D', 'week': 'W', 'month': 'M', 'year': 'Y'}
+
+# cyclic positions and their labels (weeks start on Monday)
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+CYCLES = {
+    'hour_of_day': list(range(24)),
+    'day_of_week': WEEKDAYS,
+    'month_of_year': ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'],
+    'hour_of_week': [f'{day} {hour:02d}:00' for day in WEEKDAYS for hour in range(24)]}
+
+def parse_days(dates):
+    """
+    Helper-Function returning the days since 1970-01-01 of a column of `dd/mm/yyyy` strings or dates, `np.iinfo(np.int64).min` (NaT) for missing or malformed dates. Every distinct date is parsed once.
+    """
+    dates = pd.Series(dates)
+    if dates.dtype.kind == 'M':
+        days = dates.to_numpy(dtype='datetime64[D]')
+    elif dates.dtype.kind in 'iu':
+        raise ValueError("'Date' only holds months (ie. after the notebook's cleaning), load the dataset with full dates (`load_table`).")
+    else:
+        codes, uniques = pd.factorize(dates)
+        parsed = pd.to_datetime(pd.Series(uniques, dtype='string'), format='%d/%m/%Y', errors='coerce').to_numpy(dtype='datetime64[D]')
+        days = np.where(codes >= 0, parsed[codes.clip(0)] if len(parsed) else np.datetime64('NaT'), np.datetime64('NaT'))
+    return days.astype('datetime64[D]').astype(np.int64) # NaT becomes the smallest int64
+
+def parse_minutes(times):
+    """
+    Helper-Function returning the minute of the day of a column of `HH:MM` strings, or of hours (integers, as loaded by `load_table`), -1 for missing or malformed times. Every distinct time is parsed once.
+    """
+    times = pd.Series(times)
+    if times.dtype.kind in 'iu':
+        hours = times.to_numpy(dtype=np.int64)
+        return np.where((hours >= 0) & (hours < 24), hours * 60, -1)
+
+    codes, uniques = pd.factorize(times)
+    parts = pd.Series(uniques, dtype='string').str.split(':', n=1, expand=True).reindex(columns=[0, 1])
+    hours, minutes = pd.to_numeric(parts[0], errors='coerce'), pd.to_numeric(parts[1], errors='coerce')
+    parsed = (hours * 60 + minutes).where((hours >= 0) & (hours < 24) & (minutes >= 0) & (minutes < 60)).fillna(-1).to_numpy(dtype=np.int64)
+    return np.where(codes >= 0, parsed[codes.clip(0)] if len(parsed) else -1, -1)
+
+class TimeIndex:
+    """
+    Time axis of a dataset (ie. the accidents), parsed from `Date` and `Time` once into integer days and minutes, so that counts per hour, day, week, month or year (over any number of years) and per cyclic position (ie. hour of week) are each a single `np.bincount` over integer buckets. Severity, any other coded column or cohorts (boolean masks, see `Cohort.mask`) are an extra dimension of the same bincount, so no DataFrame is materialised per time slice.
+
+        time = TimeIndex(DATA['accidents'])
+        time.counts('week', by='Accident_Severity')
+        time.hour_of_week(mask=cohort.mask('accidents'))
+
+    Parameters:
+        data                : pd.DataFrame (with `date` and `time` columns)
+        date                : str (column of `dd/mm/yyyy` strings or `datetime64`)
+        time                : str (column of `HH:MM` strings or hours, None if the dataset has no times)
+    """
+    @instrumented
+    def __init__(self, data, date='Date', time='Time'):
+        self.data = data
+        self.days = parse_days(data[date])
+        self.minutes = parse_minutes(data[time]) if time is not None else np.full(len(self.days), -1, dtype=np.int64)
+        self.has_date = self.days != np.iinfo(np.int64).min
+        self.has_time = self.has_date & (self.minutes >= 0)
+        self.first, self.last = (int(self.days[self.has_date].min()), int(self.days[self.has_date].max())) if self.has_date.any() else (0, -1)
+        self._buckets, self._dimensions = {}, {} # computed at their first use
+
+    @property
+    def timestamps(self):
+        """
+        Returns the date and time of every row as `datetime64[m]` (NaT if the date or the time is missing).
+        """
+        minutes = np.where(self.has_time, self.days * 1440 + self.minutes, np.iinfo(np.int64).min)
+        return minutes.astype('datetime64[m]')
+
+    def _per_day(self, unit):
+        # months or years since the epoch of every day from the first to the last date (converted once per day, not per row)
+        return np.arange(self.first, self.last + 1).astype('datetime64[D]').astype(f'datetime64[{unit}]').astype(np.int64)
+
+    def _per_row(self, unit, days, valid):
+        # months or years of every row through `_per_day`, without any valid row there is no day to look up (all buckets are -1)
+        if not valid.any(): return np.zeros(len(days), dtype=np.int64)
+        return self._per_day(unit)[days - self.first]
+
+    def buckets(self, freq):
+        """
+        Function returning the bucket of every row for a frequency, computed once per frequency. Calendar frequencies ('hour', 'day', 'week', 'month', 'year') are numbered from the first date of the dataset, so the buckets of multi-year data are dense. Cyclic frequencies (see `CYCLES`) are numbered by their position in the cycle.
+
+        Parameters:
+            freq            : str (key of `UNITS` or `CYCLES`)
+        Return:
+            buckets         : np.array (int64, -1 where the date (or the time, for hourly buckets) is missing)
+            labels          : np.array (label of every bucket, `datetime64` for calendar frequencies)
+        """
+        if freq in self._buckets: return self._buckets[freq]
+
+        hourly = freq in ['hour', 'hour_of_day', 'hour_of_week']
+        valid = self.has_time if hourly else self.has_date
+        days, hours = np.where(valid, self.days, self.first), np.where(valid, self.minutes // 60, 0)
+        weekday = (days + 3) % 7 # 1970-01-01 was a Thursday, 0 = Monday
+
+        if freq in UNITS:
+            unit = UNITS[freq]
+            if freq == 'hour': position = days * 24 + hours
+            elif freq == 'week': position = (days + 3) // 7
+            else: position = self._per_row(unit, days, valid)
+            start = int(position[valid].min()) if valid.any() else 0
+            end = int(position[valid].max()) + 1 if valid.any() else 0
+            labels = np.arange(start, end)
+            # weeks since the epoch count from the Monday before it
+            labels = (labels * 7 - 3).astype('datetime64[D]') if freq == 'week' else labels.astype(f'datetime64[{unit}]')
+            position = position - start
+        elif freq in CYCLES:
+            if freq == 'hour_of_day': position = hours
+            elif freq == 'day_of_week': position = weekday
+            elif freq == 'hour_of_week': position = weekday * 24 + hours
+            else: position = self._per_row('M', days, valid) % 12
+            labels = np.asarray(CYCLES[freq], dtype=object)
+        else:
+            raise NameError(f"'{freq}' not defined. Try one of {list(UNITS) + list(CYCLES)}.")
+
+        self._buckets[freq] = (np.where(valid, position, -1).astype(np.int64), labels)
+        return self._buckets[freq]
+
+    def _dimension(self, by):
+        # codes and labels of the extra dimension: a column, an aligned array or cohorts {label: boolean mask}
+        if by is None: return None, None
+        if isinstance(by, dict): return None, list(by)
+        if isinstance(by, str) and by in self._dimensions: return self._dimensions[by]
+        values = np.asarray(self.data[by]) if isinstance(by, str) else np.asarray(by)
+        categories, codes = np.unique(values, return_inverse=True)
+        if isinstance(by, str): self._dimensions[by] = (codes.ravel(), categories)
+        return codes.ravel(), categories
+
+    @instrumented
+    def counts(self, freq, by=None, mask=None, weights=None):
+        """
+        Function to count the rows per time bucket (see `buckets`), optionally split by an extra dimension. Buckets without rows are kept (with count 0), so consecutive buckets are consecutive rows of the result.
+
+        Parameters:
+            freq            : str (see `buckets`)
+            by              : str (column, ie. 'Accident_Severity'), np.array (aligned to the rows) or dict (label: boolean mask of a cohort, masks may overlap)
+            mask            : np.array (boolean, rows to count, ie. `cohort.mask('accidents')`)
+            weights         : np.array (weight of every row, ie. `Number_of_Casualties`, None counts rows)
+        Return:
+            counts          : pd.DataFrame (one row per bucket, one column per value of `by` or 'Accidents')
+        """
+        buckets, labels = self.buckets(freq)
+        selected = buckets >= 0 if mask is None else (buckets >= 0) & np.asarray(mask, dtype=bool)
+        weights = None if weights is None else np.asarray(weights, dtype=float)
+        codes, categories = self._dimension(by)
+
+        def count(rows, codes=None, size=1):
+            w = None if weights is None else weights[rows]
+            flat = buckets[rows] * size + (codes[rows] if codes is not None else 0)
+            return np.bincount(flat, weights=w, minlength=len(labels) * size).reshape(len(labels), size)
+
+        if by is None: table, columns = count(selected), ['Accidents']
+        elif isinstance(by, dict): table, columns = np.column_stack([count(selected & np.asarray(cohort, dtype=bool))[:, 0] for cohort in by.values()]) if by else np.zeros((len(labels), 0)), categories
+        else: table, columns = count(selected, codes, len(categories)), categories
+
+        return pd.DataFrame(table, index=pd.Index(labels, name=freq), columns=pd.Index(columns, name=by if isinstance(by, str) else None))
+
+    def hour_of_week(self, mask=None, weights=None):
+        """
+        Function to count the rows per day of week (rows, Monday first) and hour of the day (columns), ie. as input of `plot_hour_of_week`.
+
+        Return:
+            heatmap         : pd.DataFrame (7 x 24)
+        """
+        counts = self.counts('hour_of_week', mask=mask, weights=weights)['Accidents'].to_numpy()
+        return pd.DataFrame(counts.reshape(7, 24), index=pd.Index(WEEKDAYS, name='day_of_week'), columns=pd.Index(range(24), name='hour_of_day'))
+
+    def exposure(self, cycle):
+        """
+        Function returning how often every position of a cycle occurs between the first and the last date of the dataset (ie. the number of Mondays), so that cyclic counts of incomplete or multi-year periods can be compared.
+
+        Return:
+            occurrences     : np.array (one value per position of the cycle)
+        """
+        days = np.arange(self.first, self.last + 1)
+        weekday = (days + 3) % 7
+        if cycle == 'hour_of_day': return np.full(24, len(days))
+        if cycle == 'day_of_week': return np.bincount(weekday, minlength=7)
+        if cycle == 'hour_of_week': return np.repeat(np.bincount(weekday, minlength=7), 24)
+        if cycle == 'month_of_year':
+            months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+            return np.bincount(np.unique(months) % 12, minlength=12)
+        raise NameError(f"'{cycle}' not defined. Try one of {list(CYCLES)}.")
+
+    def seasonal(self, cycle='month_of_year', by=None, mask=None, weights=None):
+        """
+        Function to compute the seasonal profile of a cycle: the mean count per occurrence of every position (ie. accidents per Monday, or per January over all years), and the seasonal index (the mean relative to the mean over the whole cycle, 1 = average).
+
+        Parameters:
+            cycle           : str (key of `CYCLES`)
+            by, mask, weights : see `counts`
+        Return:
+            profile         : pd.DataFrame (mean per position and value of `by`)
+            index           : pd.DataFrame (seasonal index per position and value of `by`)
+        """
+        counts = self.counts(cycle, by=by, mask=mask, weights=weights)
+        occurrences = self.exposure(cycle)
+        profile = counts.div(np.where(occurrences > 0, occurrences, np.nan), axis=0)
+        mean = counts.sum(axis=0) / max(occurrences.sum(), 1)
+        return profile, profile / mean.where(mean > 0)
+
+    def rolling(self, freq='day', window=7, by=None, mask=None, weights=None, how='mean', center=False):
+        """
+        Function to compute rolling aggregates of the counts per bucket (ie. the 7-day mean of accidents per day) through cumulative sums over the dense buckets, so the cost does not depend on `window`. The first `window - 1` buckets are NaN.
+
+        Parameters:
+            freq            : str (calendar frequency, see `buckets`)
+            window          : int (number of buckets)
+            by, mask, weights : see `counts`
+            how             : str ('sum' or 'mean')
+            center          : boolean (label the window by its middle bucket instead of its last)
+        Return:
+            rolling         : pd.DataFrame (one row per bucket)
+        """
+        if how not in ['sum', 'mean']: raise NameError(f"'{how}' not defined. Try 'sum' or 'mean'.")
+        counts = self.counts(freq, by=by, mask=mask, weights=weights)
+        values = counts.to_numpy(dtype=float)
+        cumulative = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+
+        result = np.full(values.shape, np.nan)
+        if len(values) >= window: result[window - 1:] = cumulative[window:] - cumulative[:-window]
+        if how == 'mean': result /= window
+        if center:
+            shift = (window - 1) // 2
+            result = np.vstack([result[shift:], np.full((shift, values.shape[1]), np.nan)])
+        return pd.DataFrame(result, index=counts.index, columns=counts.columns)
+
+def plot_hour_of_week(heatmap, title='Accidents per Hour of Week', dimensions=(16, 5)):
+    """
+    Function to plot the counts per day of week and hour (see `TimeIndex.hour_of_week`) as a heatmap. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline plotting
+
+    Parameter:
+        heatmap             : pd.DataFrame (7 x 24)
+        title               : str
+        dimensions          : tuple (specify size of plotted figure)
+    Return:
+        fig                 : matplotlib.Figure
+    """
+    fig = plt.figure(figsize=dimensions)
+    ax = fig.add_axes([.1, .15, .8, .7])
+
+    image = ax.imshow(np.asarray(heatmap, dtype=float), aspect='auto', cmap='Reds')
+    ax.set_xticks(range(heatmap.shape[1])); ax.set_xticklabels([f'{hour:02d}' for hour in heatmap.columns])
+    ax.set_yticks(range(heatmap.shape[0])); ax.set_yticklabels(heatmap.index)
+    ax.set_xlabel('Hour of Day')
+    ax.set_title(title, fontweight='bold')
+    fig.colorbar(image, ax=ax, fraction=.04)
+
+    return fig
@@ -1,15 +1,25 @@
+import os
 import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from scipy.stats import chi2_contingency
 import textwrap
-
+from .numerical_summary import get_percentiles_from_counts, get_distribution_by_category
+from .loading import read_column_attributes
+from .lookup import LookupRegistry, COLUMN_SHEETS
+from .instrument import instrumented
+from .lazy import lazy_import
+
+# plotting libraries are imported at their first use
+sns = lazy_import('seaborn')
+plt = lazy_import('matplotlib.pyplot')
+stats = lazy_import('scipy.stats')
+
+@instrumented
 def initialise_summary(data, lookup, dataset_name, key, summary, labels, plotting, fivenum, start_at=0):
     """
     Function to initialise the central data structure SUMMARY for some information about the dataset.
 
     Parameters:
+        lookup               : dict (VARIABLE_LOOKUP, sheet index: lookup) or LookupRegistry (maps columns to sheets by name)
         dataset_name         : str (String identifying the dataset) 
         summary              : dict (Empty dict constants where to store the data (will be stored at key `dataset_name`))
         labels               : dict (dict holding the column indexes of the dataset at key `dataset_name`)
@@ -40,6 +50,11 @@ def initialise_summary(data, lookup, dataset_name, key, summary, labels, plottin
             summary[key][i].update({'Summary': True})
         else: summary[key][i].update({'Summary': False})
 
+    # with a `LookupRegistry`, the maps are attached by column name (`labels` and `start_at` are not needed)
+    if isinstance(lookup, LookupRegistry):
+        lookup.attach_maps(summary[key], dataset_name, derived=False)
+        return
+
     # add the maps to the lookup dictionary
     categorical_counter = 0
     for column in labels:
@@ -60,6 +75,70 @@ def initialise_summary(data, lookup, dataset_name, key, summary, labels, plottin
         summary[key][column]['Map'] = lookup[start_at+categorical_counter]
         categorical_counter += 1
 
+def initial_summaries(tables, attributes_path, registry=None):
+    """
+    Function to initialise the SUMMARY of every dataset from the column attribute specs (see `initialise_summary`), with the maps of the lookup registry or, without registry, the codes themselves as labels.
+
+    Parameters:
+        tables              : dict (datasets at keys 'accidents', 'casualties', 'vehicles')
+        attributes_path     : str (directory of the `<dataset>_column_attributes.csv` files)
+        registry            : LookupRegistry
+    Return:
+        summaries           : dict (SUMMARY of each dataset)
+    """
+    summaries = {}
+    for dataset_name, data in tables.items():
+        attributes = read_column_attributes(os.path.join(attributes_path, f'{dataset_name}_column_attributes.csv'))
+        plotting, fivenum = [a['Plot'] for a in attributes], [i for i, a in enumerate(attributes) if a['Summary']]
+        lookup = registry if registry is not None else {}
+        initialise_summary(data, lookup, dataset_name, dataset_name, summaries, [], plotting, fivenum)
+        if registry is None:
+            for column in summaries[dataset_name].values():
+                if column['Name'].rstrip('?') in COLUMN_SHEETS[dataset_name]:
+                    column['Map'] = {code: str(code) for code in np.unique(data[column['Name']])}
+    return summaries
+
+def copy_summary(summary):
+    """
+    Helper-Function to copy a SUMMARY before it is filled (one level deep), so that the initialised SUMMARY can be filled again, ie. per district or per repetition.
+    """
+    return {column: dict(entry) for column, entry in summary.items()}
+
+def get_data_or_counts(summary):
+    """
+    Helper-Function returning the data of a column from the SUMMARY data structure. Summaries computed by streaming (see `project1.streaming`) hold the counts of each value (`Counts`) instead of the data itself, in which case the uniques are returned together with their counts as weights.
+
+    Parameter:
+        summary             : dict (SUMMARY of specific column)
+    Return:
+        data                : np.array (one-dimensional, data or uniques)
+        weights             : np.array (one-dimensional, counts of the uniques, None if `data` is the data itself)
+    """
+    if 'Data' in summary:
+        return np.asarray(summary['Data']), None
+    return np.array(list(summary['Counts'].keys())), np.array(list(summary['Counts'].values()))
+
+def get_boxplot_stats_from_counts(uniques, counts, whis=1.5):
+    """
+    Helper-Function to compute the statistics `ax.bxp` draws from the uniques of a column and their counts, the same way `ax.boxplot` computes them from the data (quartiles, whiskers at `whis` times the interquartile range, outliers beyond).
+
+    Parameter:
+        uniques             : np.array (one-dimensional, sorted)
+        counts              : np.array (one-dimensional)
+        whis                : float (whisker reach as multiple of the interquartile range)
+    Return:
+        stats               : dict (statistics for `ax.bxp`)
+    """
+    q1, med, q3 = get_percentiles_from_counts(uniques, counts, [25, 50, 75])
+    low, high = q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+    inside = (uniques >= low) & (uniques <= high)
+
+    return {'med': med, 'q1': q1, 'q3': q3, 
+            'whislo': uniques[inside].min() if inside.any() else q1, 
+            'whishi': uniques[inside].max() if inside.any() else q3, 
+            'fliers': uniques[~inside]}
+
+@instrumented
 def barplot(summary, dimensions=(32,18), keep_missing_values=True):
     """
     Function to create barplot based on the SUMMARY data structure. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline plotting
@@ -124,6 +203,7 @@ def barplot(summary, dimensions=(32,18), keep_missing_values=True):
 
     return fig
 
+@instrumented
 def histogram(summary, dimensions=(32,18), keep_missing_values=True):
     """
     Function to create histogram based on the SUMMARY data structure. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline plotting
@@ -141,25 +221,29 @@ def histogram(summary, dimensions=(32,18), keep_missing_values=True):
     fig = plt.figure(figsize=dimensions)
     ax = fig.add_axes([.1,.1,.8,.8])
 
+    # summaries computed by streaming only hold the counts of each value instead of the data
+    data, weights = get_data_or_counts(summary)
+
     # defining variables depending on missing_values variable
     if keep_missing_values:
         title = f"Distribution: {summary['Name'].replace('_', ' ')} (with missing values)"
-        data = summary['Data']
         color = 'darkred'
 
     else: 
         title = f"Distribution: {summary['Name'].replace('_', ' ')} (without missing values)"
-        data = summary['Data'][(summary['Data'] != -1)] # masking out -1
+        if weights is not None: weights = weights[(data != -1)]
+        data = data[(data != -1)] # masking out -1
         color = 'darkblue'
 
     # plot
-    ax.hist(data, bins=50, color=color)
+    ax.hist(data, bins=50, weights=weights, color=color)
     ax.set_title(title, fontweight='bold')
     ax.set_ylabel('Number of Accidents')
     ax.set_xlabel('Age')
 
     return fig
 
+@instrumented
 def boxplot(summary, dimensions=(16,9)):
     """
     Function to create a boxplot for numerical values based on the SUMMARY data structure. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline plotting
@@ -178,24 +262,35 @@ def boxplot(summary, dimensions=(16,9)):
     ax = fig.add_axes([.1,.1,.8,.8])
 
     # plot
-    ax.boxplot(summary['Data']);
+    data, weights = get_data_or_counts(summary)
+    if weights is None: ax.boxplot(data);
+    else: ax.bxp([get_boxplot_stats_from_counts(data, weights)]);
     ax.set_title(f"Boxplot of {summary['Name'].replace('_', ' ')}", fontweight='bold')
 
     return fig
 
-def categorical_scatterplot(summary_categorical, data_categorical, summary_numerical, data_numerical, _kind='svarm', _exclude=100):
+@instrumented
+def categorical_scatterplot(summary_categorical, data_categorical, summary_numerical, data_numerical, _kind='svarm', _exclude=100, _max_points=2000):
     """
     Function to create a categorical scatterplot (finding an association between a numerical and cateogrical variable) using `sns.catplot`. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline plotting
 
+    The swarm layout of `sns.catplot` takes more than linear time in the number of points. For large inputs, `_kind='aggregate'` draws the plot from per-category aggregates instead (see `aggregated_categorical_scatterplot`), `_kind='auto'` chooses it for more than `_max_points` records.
+
     Parameter:
         data                                  : pd.DataFrame (central data structure to hold information about all columns in dataset)
         summary_categorical_variable          : dict (SUMMARY of specific column)
         summary_numerical_variable            : dict (SUMMARY of specific column)
-        _kind                                 : str (either 'svarm' or 'violin')
+        _kind                                 : str (either 'svarm', 'violin', 'aggregate' or 'auto')
         _exclude                              : int (excludes plotting of attributes from the categorical variable that occur less than the specified value)
+        _max_points                           : int (largest number of records plotted as 'svarm' with `_kind='auto'`)
     Return: 
         fig                                   : matplotlib.Figure 
     """
+    if _kind == 'auto':
+        _kind = 'svarm' if np.count_nonzero((np.asarray(data_categorical) > -1) & (np.asarray(data_numerical) > -1)) <= _max_points else 'aggregate'
+    if _kind == 'aggregate':
+        return aggregated_categorical_scatterplot(summary_categorical, data_categorical, summary_numerical, data_numerical, _exclude=_exclude)
+
     name_categorical, name_numerical = summary_categorical['Name'], summary_numerical['Name']
     data_categorical, data_numerical = data_categorical, data_numerical
     
@@ -223,10 +318,60 @@ def categorical_scatterplot(summary_categorical, data_categorical, summary_numer
             fig.set_xticklabels([summary_categorical['Map'][i] for i in [j for j in uniques if j not in under_100]]);
         except: None
         fig.fig.suptitle(f'Categorical Scatterplot for {name_categorical.replace("_", " ")} and {name_numerical.replace("_", " ")}', fontweight='bold')
-    else: raise NameError(f"type = '{_kind}'' is not defined. Try 'svarm' or 'violin'")
+    else: raise NameError(f"type = '{_kind}'' is not defined. Try 'svarm', 'violin', 'aggregate' or 'auto'")
 
     return fig;
 
+@instrumented
+def aggregated_categorical_scatterplot(summary_categorical, data_categorical, summary_numerical, data_numerical, _exclude=100, _sample=300, _bins=40, dimensions=(8.27*16/9, 8.27)):
+    """
+    Function to create a categorical scatterplot from aggregates, so that render time and memory do not grow with the number of records. The distribution of the numerical variable per category is computed first (see `get_distribution_by_category`) and drawn as a violin outline (histogram), a box of the quartiles with whiskers at the 5th and 95th percentile, the median and a stratified sample of at most `_sample` points, spread within the violin like a swarm.
+
+    Parameter:
+        summary_categorical                   : dict (SUMMARY of specific column)
+        data_categorical                      : np.array
+        summary_numerical                     : dict (SUMMARY of specific column)
+        data_numerical                        : np.array
+        _exclude                              : int (see `categorical_scatterplot`)
+        _sample                               : int (number of sampled points per category)
+        _bins                                 : int (number of bins of the violin outlines)
+        dimensions                            : tuple (specify size of plotted figure)
+    Return: 
+        fig                                   : matplotlib.Figure 
+    """
+    name_categorical, name_numerical = summary_categorical['Name'], summary_numerical['Name']
+    distribution = get_distribution_by_category(data_categorical, data_numerical, q=(5, 25, 50, 75, 95), bins=_bins, sample=_sample, exclude=_exclude)
+
+    fig = plt.figure(figsize=dimensions)
+    ax = fig.add_axes([.1,.1,.8,.8]) # [left, bottom, width, height]
+    edges, density = distribution['Edges'], distribution['Density']
+    centers = (edges[:-1] + edges[1:]) / 2
+    colors = sns.color_palette(n_colors=max(len(distribution['Categories']), 1))
+    rng = np.random.default_rng(0)
+
+    for x, (counts, percentiles, sample) in enumerate(zip(density, distribution['Percentiles'], distribution['Sample'])):
+        width = .4 * counts / counts.max() if counts.max() > 0 else np.zeros(len(counts))
+        ax.fill_betweenx(centers, x - width, x + width, color=colors[x], alpha=.3, linewidth=0)
+
+        # sampled points are spread within the width of the violin at their value
+        spread = np.interp(sample, centers, width) * .9
+        ax.scatter(x + rng.uniform(-1, 1, len(sample)) * spread, sample, s=6, color=colors[x], alpha=.6, linewidths=0)
+
+        p5, p25, p50, p75, p95 = percentiles
+        ax.vlines(x, p5, p95, color='black', linewidth=1)
+        ax.vlines(x, p25, p75, color='black', linewidth=6)
+        ax.scatter([x], [p50], s=30, color='white', zorder=3)
+
+    ax.set_xticks(range(len(distribution['Categories'])))
+    try: ax.set_xticklabels([summary_categorical['Map'][i] for i in distribution['Categories'].tolist()])
+    except (TypeError, KeyError): ax.set_xticklabels(distribution['Categories'].tolist()) # no map (-1) or codes missing from it
+    ax.set_xlabel(name_categorical)
+    ax.set_ylabel(name_numerical)
+    ax.set_title(f'Categorical Scatterplot for {name_categorical.replace("_", " ")} and {name_numerical.replace("_", " ")} (n={int(distribution["Counts"].sum())}, {_sample} sampled per category)', fontweight='bold')
+
+    return fig
+
+@instrumented
 def categorical_association_test(data, marker_variable_summary, marker_data, relational_variable_summary, relational_data):
     """
     Function to create an informative figure for evaluating the association of two categorical variables. Associativity Measure is based on Pearson Chi Squared Association Test using `sns.catplot`. Displays inline in Jupyter when called without additional parameters. Use %%capture to prevent inline plotting
@@ -254,7 +399,7 @@ def categorical_association_test(data, marker_variable_summary, marker_data, rel
     observed_pd = pd.crosstab(data_to_plot[:,0], data_to_plot[:,1], rownames = [name1], colnames = [name2]).T
     observed = observed_pd.to_numpy()
 
-    chiVal, pVal, df, expected = chi2_contingency(observed)
+    chiVal, pVal, df, expected = stats.chi2_contingency(observed)
     chiVal, pVal, df, expected.astype(int)
     V = np.sqrt( (chiVal / observed.sum() ) / (min(observed.shape)-1) )
 
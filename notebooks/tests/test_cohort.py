@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from project1.cohort import CohortIndex
+
+@pytest.fixture
+def tables():
+    # row counts are no multiples of 8, so the last byte of every bitmap holds padding bits
+    rng = np.random.default_rng(0)
+    accidents = pd.DataFrame({
+        'Accident_Index': [f'A{i}' for i in range(101)],
+        'Local_Authority_(District)': rng.choice([204, 205, 206], 101),
+        'Road_Surface_Conditions': rng.integers(1, 5, 101)})
+    vehicles = pd.DataFrame({
+        'Accident_Index': rng.choice(accidents['Accident_Index'], 203),
+        'Vehicle_Reference': rng.integers(1, 4, 203),
+        'Vehicle_Type': rng.choice([1, 9, 11], 203)})
+    vehicles = vehicles.drop_duplicates(['Accident_Index', 'Vehicle_Reference']).reset_index(drop=True)
+    casualties = pd.DataFrame({
+        'Accident_Index': np.append(rng.choice(accidents['Accident_Index'], 150), 'unknown'),
+        'Vehicle_Reference': rng.integers(1, 5, 151)}) # reference 4 has no vehicle
+    return {'accidents': accidents, 'casualties': casualties, 'vehicles': vehicles}
+
+def test_where_equals_isin(tables):
+    index = CohortIndex(tables)
+    cohort = index.where('accidents', {'Road_Surface_Conditions': [2, 3]}, **{'Local_Authority_(District)': 204})
+    accidents = tables['accidents']
+    expected = accidents['Road_Surface_Conditions'].isin([2, 3]) & (accidents['Local_Authority_(District)'] == 204)
+    assert (cohort.mask() == expected.to_numpy()).all() and len(cohort) == expected.sum()
+    assert len(index.where('accidents', Road_Surface_Conditions=99)) == 0
+
+def test_invert_keeps_padding_bits_unset(tables):
+    index = CohortIndex(tables)
+    cohort = index.where('accidents', Road_Surface_Conditions=1)
+    assert len(~cohort) == 101 - len(cohort) and len(index.all('accidents')) == 101
+    assert ((~cohort).mask() == ~cohort.mask()).all()
+    assert len(~index.all('accidents')) == 0
+
+def test_combining_datasets_lifts_to_accidents(tables):
+    index = CohortIndex(tables)
+    bikes = index.where('vehicles', Vehicle_Type=1)
+    leeds = index.where('accidents', {'Local_Authority_(District)': 204})
+    accidents, vehicles, casualties = tables['accidents'], tables['vehicles'], tables['casualties']
+
+    with_bike = accidents['Accident_Index'].isin(vehicles.loc[vehicles['Vehicle_Type'] == 1, 'Accident_Index'])
+    expected = with_bike & (accidents['Local_Authority_(District)'] == 204)
+    cohort = bikes & leeds
+    assert cohort.dataset == 'accidents' and (cohort.mask() == expected.to_numpy()).all()
+    assert (cohort.mask('casualties') == casualties['Accident_Index'].isin(accidents.loc[expected, 'Accident_Index']).to_numpy()).all()
+
+    subsets = (bikes & leeds).tables()
+    assert subsets['vehicles'].equals(vehicles[vehicles['Accident_Index'].isin(accidents.loc[expected, 'Accident_Index'])])
+    assert bikes.tables(keep_rows=True)['vehicles'].equals(vehicles[vehicles['Vehicle_Type'] == 1])
+
+def test_casualties_of_vehicles(tables):
+    index = CohortIndex(tables)
+    vehicles, casualties = tables['vehicles'], tables['casualties']
+    bikes = vehicles.loc[vehicles['Vehicle_Type'] == 1, ['Accident_Index', 'Vehicle_Reference']]
+    expected = casualties.merge(bikes.assign(Bike=True), on=['Accident_Index', 'Vehicle_Reference'], how='left')['Bike'].eq(True)
+    cohort = index.where('vehicles', Vehicle_Type=1).casualties()
+    assert cohort.dataset == 'casualties' and (cohort.mask() == expected.to_numpy()).all()
+    assert len(cohort) == expected.sum() > 0
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+from project1.exposure import count_point_flows, vehicle_km, accident_counts, accident_rates, poisson_interval
+
+@pytest.fixture
+def raw_counts():
+    # point 1 is counted on two days (30 and 50 cars), point 2 on one day without link length
+    return pd.DataFrame({
+        'count_point_id': [1, 1, 1, 2],
+        'year': [2019] * 4,
+        'count_date': ['2019-05-01', '2019-05-01', '2019-06-01', '2019-05-01'],
+        'hour': [7, 7, 8, 7],
+        'direction_of_travel': ['N', 'S', 'N', 'E'],
+        'local_authority_id': [63, 63, 63, 63],
+        'link_length_km': [2.0, 2.0, 2.0, np.nan],
+        'cars_and_taxis': [10, 20, 50, 100],
+        'pedal_cycles': [1, 0, 3, 0]})
+
+@pytest.fixture
+def tables():
+    accidents = pd.DataFrame({
+        'Accident_Index': ['A1', 'A2', 'A3', 'A4'],
+        'Date': pd.to_datetime(['2019-01-05', '2019-03-01', '2020-02-02', '2019-07-07']),
+        'Local_Authority_(District)': [204, 204, 204, 999]})
+    vehicles = pd.DataFrame({
+        'Accident_Index': ['A1', 'A1', 'A1', 'A2', 'A3', 'A4'],
+        'Vehicle_Type': [9, 9, 1, 11, 9, 9]})
+    return {'accidents': accidents, 'vehicles': vehicles}
+
+def test_count_point_flows_averages_count_dates(raw_counts):
+    points = count_point_flows(raw_counts, expansion=2).set_index('count_point_id')
+    assert points.loc[1, 'cars_and_taxis'] == 80 and points.loc[1, 'pedal_cycles'] == 4
+    assert points.loc[2, 'cars_and_taxis'] == 200 and points.loc[1, 'link_length_km'] == 2.0
+
+def test_count_point_flows_sums_directions_of_aadf(raw_counts):
+    aadf = raw_counts.drop(columns=['hour', 'count_date'])
+    assert count_point_flows(aadf).set_index('count_point_id').loc[1, 'cars_and_taxis'] == 80
+
+def test_vehicle_km(raw_counts):
+    assert vehicle_km(raw_counts).loc[2019, 'cars_and_taxis'] == 40 * 2.0 * 365
+    km = vehicle_km(raw_counts, by=['year', 'local_authority_id'], missing_length=1.0)
+    assert km.loc[(2019, 63), 'cars_and_taxis'] == 40 * 2.0 * 365 + 100 * 1.0 * 365
+
+def test_accident_counts_per_accident(tables):
+    counts = accident_counts(tables, area='Local_Authority_(District)', areas={204: 63})
+    assert counts.index.names == ['year', 'Local_Authority_(District)']
+    assert counts.loc[(2019, 63), ['cars_and_taxis', 'pedal_cycles', 'buses_and_coaches', 'all_motor_vehicles', 'all']].tolist() == [1, 1, 1, 2, 2]
+    assert counts.loc[(2020, 63), ['cars_and_taxis', 'all']].tolist() == [1, 1]
+    assert accident_counts(tables).loc[2019, ['cars_and_taxis', 'all']].tolist() == [2, 3]
+
+def test_accident_counts_per_vehicle(tables):
+    counts = accident_counts(tables, area='Local_Authority_(District)', areas={204: 63}, unit='vehicles')
+    assert counts.loc[(2019, 63), ['cars_and_taxis', 'pedal_cycles', 'all_motor_vehicles', 'all']].tolist() == [2, 1, 3, 2]
+
+def test_accident_counts_needs_dates_or_year(tables):
+    tables['accidents']['Date'] = tables['accidents']['Date'].dt.month
+    with pytest.raises(ValueError):
+        accident_counts(tables)
+    assert accident_counts(tables, year=2019).loc[2019, 'all'] == 4
+
+def test_poisson_interval():
+    lower, upper = poisson_interval([0, 1, 10])
+    assert lower[0] == 0 and upper[0] == pytest.approx(-np.log(.025))
+    assert lower[1] == pytest.approx(-np.log(.975)) and upper[1] == pytest.approx(5.5716, abs=1e-4)
+    assert (lower[2] < 10) and (upper[2] > 10)
+
+def test_accident_rates(tables, raw_counts):
+    rates = accident_rates(accident_counts(tables), vehicle_km(raw_counts), per=1e4).set_index(['year', 'vehicle_class'])
+    assert sorted(rates.index.tolist()) == [(2019, 'cars_and_taxis'), (2019, 'pedal_cycles')] # 2020 has no flows
+    cars = rates.loc[(2019, 'cars_and_taxis')]
+    assert cars['Accidents'] == 2 and cars['Vehicle_km'] == 29200
+    assert cars['Rate'] == pytest.approx(2 / 2.92)
+    lower, upper = poisson_interval([2])
+    assert cars['Lower'] == pytest.approx(lower[0] / 2.92) and cars['Upper'] == pytest.approx(upper[0] / 2.92)
+
+def test_vehicle_km_of_synthetic_road_flow(tmp_path):
+    from project1.benchmark import synthetic_road_flow
+    from project1.exposure import read_flows
+    path = tmp_path / 'flows.csv'
+    synthetic_road_flow(30, years=[2018, 2019]).to_csv(path, index=False)
+    flows = read_flows(path)
+    assert isinstance(flows['road_type'].dtype, pd.CategoricalDtype)
+
+    km = vehicle_km(flows, by=['year', 'local_authority_id'])
+    expected = {}
+    for (point, year), rows in flows.groupby(['count_point_id', 'year'], observed=True):
+        length = rows['link_length_km'].iloc[0]
+        if np.isnan(length): continue
+        daily = rows.groupby('count_date', observed=True)['cars_and_taxis'].sum().mean()
+        key = (year, rows['local_authority_id'].iloc[0])
+        expected[key] = expected.get(key, 0) + daily * length * 365
+    assert km['cars_and_taxis'].to_dict() == pytest.approx(expected)
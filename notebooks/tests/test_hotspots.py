@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from project1.hotspots import find_hotspots, find_hotspots_by_region
+
+def accidents(n=300, seed=0):
+    # three dense clusters, scattered accidents and repeated locations (junctions), in metres of the national grid
+    rng = np.random.default_rng(seed)
+    centres = np.array([[430000, 433000], [431000, 433500], [429000, 434500]])
+    xy = np.vstack([centres[rng.integers(0, 3, n // 2)] + rng.normal(0, 60, (n // 2, 2)), rng.uniform([428000, 432000], [432000, 436000], (n - n // 2, 2))]).round()
+    xy[::25] = xy[1] # a junction with many accidents
+    return pd.DataFrame({
+        'Location_Easting_OSGR': xy[:, 0], 'Location_Northing_OSGR': xy[:, 1],
+        'Latitude': 53.8 + (xy[:, 1] - 433000) / 111000, 'Longitude': -1.55 + (xy[:, 0] - 430000) / 66000,
+        'Accident_Severity': rng.choice([1, 2, 3], n, p=[.05, .15, .8]),
+        'Local_Authority_(District)': np.where(xy[:, 0] < 430500, 204, 205)})
+
+def brute_force_dbscan(xy, row_weights, radius, min_weight):
+    # core points, their clusters (connected through core neighbours) and the core neighbours of all other points
+    distance = np.hypot(*(xy[:, None, :] - xy[None, :, :]).transpose(2, 0, 1))
+    neighbours = distance <= radius
+    core = neighbours.astype(float) @ row_weights >= min_weight
+    cluster = np.full(len(xy), -1)
+    for start in np.flatnonzero(core):
+        if cluster[start] >= 0: continue
+        cluster[start], stack = start, [start]
+        while stack:
+            point = stack.pop()
+            for other in np.flatnonzero(neighbours[point] & core & (cluster < 0)):
+                cluster[other] = start
+                stack.append(other)
+    return core, cluster, neighbours & core[None, :]
+
+@pytest.mark.parametrize('weights', [None, {1: 10, 2: 3, 3: 1}])
+def test_find_hotspots_equals_brute_force_dbscan(weights):
+    data = accidents()
+    xy = data[['Location_Easting_OSGR', 'Location_Northing_OSGR']].to_numpy()
+    row_weights = np.ones(len(data)) if weights is None else data['Accident_Severity'].map(weights).to_numpy(dtype=float)
+    labels, hotspots = find_hotspots(data, radius=100, min_weight=8, weights=weights)
+    core, cluster, core_neighbours = brute_force_dbscan(xy, row_weights, 100, 8)
+
+    # core points: the same partition
+    pairs = set(zip(cluster[core].tolist(), labels[core].tolist()))
+    assert len(pairs) == len(set(cluster[core].tolist())) == len(set(labels[core].tolist())) > 1
+    # border points: labelled with the hotspot of one of their core neighbours; noise: no core neighbour
+    border = ~core & core_neighbours.any(axis=1)
+    for row in np.flatnonzero(border):
+        assert labels[row] in set(labels[np.flatnonzero(core_neighbours[row])].tolist())
+    assert (labels[~core & ~border] == -1).all()
+
+    # hotspots are numbered by decreasing weight, with consistent members
+    assert (np.diff(hotspots['Weight']) <= 0).all()
+    assert hotspots['Members'].tolist() == np.bincount(labels[labels >= 0]).tolist()
+    assert hotspots['Weight'] == pytest.approx(np.bincount(labels[labels >= 0], weights=row_weights[labels >= 0]))
+
+def test_find_hotspots_without_location_or_hotspots():
+    data = accidents(60)
+    data.loc[:9, 'Location_Easting_OSGR'] = np.nan
+    labels, hotspots = find_hotspots(data, radius=100, min_weight=1e9)
+    assert (labels == -1).all() and len(hotspots['Members']) == 0
+    labels, _ = find_hotspots(data, radius=100, min_weight=1)
+    assert (labels[:10] == -1).all() and (labels[10:] >= 0).all()
+
+def test_find_hotspots_by_region_stays_in_region():
+    data = accidents()
+    labels, hotspots = find_hotspots_by_region(data, radius=100, min_weight=8)
+    regions = data['Local_Authority_(District)'].to_numpy()
+    for hotspot in np.unique(labels[labels >= 0]):
+        assert len(set(regions[labels == hotspot].tolist())) == 1
+    for region in [204, 205]:
+        rows = regions == region
+        region_labels, _ = find_hotspots(data[rows], radius=100, min_weight=8)
+        assert ((labels[rows] >= 0) == (region_labels >= 0)).all()
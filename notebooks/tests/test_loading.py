@@ -0,0 +1,21 @@
+import pytest
+import pandas as pd
+from project1.loading import read_table
+
+def write(tmp_path, dates, times):
+    path = tmp_path / 'accidents.csv'
+    pd.DataFrame({'Accident_Index': ['a', 'b'], 'Date': dates, 'Time': times}).to_csv(path, index=False)
+    return str(path)
+
+def test_read_table_parses_date_strings(tmp_path):
+    data = read_table(write(tmp_path, ['27/09/2019', None], ['14:05', None]))
+    assert data['Date'].dt.month.tolist()[0] == 9 and data['Date'].isna().tolist() == [False, True]
+    assert data['Time'].tolist() == [14, -1]
+
+def test_read_table_keeps_processed_months_and_hours(tmp_path):
+    data = read_table(write(tmp_path, [9, 8], [14, 18]))
+    assert data['Date'].tolist() == [9, 8] and data['Time'].tolist() == [14, 18]
+
+def test_read_table_raises_if_no_date_parses(tmp_path):
+    with pytest.raises(ValueError):
+        read_table(write(tmp_path, ['2019-09-27', '2019-08-15'], ['14:05', '18:00']))
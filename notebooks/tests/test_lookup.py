@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from project1 import lookup
+from project1.lookup import decode_column
+
+def test_decode_column_integer_codes():
+    assert decode_column(pd.Series([1, 2, 3]), {1: 'A', 2: 'B'}).tolist() == ['A', 'B', '3']
+
+def test_decode_column_float_codes():
+    decoded = decode_column(pd.Series([1.0, 2.0, np.nan, 2.5, -1.0]), {1: 'A', 2: 'B'})
+    assert decoded.tolist() == ['A', 'B', 'nan', '2.5', '-1.0']
+
+def test_decode_column_string_codes():
+    assert decode_column(np.array(['1', 'x'], dtype=object), {1: 'A'}).tolist() == ['A', 'x']
+
+def test_label_array_follows_changed_mapping():
+    mapping = {1: 'A', 2: 'B'}
+    assert decode_column(pd.Series([1, 2]), mapping).tolist() == ['A', 'B']
+    mapping[2] = 'C' # same length, different content
+    assert decode_column(pd.Series([1, 2]), mapping).tolist() == ['A', 'C']
+
+def test_label_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(lookup, 'LABEL_CACHE_SIZE', 2)
+    for i in range(5):
+        lookup.label_array({i: str(i)})
+    assert len(lookup._LABEL_CACHE) == 2
@@ -0,0 +1,38 @@
+import numpy as np
+from project1.numerical_summary import ColumnSummary, QuantileSketch, get_fivenumsummary_from_counts
+
+def test_column_summary_counts_nulls_in_object_column_as_missing():
+    summary = ColumnSummary('Time').update(np.array(['10:00', np.nan, '11:00'], dtype=object))
+    uniques, counts = summary.uniques_and_counts()
+    assert uniques.tolist() == ['10:00', '11:00'] and counts.tolist() == [1, 1]
+    assert summary.n == 3 and summary.missing == 1
+
+def test_column_summary_merge_keeps_one_key_per_value():
+    a = ColumnSummary('Time').update(np.array(['10:00', np.nan], dtype=object))
+    b = ColumnSummary('Time').update(np.array([np.nan, '10:00', None], dtype=object))
+    merged = a.merge(b)
+    assert merged.no_uniques() == 1 and merged.missing == 3
+    assert merged.uniques_and_counts()[1].tolist() == [2]
+
+def test_column_summary_numerical_nan():
+    summary = ColumnSummary('Age_of_Casualty', 'numerical').update(np.array([30., np.nan, -1., 40.]))
+    assert summary.missing == 2 and summary.uniques_and_counts()[0].tolist() == [-1., 30., 40.]
+    assert summary.fivenumsummary().tolist() == [30., 32.5, 35., 37.5, 40.]
+
+def test_quantile_sketch_empty():
+    assert np.isnan(QuantileSketch().quantiles([0, 50, 100])).all()
+    assert ColumnSummary('Age_of_Casualty', 'numerical', max_exact=0).fivenumsummary() is None
+
+def test_fivenumsummary_from_counts_without_values():
+    assert get_fivenumsummary_from_counts([], []) is None
+    assert get_fivenumsummary_from_counts([-1], [5]) is None
+    assert get_fivenumsummary_from_counts(['10:00'], [1]) is None
+    assert get_fivenumsummary_from_counts([-1, 1, 3], [2, 1, 1]).tolist() == [1., 1.5, 2., 2.5, 3.]
+
+def test_column_summary_identifier_counts_distinct_values():
+    a = ColumnSummary('Accident_Index', identifier=True).update(np.array(['a', 'b', 'b'], dtype=object))
+    b = ColumnSummary('Accident_Index', identifier=True).update(np.array(['b', 'c'], dtype=object))
+    merged = ColumnSummary.loads(a.merge(b).dumps())
+    assert merged.no_uniques() == 3 and not merged.is_exact()
+    assert ColumnSummary('Accident_Index', max_exact=2, identifier=True).update(np.array(['a', 'b', 'c'])).no_uniques() is None
+    assert ColumnSummary('Accident_Index', max_exact=0, identifier=True).update(np.array(['a'])).no_uniques() is None
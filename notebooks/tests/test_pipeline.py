@@ -0,0 +1,14 @@
+import os
+import pytest
+from project1.loading import load_table
+from project1.pipeline import _clean
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+FILENAME = 'Road Safety Data - Accidents 2019.csv'
+
+@pytest.mark.parametrize('directory', ['interim', 'processed'])
+def test_clean_stage_keeps_months(directory):
+    path = os.path.join(DATA, directory, FILENAME)
+    if not os.path.exists(path): pytest.skip(f'{path} not available')
+    cleaned = _clean({'accidents': load_table(path)}, 'accidents')
+    assert cleaned['Date'].between(1, 12).all() and cleaned['Time'].between(-1, 23).all() # -1 for missing times
@@ -0,0 +1,72 @@
+import os
+import threading
+import numpy as np
+import pytest
+from project1.service import LRUCache, QueryService
+
+ATTRIBUTES = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'references', 'column attributes')
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_bytes=10, max_entries=3)
+    for key in 'abc': cache.get(key, lambda: b'xx')
+    assert cache.get('a', lambda: b'new') == (b'xx', True) # 'a' is now the most recently used
+    cache.get('d', lambda: b'xx')
+    assert list(cache.entries) == ['c', 'a', 'd'] and cache.stats()['Evictions'] == 1
+
+    cache.get('e', lambda: b'xxxxxx') # 6 + 6 bytes exceed max_bytes, the least recently used entry goes
+    assert list(cache.entries) == ['a', 'd', 'e'] and cache.nbytes == 10
+    cache.get('f', lambda: b'x' * 11) # larger than the whole cache, never cached
+    assert 'f' not in cache.entries and cache.stats()['Misses'] == 6
+
+def test_lru_cache_computes_concurrent_misses_once():
+    cache, calls, started, release = LRUCache(), [], threading.Event(), threading.Event()
+    def compute():
+        calls.append(1); started.set(); release.wait(5)
+        return b'result'
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.get('key', compute)))
+    first.start(); started.wait(5)
+    others = [threading.Thread(target=lambda: results.append(cache.get('key', compute))) for _ in range(4)]
+    for thread in others: thread.start()
+    release.set()
+    for thread in [first] + others: thread.join(5)
+    assert len(calls) == 1 and sorted(hit for _, hit in results) == [False, True, True, True, True]
+    assert all(result == b'result' for result, _ in results)
+
+def test_lru_cache_failed_compute_is_not_pending():
+    cache = LRUCache()
+    with pytest.raises(ValueError):
+        cache.get('key', lambda: (_ for _ in ()).throw(ValueError()))
+    assert cache.pending == {} and cache.get('key', lambda: b'ok') == (b'ok', False)
+
+@pytest.fixture(scope='module')
+def service():
+    from project1.benchmark import synthetic_tables
+    from project1.visualisations import initial_summaries
+    tables = synthetic_tables(400, ATTRIBUTES, seed=1)
+    return QueryService(tables, initial_summaries(tables, ATTRIBUTES))
+
+def test_select_across_datasets(service):
+    accidents, casualties, vehicles = (service.tables[dataset] for dataset in ['accidents', 'casualties', 'vehicles'])
+    serious = set(accidents.loc[accidents['Accident_Severity'].isin([1, 2]), 'Accident_Index'])
+    with_car = set(vehicles.loc[vehicles['Vehicle_Type'] == 9, 'Accident_Index'])
+
+    mask = service.select('vehicles', {'Accident_Severity': [1, 2], 'Vehicle_Type': 9})
+    expected = vehicles['Accident_Index'].isin(serious) & (vehicles['Vehicle_Type'] == 9)
+    assert (mask == expected.to_numpy()).all() and expected.any()
+
+    # a vehicle column filters the casualties through their accidents
+    mask = service.select('casualties', {'Vehicle_Type': 9, 'Accident_Severity': [1, 2]})
+    assert (mask == casualties['Accident_Index'].isin(with_car & serious).to_numpy()).all()
+
+    assert service.select('accidents', None) is None
+    with pytest.raises(KeyError):
+        service.select('accidents', {'Unknown': 1})
+
+def test_value_counts_of_selection(service):
+    vehicles = service.tables['vehicles']
+    counts = service.value_counts('vehicles', 'Vehicle_Type', filters={'Accident_Severity': 1})
+    fatal = service.tables['accidents'].loc[service.tables['accidents']['Accident_Severity'] == 1, 'Accident_Index']
+    expected = vehicles.loc[vehicles['Accident_Index'].isin(fatal), 'Vehicle_Type'].value_counts()
+    assert sum(counts['Counts']) == expected.sum()
+    assert dict(zip(counts['Codes'], counts['Counts'])) == expected.to_dict()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from project1.temporal import TimeIndex, UNITS, CYCLES
+
+def test_time_index_without_valid_dates():
+    time = TimeIndex(pd.DataFrame({'Date': [None, 'not a date'], 'Time': ['10:00', None]}))
+    for freq in UNITS:
+        assert len(time.counts(freq)) == 0
+    for cycle in CYCLES:
+        assert time.counts(cycle)['Accidents'].sum() == 0 and len(time.counts(cycle)) == len(CYCLES[cycle])
+    assert time.hour_of_week().to_numpy().sum() == 0
+
+def dates_and_times(n=2000, seed=0):
+    # two years and a bit (a leap year included), some missing or malformed dates and times
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp('2019-12-20') + pd.to_timedelta(rng.integers(0, 800, n), unit='D')
+    data = pd.DataFrame({'Date': days.strftime('%d/%m/%Y'), 'Time': [f'{h:02d}:{m:02d}' for h, m in zip(rng.integers(0, 24, n), rng.integers(0, 60, n))]})
+    data.loc[::97, 'Date'] = None
+    data.loc[1::89, 'Date'] = '31/02/2020'
+    data.loc[2::53, 'Time'] = None
+    data['Accident_Severity'] = rng.choice([1, 2, 3], n)
+    return data
+
+def expected_counts(keys, index, by=None, data=None):
+    # counts of pandas keys per bucket of `index`, missing buckets as 0
+    if by is None: return keys.value_counts().reindex(index, fill_value=0).to_numpy()
+    return pd.crosstab(keys, data[by]).reindex(index, fill_value=0).to_numpy()
+
+def test_week_month_buckets_equal_pandas():
+    data = dates_and_times()
+    time = TimeIndex(data)
+    dates = pd.to_datetime(data['Date'], format='%d/%m/%Y', errors='coerce')
+
+    weeks = time.counts('week')
+    mondays = (dates - pd.to_timedelta(dates.dt.dayofweek, unit='D')).dropna()
+    assert (pd.DatetimeIndex(weeks.index).dayofweek == 0).all() and (np.diff(weeks.index.to_numpy()) == np.timedelta64(7, 'D')).all()
+    assert (weeks['Accidents'].to_numpy() == expected_counts(mondays, pd.DatetimeIndex(weeks.index))).all()
+
+    months = time.counts('month', by='Accident_Severity')
+    starts = dates.dt.to_period('M').dt.to_timestamp().dropna()
+    assert len(months) == 27 and (months.to_numpy() == expected_counts(starts, pd.DatetimeIndex(months.index), 'Accident_Severity', data.loc[starts.index])).all()
+    assert (time.counts('month_of_year')['Accidents'].to_numpy() == np.bincount(dates.dt.month.dropna().astype(int) - 1, minlength=12)).all()
+
+def test_hour_of_week_equals_pandas():
+    data = dates_and_times()
+    timestamps = pd.to_datetime(data['Date'] + ' ' + data['Time'], format='%d/%m/%Y %H:%M', errors='coerce').dropna()
+    expected = pd.crosstab(timestamps.dt.dayofweek, timestamps.dt.hour).reindex(index=range(7), columns=range(24), fill_value=0)
+    heatmap = TimeIndex(data).hour_of_week()
+    assert heatmap.shape == (7, 24) and (heatmap.to_numpy() == expected.to_numpy()).all()
+
+    hours = TimeIndex(data).counts('hour')
+    assert hours['Accidents'].sum() == len(timestamps)
+    assert (hours['Accidents'].to_numpy() == expected_counts(timestamps.dt.floor('h'), pd.DatetimeIndex(hours.index))).all()